@@ -0,0 +1,97 @@
+"""Bytes per hydrated client entity: the old dict layout vs `EntityLayout`.
+
+The old layout kept fields in a per-instance `__dict__`, and every instance
+carried its own sub-api and `Meta` subclass. The compact one has a slot per
+field and builds `entity.api` on access.
+
+Run from the repo root with `python -m python.benchmarks.entity_memory`.
+"""
+import gc
+import tracemalloc
+from typing import Any, Optional
+
+from python.sop.client.layout import EntityLayout, assign_fields
+
+
+class API:
+    # stand-in for ClientAPI: just the state a sub-api holds
+    def __init__(self, prefix: Optional[str] = None, parent: Any = None) -> None:
+        self.prefix = prefix
+        self.parent = parent
+        self.app = None
+
+    def sub_api(self, prefix) -> "API":
+        return API(f"{self.prefix}/{prefix}", self)
+
+
+class DictResource:
+    class Meta:
+        api = API("Resource")
+
+    name: str
+    size: int
+    owner: str
+    created_at: str
+
+    @classmethod
+    def hydrate(cls, fields: dict[str, Any]) -> "DictResource":
+        entity = object.__new__(cls)
+        entity.__dict__.update(fields)
+        entity.api = cls.Meta.api.sub_api(entity.id)
+
+        class Meta(cls.Meta):
+            api = entity.api
+
+        entity.Meta = Meta
+        return entity
+
+
+class CompactBase(metaclass=EntityLayout):
+    # stand-in for ClientEntity, with the same slots
+    __slots__ = ("id", "_version", "_dirty", "_extras", "__weakref__")
+
+
+class CompactResource(CompactBase):
+    name: str
+    size: int
+    owner: str
+    created_at: str
+
+    @classmethod
+    def hydrate(cls, fields: dict[str, Any]) -> "CompactResource":
+        entity = object.__new__(cls)
+        assign_fields(entity, fields.items())
+        return entity
+
+
+def bytes_per_instance(cls, count: int) -> float:
+    rows = [
+        {
+            "id": str(i),
+            "_version": 1,
+            "name": f"resource-{i}",
+            "size": i,
+            "owner": "user-1",
+            "created_at": "2023-06-01T00:00:00",
+        }
+        for i in range(count)
+    ]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    entities = [cls.hydrate(row) for row in rows]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the list holding them isn't part of the instances
+    return (after - before - len(entities) * 8) / count
+
+
+def main(count: int = 100_000) -> None:
+    before = bytes_per_instance(DictResource, count)
+    after = bytes_per_instance(CompactResource, count)
+    print(f"dict layout:    {before:8.1f} bytes/entity")
+    print(f"compact layout: {after:8.1f} bytes/entity ({after / before:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""An in-process SOP server and client on SQLite, for the benchmark suite.
+
+The client's transport hands requests straight to the server's ASGI app,
+so a benchmark covers the whole request path without a network.
+"""
+from __future__ import annotations
+
+from functools import cached_property
+
+from pony.orm import Optional as PonyOptional, Required
+
+from python.sop.client.app import App as ClientApp
+from python.sop.client.transport import Transport
+from python.sop.server.app import App as ServerApp
+from python.sop.server.dispatch import rpc
+from python.tests.apps import InProcessTransport
+
+
+class BenchServer(ServerApp):
+    # the default, shared in-memory sqlite: requests run on worker threads,
+    # and a plain ":memory:" database is a different (empty) one per thread
+    db_provider = "sqlite"
+
+
+class BenchClient(ClientApp):
+    base_url = "http://sop"
+
+    @cached_property
+    def transport(self) -> Transport:
+        return InProcessTransport(server._fastapi)
+
+
+server = BenchServer()
+client = BenchClient()
+
+
+def _server_entities():
+    class Resource(server.Entity):
+        name = Required(str)
+        size = Required(int)
+        owner = Required(str)
+        notes = PonyOptional(str)
+
+        @rpc.cls
+        def count(cls, a: int, b: int) -> int:
+            return a + b
+
+        @rpc
+        def rename(self, name: str) -> str:
+            self.name = name
+            return name
+
+    class Secret(server.Entity):
+        # twelve restricted fields in three predicate groups
+        owner = Required(str)
+        # an attribute object maps one column, so each field gets its own
+        a1, a2, a3, a4 = (PonyOptional(str) for _ in range(4))
+        b1, b2, b3, b4 = (PonyOptional(str) for _ in range(4))
+        c1, c2, c3, c4 = (PonyOptional(str) for _ in range(4))
+
+    return Resource, Secret
+
+
+def _client_entities():
+    class Resource(client.Entity):
+        name: str
+        size: int
+        owner: str
+        notes: str = None
+
+    return Resource
+
+
+ServerResource, Secret = _server_entities()
+ClientResource = _client_entities()
+
+server.finalize()
+server.data.bind()
+client.finalize()
+
+Secret.Meta.api.access_control(
+    "a1", "a2", "a3", "a4", predicate=lambda entity: entity.owner == "bench"
+)
+Secret.Meta.api.access_control(
+    "b1", "b2", "b3", "b4", predicate=lambda entity: len(entity.owner) > 3
+)
+Secret.Meta.api.access_control(
+    "c1", "c2", "c3", "c4", predicate=lambda entity: entity.owner != "nobody"
+)
+
+
+def seed(count: int = 1000) -> list[str]:
+    """Inserts `count` resources and a secret; returns the resources' ids."""
+    with server.data.session():
+        ids = [
+            str(ServerResource._insert(
+                {"name": f"resource-{i}", "size": i, "owner": "bench"}
+            )[0])
+            for i in range(count)
+        ]
+        fields = {f"{group}{i}": "x" for group in "abc" for i in "1234"}
+        Secret._insert({"owner": "bench", **fields})
+    return ids
+
@@ -0,0 +1,144 @@
+"""Timing, allocation and baseline helpers for the benchmark suite."""
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+import gc
+import json
+from pathlib import Path
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+BASELINES = Path(__file__).parent / "baselines"
+
+
+@dataclass
+class Result:
+    name: str
+    iterations: int
+    ops_per_second: float
+    p50_us: float
+    p99_us: float
+    # peak bytes allocated while one op runs, averaged over the sampled ops
+    alloc_bytes: float
+    # memory blocks still allocated after an op, ie, a leak if it keeps growing
+    retained_blocks: float
+
+    def row(self) -> str:
+        return (
+            f"{self.name:<32} {self.ops_per_second:>12,.0f} ops/s"
+            f"  p50 {self.p50_us:>10.1f} us  p99 {self.p99_us:>10.1f} us"
+            f"  {self.alloc_bytes / 1024:>9.1f} KiB/op"
+            f"  {self.retained_blocks:>7.1f} blocks/op"
+        )
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def measure(
+    name: str,
+    op: Callable[[], object],
+    iterations: int = 1000,
+    warmup: int = 50,
+    alloc_samples: int = 50,
+) -> Result:
+    """Times `op` one call at a time, then samples its allocations."""
+    for _ in range(warmup):
+        op()
+    gc.collect()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter_ns()
+        op()
+        latencies.append(time.perf_counter_ns() - t0)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+
+    # separate pass: tracing slows every allocation down
+    samples = min(alloc_samples, iterations)
+    peaks = 0
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    for _ in range(samples):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        op()
+        peaks += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    gc.collect()
+    retained = sys.getallocatedblocks() - blocks
+
+    return Result(
+        name=name,
+        iterations=iterations,
+        ops_per_second=iterations / elapsed,
+        p50_us=_percentile(latencies, 0.50) / 1000,
+        p99_us=_percentile(latencies, 0.99) / 1000,
+        alloc_bytes=peaks / samples,
+        retained_blocks=retained / samples,
+    )
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_baseline(label: str, results: list[Result]) -> Path:
+    BASELINES.mkdir(exist_ok=True)
+    path = BASELINES / f"{label}.json"
+    document = {
+        "commit": _commit(),
+        "python": sys.version.split()[0],
+        "results": [asdict(result) for result in results],
+    }
+    path.write_text(json.dumps(document, indent=2))
+    return path
+
+
+def load_baseline(label: str) -> dict[str, Result]:
+    document = json.loads((BASELINES / f"{label}.json").read_text())
+    return {row["name"]: Result(**row) for row in document["results"]}
+
+
+def compare(
+    results: list[Result], baseline: dict[str, Result], threshold: float = 0.10
+) -> list[str]:
+    """Prints each result against the baseline; returns the regressed names.
+
+    A case regresses when its p50 latency or its allocations grew by more
+    than `threshold`.
+    """
+    regressions = []
+    for result in results:
+        before = baseline.get(result.name)
+        if before is None:
+            print(f"{result.name:<32} (no baseline)")
+            continue
+        latency = result.p50_us / before.p50_us - 1 if before.p50_us else 0.0
+        alloc = (
+            result.alloc_bytes / before.alloc_bytes - 1 if before.alloc_bytes else 0.0
+        )
+        regressed = latency > threshold or alloc > threshold
+        if regressed:
+            regressions.append(result.name)
+        print(
+            f"{result.name:<32} p50 {latency:>+7.1%}  p99 "
+            f"{result.p99_us / before.p99_us - 1 if before.p99_us else 0.0:>+7.1%}"
+            f"  alloc {alloc:>+7.1%}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
@@ -0,0 +1,75 @@
+"""Per-call overhead of server rpc dispatch: reflective lookup vs dispatch table.
+
+Both paths call the same untyped methods, so argument parsing (which both
+share) is left out and only the lookup and invocation overhead is measured.
+
+Run from the repo root with `python -m python.benchmarks.rpc_dispatch`.
+"""
+import inspect
+import timeit
+from typing import Any
+
+from python.sop.server.dispatch import build_dispatch_table, rpc
+
+
+class Entity:
+    # stand-in for a ServerEntity subclass, with the same acl'd attribute
+    # access but without an orm behind it
+    class Meta:
+        _access_restrictions = {"secret": lambda entity: False}
+
+    id = "1"
+    name = "benchmark"
+
+    def __getattribute__(self, __name: str) -> Any:
+        if __name in ("Meta", "_access_restrictions"):
+            return super().__getattribute__(__name)
+        if __name in self.Meta._access_restrictions:
+            if not self.Meta._access_restrictions[__name](self):
+                raise PermissionError(__name)
+        return super().__getattribute__(__name)
+
+    @rpc.cls
+    def count(cls, a, b):
+        return a + b
+
+    @rpc
+    def rename(self, name):
+        return name
+
+
+def reflective_call(target, method_name, args, kwds):
+    # the lookup ServerAPI did before the dispatch table
+    if hasattr(target, method_name):
+        fn = getattr(target, method_name)
+        if callable(fn) and inspect.ismethod(fn):
+            return fn(*args, **kwds)
+    raise NotImplementedError
+
+
+def table_call(table, target, method_name, args, kwds):
+    return table[method_name].call(target, args, kwds)
+
+
+def main(number: int = 200_000) -> None:
+    table = build_dispatch_table(Entity)
+    instance = Entity()
+    cases = {
+        "classmethod": (Entity, "count", [1, 2], {}),
+        "instance method": (instance, "rename", [], {"name": "x"}),
+    }
+    for label, (target, method_name, args, kwds) in cases.items():
+        reflective = timeit.timeit(
+            lambda: reflective_call(target, method_name, args, kwds), number=number
+        )
+        compiled = timeit.timeit(
+            lambda: table_call(table, target, method_name, args, kwds), number=number
+        )
+        print(
+            f"{label:>16}: reflective {reflective / number * 1e9:8.1f} ns/call, "
+            f"table {compiled / number * 1e9:8.1f} ns/call"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""Benchmarks of the SOP request path, with baselines to compare commits by.
+
+Every case runs in process: the client talks to the server app through
+the tests' `InProcessTransport`, and the server keeps its data in an
+in-memory SQLite database.
+
+Run from the repo root, eg
+
+    python -m python.benchmarks.suite --save main
+    python -m python.benchmarks.suite --compare main --fail-on-regression
+    python -m python.benchmarks.suite -k crud --iterations 0.2
+
+With `--fail-on-regression` the run also fails if a case was skipped or
+has nothing in the baseline to compare to, so a gate can't pass by
+measuring less.
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import itertools
+import sys
+import types
+from typing import Any, Callable, Optional, Union
+
+from python.benchmarks.harness import (
+    Result,
+    compare,
+    load_baseline,
+    measure,
+    save_baseline,
+)
+
+# name -> (setup returning the op to time, iterations)
+CASES: dict[str, tuple[Callable[[], Callable[[], Any]], int]] = {}
+
+
+def case(name: str, iterations: int = 1000):
+    def register(setup: Callable[[], Callable[[], Any]]):
+        CASES[name] = (setup, iterations)
+        return setup
+
+    return register
+
+
+def _ok(response):
+    # an error response is fast, and would be measured as an improvement
+    response.raise_for_status()
+    return response
+
+
+def _seeded():
+    from python.benchmarks import fixtures
+
+    if not hasattr(fixtures, "ids"):
+        fixtures.ids = fixtures.seed()
+    return fixtures
+
+
+# rpc
+
+
+@case("rpc.dispatch_table", iterations=100_000)
+def rpc_dispatch_table():
+    from python.benchmarks.rpc_dispatch import Entity, table_call
+    from python.sop.server.dispatch import build_dispatch_table
+
+    table = build_dispatch_table(Entity)
+    return lambda: table_call(table, Entity, "count", [1, 2], {})
+
+
+@case("rpc.classmethod")
+def rpc_classmethod():
+    http = _seeded().client.transport.client
+    body = {"args": [1, 2], "kwds": {}}
+    return lambda: _ok(
+        http.post("/resource/rpc", params={"method_name": "count"}, json=body)
+    )
+
+
+@case("rpc.instance_method")
+def rpc_instance_method():
+    fixtures = _seeded()
+    http = fixtures.client.transport.client
+    path = f"/resource/{fixtures.ids[0]}/rpc"
+    body = {"args": ["renamed"], "kwds": {}}
+    return lambda: _ok(http.post(path, params={"method_name": "rename"}, json=body))
+
+
+@case("rpc.batch_10", iterations=200)
+def rpc_batch():
+    fixtures = _seeded()
+    http = fixtures.client.transport.client
+    calls = [
+        {"path": "resource", "method_name": "count", "args": [i, i], "kwds": {}}
+        for i in range(10)
+    ]
+
+    def op():
+        for call in _ok(http.post("/rpc/batch", json=calls)).json():
+            if "error" in call:
+                raise RuntimeError(f"batched rpc failed: {call['error']}")
+
+    return op
+
+
+# parsing
+
+
+@dataclass
+class Item:
+    id: int
+    name: str
+    tags: list[str]
+    parent: Optional[int] = None
+
+
+@case("parse.list_of_models_100")
+def parse_models():
+    from python.sop.utils.parsing import JSONParser
+
+    parser = JSONParser.for_type(list[Item])
+    data = [
+        {"id": i, "name": f"item-{i}", "tags": ["a", "b"], "parent": i - 1 or None}
+        for i in range(100)
+    ]
+    return lambda: parser.parse(data)
+
+
+@case("parse.dict_of_lists")
+def parse_dict_of_lists():
+    from python.sop.utils.parsing import JSONParser
+
+    parser = JSONParser.for_type(dict[str, list[int]])
+    data = {f"key-{i}": list(range(20)) for i in range(50)}
+    return lambda: parser.parse(data)
+
+
+@case("parse.union_100")
+def parse_union():
+    from python.sop.utils.parsing import JSONParser
+
+    parser = JSONParser.for_type(list[Optional[Union[int, str]]])
+    data = [i if i % 3 else str(i) if i % 2 else None for i in range(100)]
+    return lambda: parser.parse(data)
+
+
+# entity crud, through the client
+
+
+@case("crud.create", iterations=300)
+def crud_create():
+    resource = _seeded().ClientResource
+    counter = itertools.count()
+    return lambda: resource.create(
+        name=f"created-{next(counter)}", size=1, owner="bench"
+    )
+
+
+@case("crud.get_by_id")
+def crud_get_by_id():
+    fixtures = _seeded()
+    ids = itertools.cycle(fixtures.ids)
+    return lambda: fixtures.ClientResource.get_by_id(next(ids))
+
+
+@case("crud.get_many_100", iterations=200)
+def crud_get_many():
+    fixtures = _seeded()
+    ids = fixtures.ids[:100]
+    return lambda: fixtures.ClientResource.get_many(ids)
+
+
+@case("crud.sync", iterations=300)
+def crud_sync():
+    fixtures = _seeded()
+    entity = fixtures.ClientResource.get_by_id(fixtures.ids[1])
+    sizes = itertools.count()
+
+    def op():
+        entity.size = next(sizes)
+        entity.sync()
+
+    return op
+
+
+@case("crud.create_delete", iterations=300)
+def crud_create_delete():
+    resource = _seeded().ClientResource
+
+    def op():
+        resource.delete_by_id(resource.create(name="ephemeral", size=0, owner="bench"))
+
+    return op
+
+
+# acl'd serialization, server side
+
+
+@case("acl.serialize", iterations=2000)
+def acl_serialize():
+    fixtures = _seeded()
+    from python.sop.server.acl import acl_scope
+
+    def op():
+        with fixtures.server.data.session(), acl_scope():
+            fixtures.Secret.select().first().serialize()
+
+    return op
+
+
+@case("acl.getattr_12_fields", iterations=2000)
+def acl_getattr():
+    fixtures = _seeded()
+    from python.sop.server.acl import acl_scope
+
+    names = [f"{group}{i}" for group in "abc" for i in "1234"]
+
+    def op():
+        with fixtures.server.data.session(), acl_scope():
+            secret = fixtures.Secret.select().first()
+            for name in names:
+                getattr(secret, name)
+
+    return op
+
+
+# startup
+
+
+def _startup(count: int):
+    from python.sop.client.app import App
+
+    def op():
+        app = App()
+        for i in range(count):
+            types.new_class(
+                f"Entity{i}",
+                (app.Entity,),
+                exec_body=lambda ns: ns.update(__annotations__={"name": str}),
+            )
+        app.finalize()
+
+    return op
+
+
+def _server_startup(count: int):
+    from pony.orm import Required
+
+    from python.sop.server.app import App
+
+    class Server(App):
+        # a database per app, mapped on this thread
+        db_options = {"filename": ":memory:"}
+
+    def op():
+        app = Server()
+        for i in range(count):
+            types.new_class(
+                f"Entity{i}",
+                (app.Entity,),
+                exec_body=lambda ns: ns.update(name=Required(str)),
+            )
+        # compiles the routes, then maps the entities to tables
+        app.finalize()
+        app.data.bind()
+
+    return op
+
+
+case("startup.client_10_entities", iterations=100)(lambda: _startup(10))
+case("startup.client_100_entities", iterations=20)(lambda: _startup(100))
+case("startup.server_10_entities", iterations=20)(lambda: _server_startup(10))
+
+
+def run(
+    pattern: Optional[str] = None, scale: float = 1.0
+) -> tuple[list[Result], list[str]]:
+    """Runs the cases whose name contains `pattern`; returns results and skips."""
+    results, skipped = [], []
+    for name, (setup, iterations) in CASES.items():
+        if pattern and pattern not in name:
+            continue
+        try:
+            op = setup()
+        except ImportError as e:
+            # eg without the server's dependencies, only the micro cases run
+            skipped.append(f"{name}: {e}")
+            continue
+        result = measure(name, op, iterations=max(int(iterations * scale), 1))
+        print(result.row())
+        results.append(result)
+    return results, skipped
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-k", dest="pattern", help="only cases containing this")
+    parser.add_argument(
+        "--iterations", type=float, default=1.0, help="scale every case's iterations"
+    )
+    parser.add_argument("--save", metavar="LABEL", help="save results as a baseline")
+    parser.add_argument("--compare", metavar="LABEL", help="compare to a baseline")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+    if args.fail_on_regression and not args.compare:
+        parser.error("--fail-on-regression needs --compare")
+
+    results, skipped = run(args.pattern, args.iterations)
+    for line in skipped:
+        print(f"skipped {line}")
+    if args.save:
+        print(f"saved {save_baseline(args.save, results)}")
+    if args.compare:
+        baseline = load_baseline(args.compare)
+        regressions = compare(results, baseline, args.threshold)
+        if args.fail_on_regression:
+            unmeasured = [r.name for r in results if r.name not in baseline]
+            failures = [
+                *(f"regressed {name}" for name in regressions),
+                *(f"skipped {line}" for line in skipped),
+                *(f"no baseline for {name}" for name in unmeasured),
+            ]
+            if not results:
+                failures.append("no case was measured")
+            for failure in failures:
+                print(f"FAIL {failure}")
+            if failures:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
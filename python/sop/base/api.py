@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 from abc import abstractmethod
-from typing import Optional, Self
+from typing import TYPE_CHECKING, Optional, Self
 
-from python.sop.base.app import AbstractBaseApp
+if TYPE_CHECKING:
+    from python.sop.base.app import AbstractBaseApp
 
 
 class BaseAPI:
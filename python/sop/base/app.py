@@ -6,6 +6,7 @@ import stringcase
 
 from python.sop.base.api import BaseAPI
 from python.sop.base.entity import BaseEntity
+from python.sop.base.registry import Registry
 from python.sop.utils.strings import camelize
 
 
@@ -15,15 +16,25 @@ class AbstractBaseApp(BaseAPI):
 
     T_Entity: Type[BaseEntity]
 
-    def __post_init__(self) -> None:
+    def __init__(self) -> None:
         self.app = self
 
+    @cached_property
+    def registry(self) -> Registry:
+        return Registry()
+
+    def finalize(self) -> None:
+        """Finalizes the entity types defined so far. Cheap once done."""
+        self.registry.finalize()
+
     @cached_property
     def Entity(self) -> Type[BaseEntity]:
         class Entity(self.T_Entity):
             class Meta(self.T_Entity.Meta):
                 app = self
 
+        # only its subclasses are entity types
+        self.registry.discard(Entity)
         return Entity
 
     @abstractmethod
@@ -1,48 +1,62 @@
 from abc import abstractmethod
-from typing import Generic, Self, TypeVar
+import time
+from typing import TYPE_CHECKING, Generic, Self, TypeVar
 
 from python.sop.base.api import BaseAPI
-from python.sop.base.app import AbstractBaseApp
 from python.sop.utils.strings import camelize
 
+if TYPE_CHECKING:
+    from python.sop.base.app import AbstractBaseApp
+
 
 T_BaseAPI = TypeVar("T_BaseAPI", bound=BaseAPI)
-T_App = TypeVar("T_App", bound=AbstractBaseApp)
+T_App = TypeVar("T_App", bound="AbstractBaseApp")
+
+
+class _MetaApp:
+    # `cls.app` is `cls.Meta.app`, the app the type was defined against
+    def __get__(self, entity, cls) -> "AbstractBaseApp":
+        return cls._get_meta().app
 
 
 class BaseEntity(Generic[T_BaseAPI, T_App]):
+    # so subclasses can do without a __dict__, see `ClientEntity`
+    __slots__ = ()
+
     id: str  # all entities have an id # TODO: make this a UUID
 
+    app = _MetaApp()
+
     class Meta:
-        api: T_BaseAPI  # subclasses should override, merged across all bases in __init_subclass__
+        api: T_BaseAPI  # subclasses should override, merged across all bases in _finalize_registration
         app: T_App  # set in the base entity. inherited by all subclasses
 
     @property
     def guid(self) -> str:
         return f"{self.__class__.__name__}:{self.id}"
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def create(cls, **kwargs):
         pass
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def get_by_id(cls, id: int) -> Self:
         pass
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def get_many(cls, ids: list[int]) -> list[Self]:
         pass
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def get_all(cls) -> list[Self]:
         pass
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def update_by_id(cls, id: int, data: Self):
         pass
 
@@ -58,8 +72,8 @@ class BaseEntity(Generic[T_BaseAPI, T_App]):
     def pull_updates(self):
         pass
 
-    @abstractmethod
     @classmethod
+    @abstractmethod
     def delete_by_id(cls, id: int):
         pass
 
@@ -71,38 +85,51 @@ class BaseEntity(Generic[T_BaseAPI, T_App]):
         id = cls.create()
         return cls.get_by_id(id)
 
-    def __del__(self):
-        self.delete()
-
     def __init_subclass__(cls) -> None:
-        # merge all cls api's into the app api at the cls level
-        ## get or create the cls's personal api
-        ### To do this, we're going to check if the cls's api equals any of its parents' apis
-        ### If it does, we'll make a special one just for the cls
-        if any([cls.api == base.api for base in cls.__bases__]):
-            cls._get_meta().api = T_BaseAPI()
-        ## Next, merge all of the cls's parents' apis into the cls's api
-        for base in cls.__bases__:
-            cls.api.merge(base.api)
-
-        # Finally, mount it under the app level api
-        cls._get_meta().app.mount_sub_api(
-            prefix=camelize(cls.__name__), api=cls._get_meta().api
-        )
+        # only recorded here, so defining (ie importing) entities stays cheap.
+        # the app finalizes them on first use, see `Registry`
+        started = time.perf_counter()
+        app = getattr(cls._get_meta(), "app", None)
+        if app is not None:
+            app.registry.record(cls, started)
+
+    @classmethod
+    def _finalize_registration(cls) -> None:
+        """Sets up what the entity type needs to be used. Called once, by the app.
+
+        Subclasses extend it, timing their steps with `registry.timed`.
+        """
+        with cls._get_meta().app.registry.timed(cls, "api"):
+            # merge all cls api's into the app api at the cls level
+            ## get or create the cls's personal api
+            ### To do this, we're going to check if the cls's api equals any of its parents' apis
+            ### If it does, we'll make a special one just for the cls
+            meta = cls._get_meta()
+            base_apis = [
+                base.Meta.api
+                for base in cls.__bases__
+                if getattr(getattr(base, "Meta", None), "api", None) is not None
+            ]
+            if any(meta.api is api for api in base_apis):
+                meta.api = type(meta.api)()
+            ## Next, merge all of the cls's parents' apis into the cls's api
+            for api in base_apis:
+                meta.api.merge(api)
+
+            # Finally, mount it under the app level api
+            cls._get_meta().app.mount_sub_api(
+                prefix=camelize(cls.__name__), api=cls._get_meta().api
+            )
 
     def __init__(self) -> None:
+        # instances share their type's api; `<type>/{id}` routes take the id
         super().__init__()
 
-        # create an instance-level API
-        class Meta(self._get_meta()):
-            api = self._get_meta().api.sub_api(self.id)
-
-        self.Meta = Meta
-
     @classmethod
     def _get_meta(cls):
         if vars(cls).get("Meta", None) is None:
-            cls.Meta = type("Meta", (BaseEntity.Meta,), {})
+            # inherits the app and api of the base's
+            cls.Meta = type("Meta", (cls.Meta,), {})
         if not issubclass(cls.Meta, BaseEntity.Meta):
             # this allows them to share the same app attribute
             BaseEntity.Meta.__init_subclass__(cls.Meta)
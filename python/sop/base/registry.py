@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Iterator
+
+
+@dataclass
+class RegistrationCost:
+    entity: str
+    module: str
+    # seconds spent in __init_subclass__, ie, at import
+    defined: float = 0.0
+    # seconds spent finalizing, by step (eg "api", "parser", "db")
+    steps: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def finalized(self) -> float:
+        return sum(self.steps.values())
+
+    @property
+    def total(self) -> float:
+        return self.defined + self.finalized
+
+
+class Registry:
+    """The entity types defined against an app, finalized on first use.
+
+    Defining an entity class only records it. Its apis, parsers and
+    database mapping are set up by `finalize`, which the app runs at
+    startup or before it first sends or serves a request, so importing
+    many entity modules stays cheap. Each entity's `_finalize_registration`
+    does the work, timing its steps with `timed`; `report` shows the cost.
+    """
+
+    def __init__(self) -> None:
+        self.pending: list[type] = []
+        self.costs: dict[type, RegistrationCost] = {}
+        # reentrant: finalizing may define or look up more entity types
+        self._lock = threading.RLock()
+
+    def record(self, cls: type, started: float) -> None:
+        with self._lock:
+            self.pending.append(cls)
+            self.costs[cls] = RegistrationCost(
+                cls.__name__, cls.__module__, defined=time.perf_counter() - started
+            )
+
+    def discard(self, cls: type) -> None:
+        """Forgets a type recorded by mistake, eg the base of an app's entities."""
+        with self._lock:
+            if cls in self.pending:
+                self.pending.remove(cls)
+            self.costs.pop(cls, None)
+
+    @property
+    def is_finalized(self) -> bool:
+        return not self.pending
+
+    def finalize(self) -> None:
+        if not self.pending:
+            return
+        with self._lock:
+            while self.pending:
+                # in definition order, so bases are finalized before subclasses
+                cls = self.pending.pop(0)
+                cls._finalize_registration()
+
+    @contextmanager
+    def timed(self, cls: type, step: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cost = self.costs.get(cls)
+            if cost is not None:
+                cost.steps[step] = (
+                    cost.steps.get(step, 0.0) + time.perf_counter() - started
+                )
+
+    def report(self, limit: int = None) -> str:
+        """Per-entity startup cost, most expensive first, in milliseconds."""
+        costs = sorted(self.costs.values(), key=lambda cost: -cost.total)
+        steps = sorted({step for cost in costs for step in cost.steps})
+        header = ["entity", "module", "defined", *steps, "total"]
+        rows = [
+            [
+                cost.entity,
+                cost.module,
+                f"{cost.defined * 1000:.2f}",
+                *(f"{cost.steps.get(step, 0.0) * 1000:.2f}" for step in steps),
+                f"{cost.total * 1000:.2f}",
+            ]
+            for cost in costs[:limit]
+        ]
+        total = sum(cost.total for cost in costs)
+        rows.append(
+            ["(all)", f"{len(costs)} entities", "", *("" for _ in steps)]
+            + [f"{total * 1000:.2f}"]
+        )
+        widths = [
+            max(len(row[i]) for row in [header, *rows]) for i in range(len(header))
+        ]
+        return "\n".join(
+            "  ".join(
+                value.ljust(width) if i < 2 else value.rjust(width)
+                for i, (value, width) in enumerate(zip(row, widths))
+            )
+            for row in [header, *rows]
+        )
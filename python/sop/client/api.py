@@ -1,15 +1,20 @@
 from __future__ import annotations
+from functools import cached_property
 import inspect
-from typing import Any, Optional
+import json
+from typing import TYPE_CHECKING, Any, Optional
 from fastapi import FastAPI
 
-import requests
 from python.sop.base.api import BaseAPI
-from python.sop.client.app import App
 
-from python.sop.client.rpc import RPC
+from python.sop.client.async_api import AsyncClientAPI
+from python.sop.client.batch import RPCBatch
+from python.sop.utils.codecs import decode_response
+from python.sop.utils.instrumentation import instrumentation
 from python.sop.utils.parsing import JSONParser
-from python.sop.utils.shortcircuit_merged import merged
+
+if TYPE_CHECKING:
+    from python.sop.client.app import App
 
 
 class ClientAPI(BaseAPI):
@@ -26,11 +31,13 @@ class ClientAPI(BaseAPI):
 
     @property
     def default_headers(self) -> dict[str, str]:
-        return {**self.parent.default_headers, **(self.headers_overrides or {})}
+        inherited = self.parent.default_headers if self.parent is not None else {}
+        return {**inherited, **(self.headers_overrides or {})}
 
     @property
     def default_params(self) -> dict[str, str]:
-        return {**self.parent.default_params, **(self.params_overrides or {})}
+        inherited = self.parent.default_params if self.parent is not None else {}
+        return {**inherited, **(self.params_overrides or {})}
 
     # ... HTTP verb-specific decorators already defined in the base class
 
@@ -56,52 +63,101 @@ class ClientAPI(BaseAPI):
 
         return decorator
 
-    def get_request(self, path, params=None, data=None, headers=None):
-        return self.request("GET", path, params=None, data=None, headers=None)
+    def get_request(self, path, params=None, data=None, headers=None, stream=False):
+        return self.request(
+            "GET", path, params=params, data=data, headers=headers, stream=stream
+        )
 
     def post_request(self, path, params=None, data=None, headers=None):
-        return self.request("POST", path, params=None, data=None, headers=None)
+        return self.request("POST", path, params=params, data=data, headers=headers)
 
     def put_request(self, path, params=None, data=None, headers=None):
-        return self.request("PUT", path, params=None, data=None, headers=None)
+        return self.request("PUT", path, params=params, data=data, headers=headers)
 
     def delete_request(self, path, params=None, data=None, headers=None):
-        return self.request("DELETE", path, params=None, data=None, headers=None)
+        return self.request("DELETE", path, params=params, data=data, headers=headers)
 
     def patch_request(self, path, params=None, data=None, headers=None):
-        return self.request("PATCH", path, params=None, data=None, headers=None)
+        return self.request("PATCH", path, params=params, data=data, headers=headers)
 
     def head_request(self, path, params=None, data=None, headers=None):
-        return self.request("HEAD", path, params=None, data=None, headers=None)
+        return self.request("HEAD", path, params=params, data=data, headers=headers)
 
     def options_request(self, path, params=None, data=None, headers=None):
-        return self.request("OPTIONS", path, params=None, data=None, headers=None)
+        return self.request("OPTIONS", path, params=params, data=data, headers=headers)
 
-    def request(self, verb, path, params=None, data=None, headers=None):
+    def request(self, verb, path, params=None, data=None, headers=None, stream=False):
+        # entity types are set up on the app's first request
+        self.app.finalize()
         path = self._add_prefix(path)
-        params.update(self.default_headers)
-        headers.update(self.default_params)
-        return requests.request(verb, path, params=params, data=data, headers=headers)
+        params = {**self.default_params, **(params or {})}
+        with instrumentation.span("client.request", label=verb, path=path):
+            headers = {
+                "Accept": self.app.accept_header,
+                **self.default_headers,
+                **(headers or {}),
+                **instrumentation.trace_headers(),
+            }
+            # all requests share the app's pooled keep-alive transport
+            return self.app.transport.request(
+                verb,
+                self.app.base_url,
+                path,
+                params=params,
+                data=data,
+                headers=headers,
+                stream=stream,
+            )
 
     def rpc(self, method_name, /, args, kwds, rpc_verb="POST", rpc_ret_parser=None):
+        batch = RPCBatch.current()
+        if batch is not None:
+            # inside `with api.batch():` calls are queued instead of sent
+            return batch.add(self.prefix, method_name, args, kwds, rpc_ret_parser)
+        with instrumentation.span("client.rpc", label=method_name, prefix=self.prefix):
+            response = self.request(
+                **self._rpc_request(method_name, args, kwds, rpc_verb)
+            )
+            response.raise_for_status()
+            return self._parse_rpc_response(decode_response(response), rpc_ret_parser)
+
+    @staticmethod
+    def _rpc_request(method_name, args, kwds, rpc_verb) -> dict[str, Any]:
+        # shared by the sync and async clients
         match rpc_verb:
             case "GET":
-                response = self.request(
+                return dict(
                     verb=rpc_verb,
                     path="/rpc",
-                    params={"method": method_name, "args": args, "kwds": kwds},
+                    params={"method_name": method_name, "args": args, "kwds": kwds},
                     headers={"Content-Type": "application/json"},
                 )
             case "POST":
-                response = self.request(
+                return dict(
                     verb=rpc_verb,
                     path="/rpc",
-                    data={"method": method_name, "args": args, "kwds": kwds},
+                    params={"method_name": method_name},
+                    data=json.dumps({"args": list(args), "kwds": kwds}),
                     headers={"Content-Type": "application/json"},
                 )
             case _:
                 raise ValueError(f"Unsupported RPC verb: {rpc_verb}")
-        return rpc_ret_parser.parse(response.json())
+
+    @staticmethod
+    def _parse_rpc_response(data, rpc_ret_parser=None) -> Any:
+        if rpc_ret_parser is None:
+            return data
+        with instrumentation.span("parse", label="rpc"):
+            return rpc_ret_parser.parse(data)
+
+    @cached_property
+    def aio(self) -> AsyncClientAPI:
+        """Awaitable view of this api, on the app's async connection pool."""
+        return AsyncClientAPI(self)
+
+    def batch(self) -> RPCBatch:
+        """Returns a context manager that coalesces RPCs into one request."""
+        return RPCBatch(self.app)
 
     def mount_sub_api(self, prefix: str, api: BaseAPI):
         api.parent = self
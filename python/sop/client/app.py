@@ -1,8 +1,102 @@
+from functools import cached_property
 from typing import Any
 from python.sop.base.app import MakeBaseApp
-from python.sop.client.api import ClientAPI, SubController
+from python.sop.client.api import ClientAPI
+from python.sop.client.batch import TickBatch
+from python.sop.client.cache import CacheStats, EntityCache, LRUEntityCache
 from python.sop.client.entity import ClientEntity
+from python.sop.client.feed import ChangeFeedClient
+from python.sop.client.identity_map import IdentityMap
+from python.sop.utils.codecs import accept_header
+from python.sop.utils.instrumentation import instrumentation
+from python.sop.utils.single_flight import (
+    AsyncSingleFlight,
+    SingleFlight,
+    SingleFlightStats,
+)
+from python.sop.client.transport import AsyncTransport, Transport, TransportStats
 
 
 class App(MakeBaseApp(ClientAPI, ClientEntity)):
-    pass
+    base_url: str = "http://localhost:8000"
+    # passed to `Transport`, eg {"pool_maxsize": 32, "timeout": 5, "max_retries": 0}
+    transport_options: dict[str, Any] = {}
+    # passed to `AsyncTransport`, eg {"max_concurrency": 200}
+    async_transport_options: dict[str, Any] = {}
+    # seconds a cached `get_by_id` is served without asking the server; after
+    # that it's revalidated by ETag. Entities can override it with
+    # `Meta.cache_ttl`. 0 revalidates every time
+    cache_ttl: float = 0.0
+    cache_max_size: int = 10_000
+    # preferred response encoding, "msgpack" or "json". msgpack needs the
+    # `msgpack` extra; without it, or against servers without it, it's json
+    wire_format: str = "msgpack"
+    # chunking of `create_many`/`update_many`/`delete_many` into requests
+    bulk_max_items: int = 1000
+    bulk_max_bytes: int = 1_000_000
+    # concurrent `get_by_id` calls for the same entity (and credentials) send
+    # one request and share its result
+    single_flight_reads: bool = True
+    # async rpcs made in the same event loop tick go out in one `/rpc/batch`
+    # request. Sync code batches explicitly, with `api.batch()`
+    coalesce_rpcs: bool = False
+    # time requests, rpcs, parsing and crud calls, and send a trace id with
+    # each request, see `python.sop.utils.instrumentation`
+    instrumented: bool = False
+
+    def __init__(self) -> None:
+        super().__init__()
+        if self.instrumented:
+            instrumentation.enable()
+
+    @cached_property
+    def identity_map(self) -> IdentityMap:
+        return IdentityMap()
+
+    @cached_property
+    def accept_header(self) -> str:
+        return accept_header(self.wire_format)
+
+    @cached_property
+    def cache(self) -> EntityCache:
+        return LRUEntityCache(max_size=self.cache_max_size)
+
+    @property
+    def cache_stats(self) -> CacheStats:
+        return self.cache.stats
+
+    @cached_property
+    def feed(self) -> ChangeFeedClient:
+        return ChangeFeedClient(self)
+
+    @cached_property
+    def transport(self) -> Transport:
+        return Transport(**self.transport_options)
+
+    @cached_property
+    def async_transport(self) -> AsyncTransport:
+        return AsyncTransport(**self.async_transport_options)
+
+    @cached_property
+    def tick_batch(self) -> TickBatch:
+        return TickBatch(self)
+
+    @cached_property
+    def single_flight(self) -> SingleFlight:
+        return SingleFlight()
+
+    @cached_property
+    def async_single_flight(self) -> AsyncSingleFlight:
+        return AsyncSingleFlight()
+
+    @property
+    def single_flight_stats(self) -> SingleFlightStats:
+        stats, other = self.single_flight.stats, self.async_single_flight.stats
+        return SingleFlightStats(
+            executions=stats.executions + other.executions,
+            shared=stats.shared + other.shared,
+        )
+
+    @property
+    def transport_stats(self) -> TransportStats:
+        return self.transport.stats
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any
+
+from python.sop.utils.codecs import decode_response
+from python.sop.utils.instrumentation import instrumentation
+from python.sop.utils.parsing import JSONParser
+
+if TYPE_CHECKING:
+    from python.sop.client.api import ClientAPI
+
+
+class AsyncClientAPI:
+    """Awaitable counterpart of `ClientAPI`. Use `api.aio` to get one.
+
+    Shares the wrapped api's prefix, default headers and params, but sends
+    requests over the app's `AsyncTransport`, so many calls can be in flight
+    at once under `asyncio.gather`.
+    """
+
+    def __init__(self, api: ClientAPI) -> None:
+        self.api = api
+
+    async def get_request(self, path, params=None, data=None, headers=None):
+        return await self.request(
+            "GET", path, params=params, data=data, headers=headers
+        )
+
+    async def post_request(self, path, params=None, data=None, headers=None):
+        return await self.request(
+            "POST", path, params=params, data=data, headers=headers
+        )
+
+    async def put_request(self, path, params=None, data=None, headers=None):
+        return await self.request(
+            "PUT", path, params=params, data=data, headers=headers
+        )
+
+    async def delete_request(self, path, params=None, data=None, headers=None):
+        return await self.request(
+            "DELETE", path, params=params, data=data, headers=headers
+        )
+
+    async def patch_request(self, path, params=None, data=None, headers=None):
+        return await self.request(
+            "PATCH", path, params=params, data=data, headers=headers
+        )
+
+    async def request(self, verb, path, params=None, data=None, headers=None):
+        api = self.api
+        api.app.finalize()
+        path = api._add_prefix(path)
+        params = {**api.default_params, **(params or {})}
+        with instrumentation.span("client.request", label=verb, path=path):
+            headers = {
+                "Accept": api.app.accept_header,
+                **api.default_headers,
+                **(headers or {}),
+                **instrumentation.trace_headers(),
+            }
+            return await api.app.async_transport.request(
+                verb, api.app.base_url, path, params=params, data=data, headers=headers
+            )
+
+    def stream(self, verb, path, params=None, data=None, headers=None):
+        """Async context manager yielding a response whose body isn't read yet."""
+        api = self.api
+        api.app.finalize()
+        path = api._add_prefix(path)
+        params = {**api.default_params, **(params or {})}
+        headers = {
+            "Accept": api.app.accept_header,
+            **api.default_headers,
+            **(headers or {}),
+            **instrumentation.trace_headers(),
+        }
+        return api.app.async_transport.stream(
+            verb, api.app.base_url, path, params=params, data=data, headers=headers
+        )
+
+    async def rpc(
+        self,
+        method_name,
+        /,
+        args,
+        kwds,
+        rpc_verb="POST",
+        rpc_ret_parser: JSONParser = None,
+    ):
+        app = self.api.app
+        if app.coalesce_rpcs:
+            # calls made in the same loop tick share one `/rpc/batch` request
+            return await app.tick_batch.call(
+                self.api.prefix, method_name, args, kwds, rpc_ret_parser
+            )
+        with instrumentation.span(
+            "client.rpc", label=method_name, prefix=self.api.prefix
+        ):
+            response = await self.request(
+                **self.api._rpc_request(method_name, args, kwds, rpc_verb)
+            )
+            response.raise_for_status()
+            return self.api._parse_rpc_response(
+                decode_response(response), rpc_ret_parser
+            )
+
+    def sub_api(self, prefix) -> AsyncClientAPI:
+        return self.api.sub_api(prefix).aio
+
+    def __repr__(self) -> str:
+        return f"AsyncClientAPI(prefix={self.api.prefix!r})"
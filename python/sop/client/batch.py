@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import Any, Optional
+
+from python.sop.utils.codecs import decode_response
+from python.sop.utils.parsing import JSONParser
+
+
+_current_batch: ContextVar[Optional[RPCBatch]] = ContextVar(
+    "_current_batch", default=None
+)
+
+
+class RPCError(Exception):
+    """Raised when a single call inside a batch failed on the server."""
+
+    def __init__(self, method_name: str, status_code: int, detail: Any) -> None:
+        self.method_name = method_name
+        self.status_code = status_code
+        self.detail = detail
+        super().__init__(f"RPC {method_name} failed ({status_code}): {detail}")
+
+
+class PendingRPC:
+    """Placeholder for the result of an RPC call queued in a batch."""
+
+    _unresolved = object()
+
+    def __init__(
+        self,
+        batch: RPCBatch,
+        path: str,
+        method_name: str,
+        args: list[Any],
+        kwds: dict[str, Any],
+        ret_parser: Optional[JSONParser] = None,
+    ) -> None:
+        self.batch = batch
+        self.path = path
+        self.method_name = method_name
+        self.args = args
+        self.kwds = kwds
+        self.ret_parser = ret_parser
+        self._result = self._unresolved
+        self._error: Optional[Exception] = None
+
+    @property
+    def done(self) -> bool:
+        return self._result is not self._unresolved or self._error is not None
+
+    def result(self) -> Any:
+        # asking for a result sends everything queued so far in one request
+        if not self.done:
+            self.batch.flush()
+        if self._error is not None:
+            raise self._error
+        if self._result is self._unresolved:
+            raise RuntimeError(f"RPC {self.method_name} was never sent")
+        return self._result
+
+    def _resolve(self, response: dict[str, Any]) -> None:
+        if "error" in response:
+            error = response["error"]
+            self._error = RPCError(
+                self.method_name, error.get("status_code", 500), error.get("detail")
+            )
+        elif self.ret_parser is not None:
+            self._result = self.ret_parser.parse(response.get("result"))
+        else:
+            self._result = response.get("result")
+
+    def as_call(self) -> dict[str, Any]:
+        return {
+            "path": self.path or "",
+            "method_name": self.method_name,
+            "args": list(self.args),
+            "kwds": dict(self.kwds),
+        }
+
+
+class RPCBatch:
+    """Coalesces RPC calls into a single request to the app's `/rpc/batch`.
+
+    Use through `api.batch()`:
+
+    ```python
+    with app.batch():
+        name = user.display_name()
+        count = Resource.count_for(user.id)
+    print(name.result(), count.result())
+    ```
+
+    Inside the block, `ClientAPI.rpc` returns `PendingRPC`s instead of values.
+    Everything queued before the first `.result()` (or the end of the block)
+    goes out in one round trip.
+    """
+
+    def __init__(self, api) -> None:
+        # the app level api, which owns the `/rpc/batch` route
+        self.api = api
+        self.pending: list[PendingRPC] = []
+        self._token = None
+
+    @staticmethod
+    def current() -> Optional[RPCBatch]:
+        return _current_batch.get()
+
+    def add(
+        self,
+        path: str,
+        method_name: str,
+        args: list[Any],
+        kwds: dict[str, Any],
+        ret_parser: Optional[JSONParser] = None,
+    ) -> PendingRPC:
+        call = PendingRPC(self, path, method_name, args, kwds, ret_parser)
+        self.pending.append(call)
+        return call
+
+    def flush(self) -> None:
+        calls, self.pending = self.pending, []
+        if not calls:
+            return
+        try:
+            response = self.api.request(
+                "POST",
+                "/rpc/batch",
+                data=json.dumps([call.as_call() for call in calls]),
+                headers={"Content-Type": "application/json"},
+            )
+            response.raise_for_status()
+            results = _check_results(calls, decode_response(response))
+        except Exception as exc:
+            # each call's `result()` raises it, rather than returning nothing
+            for call in calls:
+                call._error = exc
+            raise
+        for call, result in zip(calls, results):
+            call._resolve(result)
+
+    def __enter__(self) -> RPCBatch:
+        self._token = _current_batch.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_batch.reset(self._token)
+        self._token = None
+        if exc_type is None:
+            self.flush()
+            return
+        calls, self.pending = self.pending, []
+        for call in calls:
+            call._error = RuntimeError(
+                f"RPC {call.method_name} was never sent: its batch raised {exc!r}"
+            )
+
+
+def _check_results(calls: list[PendingRPC], results: Any) -> list[dict[str, Any]]:
+    # one result per call, in order
+    if not isinstance(results, list) or len(results) != len(calls):
+        count = len(results) if isinstance(results, list) else "no"
+        raise RPCError(
+            "batch", 502, f"{count} results for a batch of {len(calls)} calls"
+        )
+    return results
+
+
+class TickBatch:
+    """Coalesces the async RPCs made in one event loop tick into one request.
+
+    With the client app's `coalesce_rpcs`, `api.aio.rpc` queues its call
+    here and awaits it. The first call of a tick schedules a flush for the
+    loop's next turn, so eg the calls started by one `asyncio.gather` go to
+    `/rpc/batch` together. Each caller gets its own result or `RPCError`.
+    """
+
+    def __init__(self, api) -> None:
+        # the app level api, which owns the `/rpc/batch` route
+        self.api = api
+        self.pending: list[tuple[PendingRPC, asyncio.Future]] = []
+
+    async def call(
+        self,
+        path: str,
+        method_name: str,
+        args: list[Any],
+        kwds: dict[str, Any],
+        ret_parser: Optional[JSONParser] = None,
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        if not self.pending:
+            loop.call_soon(lambda: loop.create_task(self.flush()))
+        future = loop.create_future()
+        call = PendingRPC(self, path, method_name, args, kwds, ret_parser)
+        self.pending.append((call, future))
+        return await future
+
+    async def flush(self) -> None:
+        queued, self.pending = self.pending, []
+        if not queued:
+            return
+        try:
+            response = await self.api.aio.request(
+                "POST",
+                "/rpc/batch",
+                data=json.dumps([call.as_call() for call, _ in queued]),
+                headers={"Content-Type": "application/json"},
+            )
+            response.raise_for_status()
+            results = _check_results(
+                [call for call, _ in queued], decode_response(response)
+            )
+        except Exception as exc:
+            for _, future in queued:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (call, future), result in zip(queued, results):
+            # eg its caller was cancelled
+            if future.done():
+                continue
+            call._resolve(result)
+            if call._error is not None:
+                future.set_exception(call._error)
+            else:
+                future.set_result(call._result)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+import threading
+import time
+from typing import Any, Optional
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    # stale entries confirmed unchanged by the server (304)
+    revalidations: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class CacheEntry:
+    # the JSON payload, so entries can live outside the process too
+    value: Any
+    etag: Optional[str] = None
+    expires_at: float = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class EntityCache:
+    """Interface for client-side entity caches, keyed by entity guid.
+
+    Subclass it to back the cache with something else (eg a shared store)
+    and set it as the app's `cache`.
+    """
+
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+
+    @abstractmethod
+    def get(self, guid: str) -> Optional[CacheEntry]:
+        """Returns the entry, fresh or stale, without counting a hit or miss."""
+        pass
+
+    @abstractmethod
+    def set(self, guid: str, value: Any, etag: Optional[str], ttl: float) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate(self, guid: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    def touch(self, guid: str, ttl: float) -> None:
+        """Marks a stale entry fresh again after the server confirmed it (304)."""
+        entry = self.get(guid)
+        if entry is not None:
+            entry.expires_at = time.monotonic() + ttl
+            self.stats.revalidations += 1
+
+
+class LRUEntityCache(EntityCache):
+    """In-process cache, evicting the least recently used entry past `max_size`.
+
+    Expired entries are kept (until evicted) so they can be revalidated with
+    their ETag instead of being fetched again in full.
+    """
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, guid: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(guid)
+            if entry is not None:
+                self._entries.move_to_end(guid)
+            return entry
+
+    def set(self, guid: str, value: Any, etag: Optional[str], ttl: float) -> None:
+        entry = CacheEntry(value, etag, time.monotonic() + ttl)
+        with self._lock:
+            self._entries[guid] = entry
+            self._entries.move_to_end(guid)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, guid: str) -> None:
+        with self._lock:
+            if self._entries.pop(guid, None) is not None:
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
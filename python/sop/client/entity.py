@@ -1,88 +1,652 @@
 from abc import abstractmethod
+import json
 from functools import cached_property
-from typing import Any, Self
+from typing import TYPE_CHECKING, Any, AsyncIterator, Iterator, Optional, Self, TypeVar
 
 import pydantic
-from python.sop.client.api import ClientAPI, SubController
+from python.sop.client.api import ClientAPI
 
 from python.sop.base.entity import BaseEntity
-from python.sop.client.app import App
+from python.sop.client.cache import CacheEntry
+from python.sop.client.feed import FeedSubscription
+from python.sop.client.identity_map import EntityRef, guid_for
+from python.sop.client.layout import (
+    EntityLayout,
+    assign_fields,
+    field_values,
+    get_field,
+)
+from python.sop.client.query import Query
 from python.sop.client.rpc import RPC
-from python.sop.utils.parsing import ClassParser, JSONParser
+from python.sop.utils.codecs import decode_response, stream_decoder
+from python.sop.utils.instrumentation import instrumentation
+from python.sop.utils.parsing import JSON, ClassParser, JSONParser, ParseError
 
+if TYPE_CHECKING:
+    from python.sop.client.app import App
 
-class ClientEntity(BaseEntity):
-    """Not intended for direct subclassing. Use `app.Entity` instead."""
+
+T_Entity = TypeVar("T_Entity", bound="ClientEntity")
+
+
+class _EntityAPI:
+    # `cls.api` is the type's api, `entity.api` the instance's, built on
+    # access rather than stored on every instance
+    def __get__(self, entity, cls) -> ClientAPI:
+        # finalizing gives the type its own api, bound to the app
+        cls.Meta.app.finalize()
+        api = cls.Meta.api
+        return api if entity is None else api.sub_api(entity.id)
+
+
+class ClientEntity(BaseEntity, metaclass=EntityLayout):
+    """Not intended for direct subclassing. Use `app.Entity` instead.
+
+    Instances are compact: subclasses get a slot per annotated field (see
+    `EntityLayout`) and no `__dict__`.
+    """
+
+    __slots__ = ("id", "_version", "_dirty", "_extras", "__weakref__")
+
+    api = _EntityAPI()
 
     class Meta(BaseEntity.Meta):
         # restated for type narrowing
         # don't assign either though, they will be set by the app.Entity method
         # use cls.controller to access the class level controller
         # use self.controller to access the instance level controller
-        api: ClientAPI
-        app: App
+        # each entity type gets its own when it's finalized
+        api: ClientAPI = ClientAPI()
+        app: "App"
 
-    def __init__(self) -> None:
-        # suppose the class level controller is at /<type>,
-        # then the instance level controller is at /<type>/<id>
-        self.api = self.__class__.api.sub_api(self.id)
-        super().__init__()
+        # overrides `app.cache_ttl` for this entity type
+        cache_ttl: Optional[float] = None
 
     @classmethod
     def create(cls, **kwargs):
         # POST `<host>/<type>/create` {**kwargs}
-        return cls.api.post_request("/create", **kwargs)
+        with instrumentation.span("crud.create", label=cls.__name__):
+            response = cls.api.post_request("/create", data=json.dumps(kwargs))
+            response.raise_for_status()
+            return decode_response(response)
 
     @classmethod
     def get_by_id(cls, id: str) -> Self:
-        # GET `<host>/<type>/<id>`
-        return cls.api.get_request(f"/{id}")
+        """Returns the entity, from the app's cache while the cached copy is fresh.
+
+        A stale copy is revalidated with its ETag, so an unchanged entity costs
+        an empty 304 instead of the full payload.
+        """
+        with instrumentation.span("crud.get_by_id", label=cls.__name__):
+            guid, entry = cls._cache_lookup(id)
+            if entry is not None and entry.fresh:
+                return cls.parser().parse(entry.value)
+
+            def fetch():
+                # GET `<host>/<type>/<id>`
+                response = cls.api.get_request(
+                    f"/{id}", headers=_revalidation_headers(entry)
+                )
+                return cls._from_response(guid, entry, response)
+
+            if not cls.app.single_flight_reads:
+                return fetch()
+            return cls.app.single_flight.do(cls._read_key(guid), fetch)
+
+    @classmethod
+    def _read_key(cls, guid: str) -> tuple:
+        # reads are only shared between callers sending the same credentials
+        return guid, tuple(sorted(cls.api.default_headers.items()))
+
+    @classmethod
+    def _cache_lookup(cls, id: str) -> tuple[str, Optional[CacheEntry]]:
+        cache, guid = cls.app.cache, guid_for(cls, id)
+        entry = cache.get(guid)
+        if entry is not None and entry.fresh:
+            cache.stats.hits += 1
+        else:
+            cache.stats.misses += 1
+        return guid, entry
+
+    @classmethod
+    def _from_response(cls, guid: str, entry: Optional[CacheEntry], response) -> Self:
+        ttl = cls.Meta.cache_ttl
+        if ttl is None:
+            ttl = cls.app.cache_ttl
+        if response.status_code == 304 and entry is not None:
+            cls.app.cache.touch(guid, ttl)
+            return cls.parser().parse(entry.value)
+        response.raise_for_status()
+        data = decode_response(response)
+        version = response.headers.get("X-Version")
+        if version is not None:
+            # stored like a field, so it's cached and merged along with them
+            data["_version"] = int(version)
+        cls.app.cache.set(guid, data, response.headers.get("ETag"), ttl)
+        with instrumentation.span("parse", label=cls.__name__):
+            return cls.parser().parse(data)
 
     @classmethod
     def get_many(cls, ids: list[str]) -> list[Self]:
-        # GET `<host>/<type>&ids=<ids>`
-        return cls.api.get_request("", params={"ids": ids})
+        """Returns the entities for `ids`, in order, skipping unknown ids.
+
+        Mapped entities whose cached copy is still fresh aren't requested
+        again; the rest, stale ones included, are fetched in a single request.
+        """
+        with instrumentation.span("crud.get_many", label=cls.__name__):
+            found, missing = cls._partition(ids)
+            if missing:
+                # GET `<host>/<type>/many?ids=<id>&ids=<id>...`
+                response = cls.api.get_request("/many", params={"ids": missing})
+                response.raise_for_status()
+                found.update(cls._parse_many(decode_response(response)))
+        return cls._in_order(ids, found)
+
+    @classmethod
+    def _partition(cls, ids: list[str]) -> tuple[dict[str, Self], list[str]]:
+        # the identity map only answers within the cache's ttl, like get_by_id
+        def fresh(id: str) -> bool:
+            entry = cls._cache_lookup(id)[1]
+            return entry is not None and entry.fresh
+
+        return cls.app.identity_map.partition(cls, ids, fresh)
+
+    @classmethod
+    def pull_many(cls, entities: list[Self]) -> None:
+        """`pull_updates` for many entities at once, in a single request."""
+        if not entities:
+            return
+        response = cls.api.get_request(
+            "/many", params={"ids": [entity.id for entity in entities]}
+        )
+        response.raise_for_status()
+        # parsing merges the fresh fields into the mapped (ie, these) objects
+        cls._parse_many(decode_response(response))
+
+    @classmethod
+    def _parse_many(cls, body: dict) -> dict[str, Self]:
+        parser = cls.parser()
+        entities = {}
+        items = body["items"]
+        with instrumentation.span("parse", label=cls.__name__, count=len(items)):
+            for item in items:
+                entity = parser.parse(item)
+                entities[str(entity.id)] = entity
+        return entities
+
+    @classmethod
+    def _in_order(cls, ids: list[str], found: dict[Any, Self]) -> list[Self]:
+        # ids may be passed as ints (eg from `create`); match them as strings
+        found = {str(id): entity for id, entity in found.items()}
+        return [found[id] for id in map(str, dict.fromkeys(ids)) if id in found]
+
+    @classmethod
+    def query(cls) -> Query[Self]:
+        """Starts a query that filters, orders and pages in the server's db."""
+        return Query(cls)
 
     @classmethod
     def get_all(cls) -> list[Self]:
-        # GET `<host>/<type>`
-        return cls.api.get_request("")
+        # pulled page by page, so the server never builds one huge response
+        return list(cls.iter_all())
+
+    @classmethod
+    def get_page(
+        cls, after: Optional[str] = None, limit: int = 100
+    ) -> tuple[list[Self], Optional[str]]:
+        # GET `<host>/<type>/page?after=<cursor>&limit=<limit>`
+        params = {"limit": limit} if after is None else {"after": after, "limit": limit}
+        response = cls.api.get_request("/page", params=params)
+        response.raise_for_status()
+        page = decode_response(response)
+        return [cls.parser().parse(item) for item in page["items"]], page["next_cursor"]
+
+    @classmethod
+    def iter_all(cls, batch_size: int = 100, stream: bool = False) -> Iterator[Self]:
+        """Lazily iterates over every entity of this type.
+
+        By default pages of `batch_size` are requested one at a time. With
+        `stream=True` the server sends one stream instead, and entities are
+        parsed as they arrive.
+        """
+        parser = cls.parser()
+        if stream:
+            # GET `<host>/<type>/stream?batch_size=<batch_size>`
+            response = cls.api.get_request(
+                "/stream", params={"batch_size": batch_size}, stream=True
+            )
+            with response:
+                response.raise_for_status()
+                decoder = stream_decoder(response)
+                for chunk in response.iter_content(chunk_size=None):
+                    for item in decoder.feed(chunk):
+                        yield parser.parse(item)
+            return
+        after = None
+        while True:
+            items, after = cls.get_page(after=after, limit=batch_size)
+            yield from items
+            if after is None:
+                return
 
     @classmethod
     def update_by_id(cls, id: int, data: Self):
-        # POST `<host>/<type>/<id>/update` {**data}
-        return cls.api.put_request(f"/{id}", data=data.dict())
+        # PUT `<host>/<type>/<id>` {**data}
+        response = cls.api.put_request(**cls._update_request(id, data))
+        # after the write, so a read racing it can't re-cache the old state
+        cls.app.cache.invalidate(guid_for(cls, id))
+        return response
+
+    @classmethod
+    def _update_request(cls, id: int, data: Self) -> dict[str, Any]:
+        fields = {
+            name: value
+            for name, value in field_values(data).items()
+            if name != "id" and not name.startswith("_")
+        }
+        return dict(
+            path=f"/{id}",
+            data=json.dumps(fields, default=_entity_id),
+            headers={"Content-Type": "application/json"},
+        )
 
     def push_updates(self):
-        self.update_by_id(self.id, self)
+        """Sends the fields set since the last sync, see `sync`."""
+        if self.dirty_fields:
+            self.sync()
+
+    def sync(self):
+        """Delta sync in one round trip.
+
+        PATCHes only the fields set since the last sync, along with the
+        version they were based on, and applies the fields the server changed
+        since that version. Raises `SyncConflict` (and keeps the local
+        changes) if someone else changed one of the same fields meanwhile.
+        """
+        with instrumentation.span("crud.sync", label=type(self).__name__):
+            request, changes = self._sync_request()
+            # PATCH `<host>/<type>/<id>` {"version": ..., "changes": {...}}
+            response = type(self).api.patch_request(**request)
+            self._apply_sync_response(changes, response)
+
+    @property
+    def dirty_fields(self) -> set[str]:
+        return get_field(self, "_dirty") or set()
+
+    def _dirty_changes(self) -> dict[str, Any]:
+        values = field_values(self)
+        return {name: values[name] for name in self.dirty_fields if name in values}
+
+    def _sync_request(self) -> tuple[dict[str, Any], dict[str, Any]]:
+        changes = self._dirty_changes()
+        request = dict(
+            path=f"/{self.id}",
+            data=json.dumps(
+                {"version": get_field(self, "_version"), "changes": changes},
+                default=_entity_id,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        return request, changes
+
+    def _apply_sync_response(self, changes: dict[str, Any], response) -> None:
+        if response.status_code == 409:
+            detail = decode_response(response)["detail"]
+            raise SyncConflict(self, detail["conflicts"], detail["version"])
+        response.raise_for_status()
+        self._apply_delta(changes, decode_response(response))
+
+    def _apply_delta(self, changes: dict[str, Any], delta: dict[str, Any]) -> None:
+        # `changes` is what was sent, `delta` what the server sent back
+        parsers = type(self).parser().field_parsers
+        assign_fields(
+            self,
+            (
+                (name, parsers[name].parse(value) if name in parsers else value)
+                for name, value in delta["changes"].items()
+            ),
+        )
+        assign_fields(self, [("_version", delta["version"])])
+        # fields set again while the request was in flight stay dirty
+        dirty = self.dirty_fields
+        for name, value in changes.items():
+            if get_field(self, name) is value:
+                dirty.discard(name)
+        self.app.cache.invalidate(self.guid)
 
     def pull_updates(self):
-        # POST `<host>/<type>/<id>/pull_updates`
-        updated_self = self.get_by_id(self.id)
-        self.__dict__.update(updated_self.__dict__)
+        # always asks the server, but an unchanged entity only costs a 304
+        guid = guid_for(type(self), self.id)
+        entry = self.app.cache.get(guid)
+        self.app.cache.stats.misses += 1
+        # GET `<host>/<type>/<id>`
+        response = type(self).api.get_request(
+            f"/{self.id}", headers=_revalidation_headers(entry)
+        )
+        updated_self = self._from_response(guid, entry, response)
+        if updated_self is not self:
+            assign_fields(self, field_values(updated_self).items())
 
     @classmethod
     def delete_by_id(cls, id: int):
         # DELETE `<host>/<type>/<id>`
-        cls.api.delete_request(f"/{id}")
+        with instrumentation.span("crud.delete", label=cls.__name__):
+            cls.api.delete_request(f"/{id}")
+        cls.app.cache.invalidate(guid_for(cls, id))
 
     def delete(self):
         self.delete_by_id(self.id)
 
-    @cached_property
+    # bulk variants. Items are sent in as few requests as the app's
+    # `bulk_max_items`/`bulk_max_bytes` allow; the server runs each request
+    # as one transaction. Each returns one `{"result": ...}` or `{"error":
+    # {"status_code": ..., "detail": ...}}` per item, in order
+
     @classmethod
-    def parser(cls) -> ClassParser[Self]:
-        return ClassParser(T=cls)
+    def create_many(cls, items: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Creates an entity per dict of fields. Results are the new ids."""
+        # POST `<host>/<type>/create_many` [{...}, ...]
+        return cls._bulk("/create_many", items)
+
+    @classmethod
+    def update_many(cls, entities: list[Self]) -> list[dict[str, Any]]:
+        """`sync` for many entities, in bulk.
+
+        Conflicts are reported as 409 errors in the results instead of
+        raised; those entities keep their local changes.
+        """
+        synced = [(entity, entity._dirty_changes()) for entity in entities]
+        items = [
+            {
+                "id": entity.id,
+                "version": get_field(entity, "_version"),
+                "changes": changes,
+            }
+            for entity, changes in synced
+        ]
+        # POST `<host>/<type>/update_many` [{"id", "version", "changes"}, ...]
+        results = cls._bulk("/update_many", items)
+        for (entity, changes), result in zip(synced, results):
+            if "result" in result:
+                entity._apply_delta(changes, result["result"])
+        return results
+
+    @classmethod
+    def delete_many(cls, ids: list[str]) -> list[dict[str, Any]]:
+        # POST `<host>/<type>/delete_many` [<id>, ...]
+        results = cls._bulk("/delete_many", list(ids))
+        for id in ids:
+            cls.app.cache.invalidate(guid_for(cls, id))
+        return results
+
+    @classmethod
+    def _bulk(cls, path: str, items: list[Any]) -> list[dict[str, Any]]:
+        results = []
+        for body in _chunked_json(
+            items, cls.app.bulk_max_items, cls.app.bulk_max_bytes
+        ):
+            response = cls.api.post_request(
+                path, data=body, headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+            results.extend(decode_response(response))
+        return results
+
+    def subscribe(self) -> FeedSubscription:
+        """Keeps this entity up to date with changes pushed by the server."""
+        return self.app.feed.subscribe(guid=self.guid)
+
+    @classmethod
+    def subscribe_all(cls, where: Optional[dict[str, Any]] = None) -> FeedSubscription:
+        """Subscribes to changes to every entity of this type (matching `where`)."""
+        return cls.app.feed.subscribe(entity=cls, where=where)
+
+    # awaitable counterparts of the methods above. They go through `api.aio`,
+    # so eg `asyncio.gather(*(User.get_by_id_async(id) for id in ids))` runs
+    # the requests concurrently on the app's async connection pool
+
+    @classmethod
+    async def create_async(cls, **kwargs):
+        response = await cls.api.aio.post_request("/create", data=json.dumps(kwargs))
+        response.raise_for_status()
+        return decode_response(response)
+
+    @classmethod
+    async def get_by_id_async(cls, id: str) -> Self:
+        guid, entry = cls._cache_lookup(id)
+        if entry is not None and entry.fresh:
+            return cls.parser().parse(entry.value)
+
+        async def fetch():
+            response = await cls.api.aio.get_request(
+                f"/{id}", headers=_revalidation_headers(entry)
+            )
+            return cls._from_response(guid, entry, response)
+
+        if not cls.app.single_flight_reads:
+            return await fetch()
+        return await cls.app.async_single_flight.do(cls._read_key(guid), fetch)
+
+    @classmethod
+    async def get_many_async(cls, ids: list[str]) -> list[Self]:
+        found, missing = cls._partition(ids)
+        if missing:
+            response = await cls.api.aio.get_request("/many", params={"ids": missing})
+            response.raise_for_status()
+            found.update(cls._parse_many(decode_response(response)))
+        return cls._in_order(ids, found)
+
+    @classmethod
+    async def get_all_async(cls) -> list[Self]:
+        return [entity async for entity in cls.iter_all_async()]
+
+    @classmethod
+    async def get_page_async(
+        cls, after: Optional[str] = None, limit: int = 100
+    ) -> tuple[list[Self], Optional[str]]:
+        params = {"limit": limit} if after is None else {"after": after, "limit": limit}
+        response = await cls.api.aio.get_request("/page", params=params)
+        response.raise_for_status()
+        page = decode_response(response)
+        return [cls.parser().parse(item) for item in page["items"]], page["next_cursor"]
+
+    @classmethod
+    async def iter_all_async(
+        cls, batch_size: int = 100, stream: bool = False
+    ) -> AsyncIterator[Self]:
+        parser = cls.parser()
+        if stream:
+            async with cls.api.aio.stream(
+                "GET", "/stream", params={"batch_size": batch_size}
+            ) as response:
+                response.raise_for_status()
+                decoder = stream_decoder(response)
+                async for chunk in response.aiter_bytes():
+                    for item in decoder.feed(chunk):
+                        yield parser.parse(item)
+            return
+        after = None
+        while True:
+            items, after = await cls.get_page_async(after=after, limit=batch_size)
+            for item in items:
+                yield item
+            if after is None:
+                return
+
+    @classmethod
+    async def update_by_id_async(cls, id: int, data: Self):
+        response = await cls.api.aio.put_request(**cls._update_request(id, data))
+        cls.app.cache.invalidate(guid_for(cls, id))
+        return response
+
+    async def push_updates_async(self):
+        if self.dirty_fields:
+            await self.sync_async()
+
+    async def pull_updates_async(self):
+        guid = guid_for(type(self), self.id)
+        entry = self.app.cache.get(guid)
+        self.app.cache.stats.misses += 1
+        response = await type(self).api.aio.get_request(
+            f"/{self.id}", headers=_revalidation_headers(entry)
+        )
+        updated_self = self._from_response(guid, entry, response)
+        if updated_self is not self:
+            assign_fields(self, field_values(updated_self).items())
+
+    async def sync_async(self):
+        request, changes = self._sync_request()
+        response = await type(self).api.aio.patch_request(**request)
+        self._apply_sync_response(changes, response)
+
+    @classmethod
+    async def delete_by_id_async(cls, id: int):
+        await cls.api.aio.delete_request(f"/{id}")
+        cls.app.cache.invalidate(guid_for(cls, id))
+
+    async def delete_async(self):
+        await self.delete_by_id_async(self.id)
+
+    @classmethod
+    def parser(cls) -> "EntityParser[Self]":
+        # one parser per entity class, built on first use
+        if "_parser" not in vars(cls):
+            cls._parser = EntityParser(cls)
+        return cls._parser
+
+    @classmethod
+    def _from_data(cls, fields: dict[str, Any]) -> Self:
+        # hydrate without __new__, which would create a new entity on the server
+        entity = object.__new__(cls)
+        assign_fields(entity, fields.items())
+        return entity
 
     def __getattribute__(self, __name: str) -> Any:
         try:
-            return super().__getattribute__(__name)
+            value = super().__getattribute__(__name)
         except AttributeError as e:
-            if self.app.auto_rpc:
-                return RPC(self.api, __name)
-            raise e
-
-    def __init_subclass__(cls) -> None:
-        # create parser so the JSONParser has it in its registry
-        _ = cls.parser()
-        return super().__init_subclass__()
+            value = _field_fallback(self, __name)
+            if value is _NO_FIELD:
+                if self.app.auto_rpc:
+                    return RPC(__name, self.api)
+                raise e
+        if type(value) is EntityRef:
+            # loads every pending reference of that type in one request
+            value = value.resolve()
+            assign_fields(self, [(__name, value)])
+        return value
+
+    def __setattr__(self, __name: str, __value: Any) -> None:
+        assign_fields(self, [(__name, __value)])
+        if not __name.startswith("_") and __name not in _UNTRACKED:
+            # hydration uses assign_fields directly, so only user writes get here
+            dirty = get_field(self, "_dirty")
+            if dirty is None:
+                dirty = set()
+                object.__setattr__(self, "_dirty", dirty)
+            dirty.add(__name)
+
+    @classmethod
+    def _finalize_registration(cls) -> None:
+        super()._finalize_registration()
+        with cls.app.registry.timed(cls, "parser"):
+            # create parser so the JSONParser has it in its registry
+            _ = cls.parser()
+
+    # until then, `JSONParser.for_type` builds it through this
+    _json_parser = parser
+
+
+# attributes that aren't entity fields
+_UNTRACKED = frozenset({"api", "Meta"})
+
+_NO_FIELD = object()
+
+
+def _field_fallback(entity: ClientEntity, name: str) -> Any:
+    # an unset slot reads as its class default; undeclared fields are extras
+    defaults = type(entity)._field_defaults
+    if name in defaults:
+        return defaults[name]
+    extras = get_field(entity, "_extras")
+    if extras and name in extras:
+        return extras[name]
+    return _NO_FIELD
+
+
+class SyncConflict(Exception):
+    """Fields changed on the server since the version a `sync` was based on.
+
+    The local changes are kept. To overwrite the server's values anyway, set
+    `entity._version = conflict.version` and sync again.
+    """
+
+    def __init__(self, entity: ClientEntity, conflicts: dict[str, Any], version: int):
+        self.entity = entity
+        # field -> current server value
+        self.conflicts = conflicts
+        self.version = version
+        super().__init__(f"{entity.guid} changed on the server: {sorted(conflicts)}")
+
+
+def _entity_id(value: Any) -> Any:
+    # references are sent as ids, like the server sends them
+    if isinstance(value, ClientEntity):
+        return value.id
+    return str(value)
+
+
+def _chunked_json(items: list[Any], max_items: int, max_bytes: int) -> Iterator[str]:
+    """Encodes `items` as JSON arrays of at most `max_items` and ~`max_bytes`.
+
+    Items are encoded once each; an item bigger than `max_bytes` goes alone.
+    """
+    chunk, size = [], 2
+    for item in items:
+        encoded = json.dumps(item, default=_entity_id)
+        if chunk and (len(chunk) >= max_items or size + len(encoded) + 1 > max_bytes):
+            yield "[" + ",".join(chunk) + "]"
+            chunk, size = [], 2
+        chunk.append(encoded)
+        size += len(encoded) + 1
+    if chunk:
+        yield "[" + ",".join(chunk) + "]"
+
+
+def _revalidation_headers(entry: Optional[CacheEntry]) -> Optional[dict[str, str]]:
+    if entry is None or entry.etag is None:
+        return None
+    return {"If-None-Match": entry.etag}
+
+
+class EntityParser(ClassParser[T_Entity]):
+    """Parses entities through the app's identity map.
+
+    A JSON object is merged into the mapped entity with the same id (so each
+    entity has one object on the client). A bare id, which is how the server
+    sends references like `owner: User`, becomes the mapped entity or an
+    `EntityRef` that is resolved in bulk on first access.
+    """
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (dict, str, int, self.T))
+
+    def parse(self, data: JSON) -> T_Entity:
+        if isinstance(data, self.T):
+            return data
+        identity_map = self.T.app.identity_map
+        if isinstance(data, dict):
+            return identity_map.merge(self.parse_detached(data))
+        if isinstance(data, (str, int)) and not isinstance(data, bool):
+            return identity_map.reference(self.T, data)
+        raise ParseError(f"Could not parse {data} to {self.T.__name__}")
+
+    def parse_detached(self, data: dict[str, Any]) -> T_Entity:
+        """Parses a JSON object into a new entity, without mapping it."""
+        parsers = self.field_parsers
+        return self.T._from_data(
+            {
+                key: parsers[key].parse(value) if key in parsers else value
+                for key, value in data.items()
+            }
+        )
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from python.sop.client.layout import assign_fields
+
+try:
+    from websockets.sync.client import connect as websocket_connect
+except ImportError:
+    websocket_connect = None
+
+logger = logging.getLogger(__name__)
+
+
+class FeedSubscription:
+    """A live subscription; see `ChangeFeedClient.subscribe`."""
+
+    def __init__(self, feed: ChangeFeedClient, id: str, spec: dict[str, Any]) -> None:
+        self.feed = feed
+        self.id = id
+        self.spec = spec
+        self.callbacks: list[Callable[[dict], Any]] = []
+
+    def on_event(self, callback: Callable[[dict], Any]) -> Callable[[dict], Any]:
+        """Registers `callback(event)`, called after the event was applied."""
+        self.callbacks.append(callback)
+        return callback
+
+    def covers(self, event: dict[str, Any]) -> bool:
+        # `where` is checked by the server; deltas alone can't be matched
+        if "guid" in self.spec:
+            return self.spec["guid"] == f"{event['entity']}:{event['id']}"
+        return self.spec["entity"] == event["entity"]
+
+    def cancel(self) -> None:
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeedClient:
+    """Keeps entities in the app's identity map up to date from the server.
+
+    One connection per app carries every subscription: a websocket if the
+    `websockets` package is installed, else a server-sent event stream over
+    the app's pooled transport. Updates are applied in place to the mapped
+    entity objects, and their cache entries are invalidated, from a
+    background thread. The connection is reopened (and every subscription
+    restored) if it drops, resuming from the last cursor the server sent;
+    if the server can't replay what was missed, the subscribed entities are
+    resynced (see `resync`).
+    """
+
+    def __init__(self, app, reconnect_delay: float = 1.0) -> None:
+        self.app = app
+        self.reconnect_delay = reconnect_delay
+        self.subscriptions: dict[str, FeedSubscription] = {}
+        self.received = 0
+        # where to resume from, ie, the server's position after the last batch
+        self.cursor: Optional[str] = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._connection = None
+        self._closed = False
+        # set while an sse stream is closed on purpose, to be reopened
+        self._reopening = False
+
+    @property
+    def uses_websocket(self) -> bool:
+        return websocket_connect is not None
+
+    def subscribe(
+        self,
+        guid: Optional[str] = None,
+        entity: Optional[type | str] = None,
+        where: Optional[dict[str, Any]] = None,
+    ) -> FeedSubscription:
+        """Subscribes to one entity by guid, or to an entity type.
+
+        `where` narrows a type subscription to entities with those field
+        values, eg `subscribe(entity=Resource, where={"owner": user.id})`.
+        """
+        if (guid is None) == (entity is None):
+            raise ValueError("Subscribe to exactly one of `guid` or `entity`")
+        if guid is not None:
+            spec = {"guid": guid}
+        else:
+            spec = {"entity": entity if isinstance(entity, str) else entity.__name__}
+            if where:
+                spec["where"] = where
+        subscription = FeedSubscription(self, str(next(self._ids)), spec)
+        with self._lock:
+            self.subscriptions[subscription.id] = subscription
+        self._send({"op": "subscribe", "id": subscription.id, **spec})
+        self._ensure_running()
+        return subscription
+
+    def unsubscribe(self, subscription: FeedSubscription) -> None:
+        with self._lock:
+            self.subscriptions.pop(subscription.id, None)
+        self._send({"op": "unsubscribe", "id": subscription.id})
+
+    def close(self) -> None:
+        self._closed = True
+        self._disconnect()
+
+    def _ensure_running(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._closed = False
+                self._thread = threading.Thread(
+                    target=self._run, name="sop-feed", daemon=True
+                )
+                self._thread.start()
+
+    def _send(self, message: dict[str, Any]) -> None:
+        connection = self._connection
+        if connection is None:
+            # sent with every other subscription when the connection opens
+            return
+        if self.uses_websocket:
+            try:
+                connection.send(json.dumps(message))
+            except Exception:
+                # the reader thread notices and reconnects
+                logger.warning("change feed send failed", exc_info=True)
+        else:
+            # an sse stream's subscriptions are fixed; reopen it, from the
+            # cursor, so nothing published meanwhile is missed
+            self._reopening = True
+            self._disconnect()
+
+    def _disconnect(self) -> None:
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        # closing an sse response waits for the reader thread's read to
+        # return, ie, up to a keepalive; shutting the socket ends it now
+        sock = getattr(getattr(connection, "raw", None), "connection", None)
+        sock = getattr(sock, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        connection.close()
+
+    def _run(self) -> None:
+        while not self._closed and self.subscriptions:
+            try:
+                if self.uses_websocket:
+                    self._read_websocket()
+                else:
+                    self._read_sse()
+            except Exception:
+                if not self._closed and not self._reopening:
+                    logger.warning(
+                        "change feed connection failed, reconnecting in %ss",
+                        self.reconnect_delay,
+                        exc_info=True,
+                    )
+            self._connection = None
+            if self._reopening:
+                self._reopening = False
+            elif not self._closed:
+                time.sleep(self.reconnect_delay)
+
+    def _subscribe_messages(self) -> list[dict[str, Any]]:
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+        return [
+            {"op": "subscribe", "id": subscription.id, **subscription.spec}
+            for subscription in subscriptions
+        ]
+
+    def _resume(self, first_batch: list[dict[str, Any]]) -> Optional[dict]:
+        # called with a new connection's first batch, ie, its cursor. Returns
+        # the message asking for the events missed since the last connection;
+        # the old cursor is kept until they're delivered
+        if self.cursor is None:
+            self.cursor = first_batch[-1]["cursor"]
+            return None
+        return {"op": "resume", "after": self.cursor}
+
+    def _read_websocket(self) -> None:
+        url = self.app.base_url.replace("http", "ws", 1).rstrip("/") + "/feed"
+        # the app's credentials, for the server's `authenticate`
+        headers = self.app.default_headers
+        with websocket_connect(url, additional_headers=headers) as connection:
+            self._connection = connection
+            resume = self._resume(json.loads(connection.recv()))
+            for message in self._subscribe_messages():
+                connection.send(json.dumps(message))
+            if resume is not None:
+                connection.send(json.dumps(resume))
+            for frame in connection:
+                self._apply(json.loads(frame))
+
+    def _read_sse(self) -> None:
+        connect_timeout = self.app.transport.timeout
+        if isinstance(connect_timeout, tuple):
+            connect_timeout = connect_timeout[0]
+        params = {"subscriptions": json.dumps(self._subscribe_messages())}
+        if self.cursor is not None:
+            params["after"] = self.cursor
+        response = self.app.transport.request(
+            "GET",
+            self.app.base_url,
+            "feed/sse",
+            params=params,
+            headers=self.app.default_headers,
+            # no read timeout; the server sends keepalives
+            timeout=(connect_timeout, None),
+            stream=True,
+        )
+        with response:
+            response.raise_for_status()
+            self._connection = response
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    self._apply(json.loads(line[len("data: "):]))
+
+    def resync(self) -> None:
+        """Refetches what the subscriptions cover, after events were missed.
+
+        Cached copies are dropped, and the mapped entities the subscriptions
+        cover are reloaded in place, one request per entity type.
+        """
+        self.app.cache.clear()
+        with self._lock:
+            subscriptions = list(self.subscriptions.values())
+        stale: dict[type, list] = {}
+        for entity in self.app.identity_map.entities():
+            event = {"entity": type(entity).__name__, "id": entity.id}
+            if any(subscription.covers(event) for subscription in subscriptions):
+                stale.setdefault(type(entity), []).append(entity)
+        for cls, entities in stale.items():
+            try:
+                cls.pull_many(entities)
+            except Exception:
+                logger.warning("change feed resync of %s failed", cls.__name__)
+
+    def _apply(self, events: list[dict[str, Any]]) -> None:
+        for event in events:
+            match event["op"]:
+                case "cursor":
+                    self.cursor = event["cursor"]
+                    continue
+                case "resync":
+                    # events were dropped; cached copies can't be trusted
+                    self.resync()
+                case "update" | "delete" | "create":
+                    guid = f"{event['entity']}:{event['id']}"
+                    self.app.cache.invalidate(guid)
+                    entity = self.app.identity_map.get_by_guid(guid)
+                    if entity is not None and event["op"] == "update":
+                        _apply_changes(entity, event["changes"], event["version"])
+                case _:
+                    continue
+            self.received += 1
+            with self._lock:
+                subscriptions = list(self.subscriptions.values())
+            for subscription in subscriptions:
+                if event["op"] == "resync" or subscription.covers(event):
+                    for callback in subscription.callbacks:
+                        callback(event)
+
+
+def _apply_changes(entity: Any, changes: dict[str, Any], version: int) -> None:
+    parsers = type(entity).parser().field_parsers
+    # locally modified fields are left for the next sync to reconcile
+    dirty = entity.dirty_fields
+    assign_fields(
+        entity,
+        (
+            (name, parsers[name].parse(value) if name in parsers else value)
+            for name, value in changes.items()
+            if name not in dirty
+        ),
+    )
+    if not dirty:
+        assign_fields(entity, [("_version", version)])
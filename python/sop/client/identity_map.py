@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Iterable, Optional
+import weakref
+
+from python.sop.client.layout import assign_fields, field_values
+
+
+def guid_for(cls: type, id: Any) -> str:
+    # same format as `BaseEntity.guid`
+    return f"{cls.__name__}:{id}"
+
+
+class PendingBatch:
+    """Ids of one entity type that are referenced but not loaded yet."""
+
+    __slots__ = ("cls", "ids", "entities")
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        self.ids: set = set()
+        # strong refs to the loaded entities, so they outlive the weak map
+        # entries at least as long as some `EntityRef` still points at them
+        self.entities: Optional[dict[str, Any]] = None
+
+    def load(self) -> None:
+        if self.entities is None:
+            entities = self.cls.get_many(list(self.ids)) if self.ids else []
+            self.entities = {str(entity.id): entity for entity in entities}
+
+
+class EntityRef:
+    """Placeholder for a referenced entity that hasn't been loaded yet.
+
+    Stored in place of eg `resource.owner` when the server only sent the
+    owner's id. The first access resolves every pending reference to the
+    same entity type with a single `get_many`, so walking the `owner` of a
+    whole page of resources costs one round trip instead of one per row.
+    """
+
+    __slots__ = ("cls", "id", "identity_map", "batch")
+
+    def __init__(
+        self, cls: type, id: Any, identity_map: IdentityMap, batch: PendingBatch
+    ) -> None:
+        self.cls = cls
+        self.id = id
+        self.identity_map = identity_map
+        self.batch = batch
+
+    def resolve(self) -> Any:
+        entity = self.identity_map.get(self.cls, self.id)
+        if entity is None:
+            self.identity_map.load_pending(self.cls, self.batch)
+            entity = self.batch.entities.get(str(self.id))
+        return entity
+
+    def __repr__(self) -> str:
+        return f"EntityRef({self.cls.__name__}, {self.id!r})"
+
+
+class IdentityMap:
+    """Per-app map of loaded entities by guid.
+
+    Guarantees one object per entity on the client: loading an entity that is
+    already mapped updates the mapped object in place. Entries are weak, so
+    the map never keeps an entity alive by itself.
+    """
+
+    def __init__(self) -> None:
+        self._entities: weakref.WeakValueDictionary[str, Any] = (
+            weakref.WeakValueDictionary()
+        )
+        # ids referenced by loaded entities but not loaded themselves
+        self._pending: dict[type, PendingBatch] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def __contains__(self, guid: str) -> bool:
+        return guid in self._entities
+
+    def get(self, cls: type, id: Any) -> Optional[Any]:
+        return self._entities.get(guid_for(cls, id))
+
+    def get_by_guid(self, guid: str) -> Optional[Any]:
+        return self._entities.get(guid)
+
+    def merge(self, entity: Any) -> Any:
+        """Maps `entity`, or copies its fields onto the already mapped object."""
+        guid = entity.guid
+        with self._lock:
+            existing = self._entities.get(guid)
+            if existing is None:
+                self._entities[guid] = entity
+                return entity
+        if existing is not entity:
+            assign_fields(existing, field_values(entity).items())
+        return existing
+
+    def entities(self) -> list[Any]:
+        """A snapshot of the mapped entities."""
+        with self._lock:
+            return list(self._entities.values())
+
+    def reference(self, cls: type, id: Any) -> Any:
+        entity = self.get(cls, id)
+        if entity is not None:
+            return entity
+        with self._lock:
+            batch = self._pending.get(cls)
+            if batch is None:
+                batch = self._pending[cls] = PendingBatch(cls)
+            batch.ids.add(id)
+        return EntityRef(cls, id, self, batch)
+
+    def partition(
+        self,
+        cls: type,
+        ids: Iterable[Any],
+        fresh: Optional[Callable[[Any], bool]] = None,
+    ) -> tuple[dict, list]:
+        """Splits `ids` into already mapped entities and ids still to fetch.
+
+        With `fresh`, mapped entities it returns False for are fetched too.
+        """
+        found, missing = {}, []
+        for id in dict.fromkeys(ids):
+            entity = self.get(cls, id)
+            if entity is None or (fresh is not None and not fresh(id)):
+                missing.append(id)
+            else:
+                found[id] = entity
+        return found, missing
+
+    def load_pending(self, cls: type, batch: Optional[PendingBatch] = None) -> None:
+        """Loads every pending reference to `cls` with one `get_many`."""
+        with self._lock:
+            if batch is None:
+                batch = self._pending.get(cls)
+            if batch is None:
+                return
+            # references made from now on start a new batch
+            if self._pending.get(cls) is batch:
+                del self._pending[cls]
+        batch.load()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entities.clear()
+            self._pending.clear()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import typing
+from typing import Any, Iterable, Optional
+
+
+def _is_field(name: str, hint: Any) -> bool:
+    if name.startswith("_"):
+        return False
+    if isinstance(hint, str):
+        return not hint.startswith(("ClassVar", "typing.ClassVar"))
+    return typing.get_origin(hint) is not typing.ClassVar
+
+
+class EntityLayout(type):
+    """Gives each entity class slots for the fields it annotates.
+
+    Field values then live in the instance itself, at fixed offsets, rather
+    than in a per-instance dict. A field's class-level default moves to
+    `_field_defaults`, since a slot can't have one; reads of unset fields
+    fall back to it. Fields a class doesn't declare (eg ones only the server
+    knows) go in an `_extras` dict, created only when there are some.
+    Classes that declare `__slots__` keep theirs.
+
+    `_field_slots` keeps each field's slot descriptor, so the helpers below
+    read and write the stored value even where a class puts a descriptor of
+    its own (eg a static client's `Reference`) in front of the slot.
+    """
+
+    def __new__(mcls, name: str, bases: tuple, namespace: dict, **kwds):
+        defaults = {}
+        if "__slots__" not in namespace:
+            inherited = {
+                slot
+                for base in bases
+                for klass in base.__mro__
+                for slot in vars(klass).get("__slots__", ())
+            }
+            fields = [
+                field
+                for field, hint in namespace.get("__annotations__", {}).items()
+                if _is_field(field, hint) and field not in inherited
+            ]
+            defaults = {
+                field: namespace.pop(field) for field in fields if field in namespace
+            }
+            namespace["__slots__"] = tuple(fields)
+        cls = super().__new__(mcls, name, bases, namespace, **kwds)
+        cls._field_defaults = {
+            **getattr(super(cls, cls), "_field_defaults", {}),
+            **defaults,
+        }
+        # every slot of the class, ie, the fields an instance can hold. Slots
+        # of bases come from their `_field_slots`, which outlive a descriptor
+        # later set over the slot
+        field_slots = {}
+        for klass in reversed(cls.__mro__[1:]):
+            field_slots.update(vars(klass).get("_field_slots", {}))
+        for slot in vars(cls).get("__slots__", ()):
+            if slot not in ("_extras", "__weakref__"):
+                field_slots[slot] = vars(cls)[slot]
+        cls._field_slots = field_slots
+        cls._field_names = tuple(field_slots)
+        return cls
+
+
+def get_field(entity: Any, name: str, default: Any = None) -> Any:
+    """Reads a stored field, skipping the entity's own `__getattribute__`."""
+    slot = type(entity)._field_slots.get(name)
+    try:
+        if slot is not None:
+            return slot.__get__(entity)
+        return object.__getattribute__(entity, name)
+    except AttributeError:
+        return default
+
+
+def field_values(entity: Any) -> dict[str, Any]:
+    """The fields set on `entity`, slots and extras alike."""
+    values = {}
+    for name, slot in type(entity)._field_slots.items():
+        try:
+            values[name] = slot.__get__(entity)
+        except AttributeError:
+            pass
+    extras: Optional[dict] = get_field(entity, "_extras")
+    if extras:
+        values.update(extras)
+    return values
+
+
+def assign_fields(entity: Any, items: Iterable[tuple[str, Any]]) -> None:
+    """Stores fields without going through the entity's `__setattr__`."""
+    slots = type(entity)._field_slots
+    for name, value in items:
+        slot = slots.get(name)
+        if slot is not None:
+            slot.__set__(entity, value)
+            continue
+        try:
+            object.__setattr__(entity, name, value)
+        except AttributeError:
+            extras = get_field(entity, "_extras")
+            if extras is None:
+                extras = {}
+                object.__setattr__(entity, "_extras", extras)
+            extras[name] = value
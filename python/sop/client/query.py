@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Generic, Iterator, Optional, TypeVar
+
+from python.sop.utils.codecs import decode_response
+
+T_Entity = TypeVar("T_Entity")
+
+# mirrors `QUERY_OPERATORS` on the server
+OPERATORS = frozenset(
+    {"eq", "ne", "lt", "le", "gt", "ge", "in", "contains", "startswith"}
+)
+
+
+class Query(Generic[T_Entity]):
+    """Builds a query that runs in the server's database.
+
+    Every method returns a new query, eg
+
+        Resource.query().filter(owner=user, size__gt=10).order_by("-size")
+
+    `filter` takes `field=value` for equality and `field__<op>=value` for the
+    other `OPERATORS`. Nothing is sent until the query is iterated or `all`,
+    `first` or `values` is called.
+    """
+
+    def __init__(self, entity_cls: type[T_Entity]) -> None:
+        self.entity_cls = entity_cls
+        self._where: tuple[tuple[str, str, Any], ...] = ()
+        self._order_by: tuple[str, ...] = ()
+        self._limit: Optional[int] = None
+        self._offset: int = 0
+        self._fields: tuple[str, ...] = ()
+
+    def _copy(self, **changes) -> Query[T_Entity]:
+        query = object.__new__(type(self))
+        query.__dict__.update(self.__dict__)
+        query.__dict__.update(changes)
+        return query
+
+    def filter(self, **conditions: Any) -> Query[T_Entity]:
+        where = list(self._where)
+        for key, value in conditions.items():
+            name, _, op = key.partition("__")
+            op = op or "eq"
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown operator {op} in {key}")
+            if hasattr(value, "guid"):
+                # references are compared by id
+                value = value.id
+            where.append((name, op, value))
+        return self._copy(_where=tuple(where))
+
+    def order_by(self, *fields: str) -> Query[T_Entity]:
+        """Orders by `fields`; prefix a field with `-` for descending order."""
+        return self._copy(_order_by=self._order_by + fields)
+
+    def limit(self, limit: int) -> Query[T_Entity]:
+        return self._copy(_limit=limit)
+
+    def offset(self, offset: int) -> Query[T_Entity]:
+        return self._copy(_offset=offset)
+
+    def only(self, *fields: str) -> Query[T_Entity]:
+        """Has the server send only these fields (and the id).
+
+        The entities returned have just those fields, and aren't mapped:
+        they're copies, not the app's objects for those entities.
+        """
+        return self._copy(_fields=self._fields + fields)
+
+    def to_json(self) -> dict[str, Any]:
+        document: dict[str, Any] = {"where": [list(c) for c in self._where]}
+        if self._order_by:
+            document["order_by"] = list(self._order_by)
+        if self._limit is not None:
+            document["limit"] = self._limit
+        if self._offset:
+            document["offset"] = self._offset
+        if self._fields:
+            document["fields"] = list(self._fields)
+        return document
+
+    def _request(self) -> dict[str, Any]:
+        return dict(
+            path="/query",
+            data=json.dumps(self.to_json(), default=str),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def values(self) -> list[dict[str, Any]]:
+        """Runs the query and returns the raw rows, without parsing them."""
+        # POST `<host>/<type>/query` {...}
+        response = self.entity_cls.api.post_request(**self._request())
+        response.raise_for_status()
+        return decode_response(response)["items"]
+
+    def all(self) -> list[T_Entity]:
+        return self._parse(self.values())
+
+    def _parse(self, items: list[dict[str, Any]]) -> list[T_Entity]:
+        parser = self.entity_cls.parser()
+        if self._fields:
+            # partial rows are kept out of the identity map, so they don't
+            # overwrite (or stand in for) the mapped entities' other fields
+            return [parser.parse_detached(item) for item in items]
+        return [parser.parse(item) for item in items]
+
+    def first(self) -> Optional[T_Entity]:
+        items = self.limit(1).all()
+        return items[0] if items else None
+
+    def __iter__(self) -> Iterator[T_Entity]:
+        return iter(self.all())
+
+    async def values_async(self) -> list[dict[str, Any]]:
+        response = await self.entity_cls.api.aio.post_request(**self._request())
+        response.raise_for_status()
+        return decode_response(response)["items"]
+
+    async def all_async(self) -> list[T_Entity]:
+        return self._parse(await self.values_async())
+
+    def __repr__(self) -> str:
+        return f"Query({self.entity_cls.__name__}, {self.to_json()})"
@@ -15,4 +15,20 @@ class RPC:
     ret_parser: JSONParser = JSONParser()
 
     def __call__(self, *args: Any, **kwds: Any) -> Any:
-        return self.controller.rpc(self.method_name, args, kwds, self.ret_parser)
+        return self.controller.rpc(
+            self.method_name, args, kwds, rpc_ret_parser=self.ret_parser
+        )
+
+    @property
+    def aio(self) -> "AsyncRPC":
+        return AsyncRPC(self.method_name, self.controller, self.ret_parser)
+
+
+@dataclass
+class AsyncRPC(RPC):
+    """Same as `RPC`, but calling it returns an awaitable."""
+
+    async def __call__(self, *args: Any, **kwds: Any) -> Any:
+        return await self.controller.aio.rpc(
+            self.method_name, args, kwds, rpc_ret_parser=self.ret_parser
+        )
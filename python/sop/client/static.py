@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from python.sop.client.api import ClientAPI
+from python.sop.client.app import App
+from python.sop.client.entity import (
+    ClientEntity,
+    _NO_FIELD,
+    _entity_id,
+    _field_fallback,
+)
+from python.sop.client.identity_map import EntityRef
+
+
+class _Unset:
+    def __repr__(self) -> str:
+        return "UNSET"
+
+
+# the default of generated parameters whose server default can't be written
+# out: left out of the call, so the server applies its own
+UNSET: Any = _Unset()
+
+
+def without_unset(values: dict[str, Any]) -> dict[str, Any]:
+    return {name: value for name, value in values.items() if value is not UNSET}
+
+
+def encode_body(value: Any) -> Optional[str]:
+    """A generated route's request body; entities are sent as their ids."""
+    if value is UNSET:
+        return None
+    return json.dumps(value, default=_entity_id)
+
+
+class StaticClientAPI(ClientAPI):
+    """`ClientAPI` with plain attribute lookup, for generated clients.
+
+    Generated entity classes declare every method they have, so their apis
+    are never merged into, or forwarded to, another.
+    """
+
+    __getattribute__ = object.__getattribute__
+
+    def merge(self, other: ClientAPI):
+        pass
+
+
+class StaticEntity(ClientEntity):
+    """Base of the entities of a generated client, see `python.sop.server.codegen`.
+
+    The generated class declares its fields, rpcs and routes, so attribute
+    lookup is the plain one: reading a set field or calling a method runs no
+    hook. Only misses (an unset field, or a field the client doesn't know)
+    fall back, to the field's default or the entity's extras.
+    """
+
+    __slots__ = ()
+
+    __getattribute__ = object.__getattribute__
+
+    class Meta(ClientEntity.Meta):
+        api: StaticClientAPI = StaticClientAPI()
+
+    def __getattr__(self, name: str) -> Any:
+        value = _field_fallback(self, name)
+        if value is _NO_FIELD:
+            raise AttributeError(f"{type(self).__name__} has no attribute {name}")
+        return value
+
+
+class Reference:
+    """A generated relation field, in front of its slot.
+
+    The server sends references as ids, which are parsed to `EntityRef`s.
+    The first read resolves every pending reference to that entity type at
+    once (see `EntityRef`) and stores the entity in the slot.
+    """
+
+    __slots__ = ("slot",)
+
+    def __init__(self, slot: Any) -> None:
+        self.slot = slot
+
+    def __get__(self, entity: Any, cls: type = None) -> Any:
+        if entity is None:
+            return self
+        # unset, it raises and the entity's `__getattr__` gives the default
+        value = self.slot.__get__(entity)
+        if type(value) is EntityRef:
+            value = value.resolve()
+            self.slot.__set__(entity, value)
+        return value
+
+    def __set__(self, entity: Any, value: Any) -> None:
+        self.slot.__set__(entity, value)
+
+    def __delete__(self, entity: Any) -> None:
+        self.slot.__delete__(entity)
+
+
+def reference_fields(cls: type, *names: str) -> None:
+    """Puts a `Reference` in front of each of these fields' slots."""
+    for name in names:
+        setattr(cls, name, Reference(cls._field_slots[name]))
+
+
+class StaticApp(App):
+    """Client app of a generated client: entities get no dynamic rpcs."""
+
+    T_Entity = StaticEntity
+    auto_rpc = False
+
+    __getattribute__ = object.__getattribute__
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import httpx
+except ImportError:  # only needed for the async client
+    httpx = None
+
+
+# verbs that are safe to resend after a connection error or a 502/503/504
+IDEMPOTENT_VERBS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+@dataclass
+class TransportStats:
+    requests: int = 0
+    # connections opened by the pools (a request that needs one is a miss)
+    new_connections: int = 0
+    sessions: int = 0
+
+    @property
+    def hits(self) -> int:
+        return max(self.requests - self.new_connections, 0)
+
+    @property
+    def misses(self) -> int:
+        return self.new_connections
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+
+class Transport:
+    """Pooled, keep-alive HTTP transport shared by all of an app's apis.
+
+    One `requests.Session` is kept per base url, so connections to the same
+    server are reused across requests instead of being reopened every time.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        timeout: float | tuple[float, float] = (3.05, 30),
+        max_retries: int = 3,
+        backoff_factor: float = 0.2,
+        retry_statuses: tuple[int, ...] = (502, 503, 504),
+    ) -> None:
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.timeout = timeout
+        self.retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=retry_statuses,
+            allowed_methods=IDEMPOTENT_VERBS,
+            raise_on_status=False,
+        )
+        self._sessions: dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def session_for(self, base_url: str) -> requests.Session:
+        session = self._sessions.get(base_url)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(base_url)
+                if session is None:
+                    session = self._sessions[base_url] = self._make_session()
+        return session
+
+    def _make_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+            max_retries=self.retry,
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def request(
+        self,
+        verb: str,
+        base_url: str,
+        path: str,
+        params=None,
+        data=None,
+        headers=None,
+        timeout: Optional[float | tuple[float, float]] = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        url = f"{base_url.rstrip('/')}/{path.lstrip('/')}"
+        return self.session_for(base_url).request(
+            verb,
+            url,
+            params=params,
+            data=data,
+            headers=headers,
+            timeout=timeout if timeout is not None else self.timeout,
+            # don't read the body up front; the caller iterates over it
+            stream=stream,
+        )
+
+    @property
+    def stats(self) -> TransportStats:
+        stats = TransportStats(sessions=len(self._sessions))
+        for session in list(self._sessions.values()):
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is None:
+                        continue
+                    stats.requests += pool.num_requests
+                    stats.new_connections += pool.num_connections
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+@dataclass
+class _LoopState:
+    # an event loop's clients and semaphore, which can't be used on another
+    loop: weakref.ref
+    semaphore: asyncio.Semaphore
+    clients: dict[str, "httpx.AsyncClient"] = field(default_factory=dict)
+
+
+class AsyncTransport:
+    """Async counterpart of `Transport`, backed by pooled `httpx.AsyncClient`s.
+
+    `max_concurrency` bounds the number of requests in flight at once, so
+    fanning out thousands of coroutines doesn't open thousands of sockets.
+    Clients and the semaphore are per event loop, eg each `asyncio.run` gets
+    its own.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_concurrency: int = 100,
+        timeout: float = 30.0,
+    ) -> None:
+        if httpx is None:
+            raise ImportError(
+                "AsyncTransport requires httpx: `pip install sop[async]`"
+            )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+        )
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._loops: dict[int, _LoopState] = {}
+        self.in_flight = 0
+        self.requests = 0
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(id(loop))
+        # the ids of closed loops get reused
+        if state is None or state.loop() is not loop:
+            # the clients of closed loops can't be closed anymore, only dropped
+            self._loops = {
+                key: state
+                for key, state in self._loops.items()
+                if state.loop() is not None and not state.loop().is_closed()
+            }
+            state = self._loops[id(loop)] = _LoopState(
+                weakref.ref(loop), asyncio.Semaphore(self.max_concurrency)
+            )
+        return state
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        return self._loop_state().semaphore
+
+    @property
+    def clients(self) -> dict[str, httpx.AsyncClient]:
+        """The running loop's clients, by base url."""
+        return self._loop_state().clients
+
+    def client_for(self, base_url: str) -> httpx.AsyncClient:
+        clients = self.clients
+        client = clients.get(base_url)
+        if client is None:
+            client = clients[base_url] = httpx.AsyncClient(
+                base_url=base_url, limits=self.limits, timeout=self.timeout
+            )
+        return client
+
+    async def request(
+        self,
+        verb: str,
+        base_url: str,
+        path: str,
+        params=None,
+        data=None,
+        headers=None,
+    ) -> httpx.Response:
+        async with self.semaphore:
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                return await self.client_for(base_url).request(
+                    verb,
+                    f"/{path.lstrip('/')}",
+                    params=params,
+                    content=data,
+                    headers=headers,
+                )
+            finally:
+                self.in_flight -= 1
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        verb: str,
+        base_url: str,
+        path: str,
+        params=None,
+        data=None,
+        headers=None,
+    ):
+        async with self.semaphore:
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                async with self.client_for(base_url).stream(
+                    verb,
+                    f"/{path.lstrip('/')}",
+                    params=params,
+                    content=data,
+                    headers=headers,
+                ) as response:
+                    yield response
+            finally:
+                self.in_flight -= 1
+
+    async def aclose(self) -> None:
+        """Closes the running loop's clients."""
+        state = self._loops.pop(id(asyncio.get_running_loop()), None)
+        for client in state.clients.values() if state is not None else ():
+            await client.aclose()
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, Mapping, Optional, Sequence
+
+from python.sop.utils.instrumentation import instrumentation
+
+# predicate results for the current request, by entity, then predicate
+_memo: ContextVar[Optional[dict]] = ContextVar("sop_acl_memo", default=None)
+# who the current request or feed connection is from, see `App.authenticate`
+_caller: ContextVar[Any] = ContextVar("sop_caller", default=None)
+
+
+def current_caller() -> Any:
+    """The caller `App.authenticate` returned, eg for acl predicates."""
+    return _caller.get()
+
+
+@contextmanager
+def caller_scope(caller: Any) -> Iterator[None]:
+    token = _caller.set(caller)
+    try:
+        yield
+    finally:
+        _caller.reset(token)
+
+
+@contextmanager
+def acl_scope() -> Iterator[None]:
+    """Memoizes acl predicate results until exit. Opened once per request.
+
+    Nested scopes share the outer one's results.
+    """
+    if _memo.get() is not None:
+        yield
+        return
+    token = _memo.set({})
+    try:
+        yield
+    finally:
+        _memo.reset(token)
+
+
+def check(predicate: Callable[[Any], bool], entity: Any) -> bool:
+    memo = _memo.get()
+    if memo is None:
+        return _evaluate(predicate, entity)
+    hit = memo.get(id(entity))
+    if hit is None:
+        # the entity is kept alive with its results so its id can't be reused
+        hit = memo[id(entity)] = (entity, {})
+    results = hit[1]
+    result = results.get(predicate)
+    if result is None:
+        result = results[predicate] = _evaluate(predicate, entity)
+    return result
+
+
+def forget(entity: Any) -> None:
+    """Drops the memoized results for `entity`, eg after it was written."""
+    memo = _memo.get()
+    if memo:
+        memo.pop(id(entity), None)
+
+
+def _evaluate(predicate: Callable[[Any], bool], entity: Any) -> bool:
+    if not instrumentation.enabled:
+        return bool(predicate(entity))
+    with instrumentation.span(
+        "acl.predicate", label=getattr(predicate, "__qualname__", None)
+    ):
+        return bool(predicate(entity))
+
+
+@dataclass(frozen=True)
+class RowRestriction:
+    """Restricts which rows of an entity type the caller can see at all.
+
+    `filter_by` returns the same condition as field values, eg
+    `{"owner": current_user}`, so list endpoints can apply it in the query
+    instead of loading every row and calling `predicate` on it.
+    """
+
+    predicate: Callable[[Any], bool]
+    filter_by: Optional[Callable[[], dict[str, Any]]] = None
+
+
+class AccessPlan:
+    """An entity type's access restrictions, compiled for fast evaluation.
+
+    Fields sharing a predicate (eg every field of one `requires_owner`) are
+    grouped, so serializing an entity calls each distinct predicate once,
+    and within an `acl_scope` at most once per entity per request.
+    """
+
+    def __init__(
+        self,
+        restrictions: Mapping[str, Callable[[Any], bool]],
+        row_restrictions: Sequence[RowRestriction] = (),
+    ) -> None:
+        self.predicates = dict(restrictions)
+        self.restricted = frozenset(restrictions)
+        groups: dict[Callable, set[str]] = {}
+        for name, predicate in restrictions.items():
+            groups.setdefault(predicate, set()).add(name)
+        self.groups = tuple(
+            (predicate, frozenset(names)) for predicate, names in groups.items()
+        )
+        self.row_restrictions = tuple(row_restrictions)
+        # row restrictions that can only be checked in python
+        self.row_checks = tuple(
+            restriction.predicate
+            for restriction in self.row_restrictions
+            if restriction.filter_by is None
+        )
+
+    def allows(self, entity: Any, name: str) -> bool:
+        predicate = self.predicates.get(name)
+        return predicate is None or check(predicate, entity)
+
+    def hidden_fields(self, entity: Any) -> frozenset[str]:
+        hidden = frozenset()
+        for predicate, names in self.groups:
+            if not check(predicate, entity):
+                hidden |= names
+        return hidden
+
+    def project(self, entity: Any, data: dict[str, Any]) -> dict[str, Any]:
+        """Nulls the fields of `data` the caller can't see."""
+        if not self.groups:
+            return data
+        hidden = self.hidden_fields(entity)
+        if not hidden:
+            return data
+        return {name: None if name in hidden else value for name, value in data.items()}
+
+    def row_visible(self, entity: Any) -> bool:
+        return all(
+            check(restriction.predicate, entity)
+            for restriction in self.row_restrictions
+        )
+
+    def filter_query(self, query):
+        """Applies the row restrictions that have a `filter_by` to an orm query.
+
+        Rows of the query still have to go through `visible_rows`.
+        """
+        for restriction in self.row_restrictions:
+            if restriction.filter_by is not None:
+                query = query.filter(**restriction.filter_by())
+        return query
+
+    def visible_rows(self, rows: Sequence[Any]) -> list[Any]:
+        """Drops the rows failing the row restrictions that weren't in the query."""
+        if not self.row_checks:
+            return list(rows)
+        return [
+            row
+            for row in rows
+            if all(check(predicate, row) for predicate in self.row_checks)
+        ]
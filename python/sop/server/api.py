@@ -1,16 +1,37 @@
 from __future__ import annotations
+import asyncio
 import functools
 import inspect
-from typing import Any, Callable, Optional, Type
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Optional, Type
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.routing import APIRoute
+from starlette.requests import HTTPConnection
 
 from python.sop.base.api import BaseAPI
-from python.sop.server.app import App
-from python.sop.server.entity import ServerEntity
+from python.sop.server.acl import (
+    RowRestriction,
+    acl_scope,
+    caller_scope,
+    current_caller,
+)
+from python.sop.server.dispatch import RPCMethod
+from python.sop.server.feed import ChangeEvent, Subscriber, encode_batch
+from python.sop.server.routing import RouteTable
+from python.sop.server.wire import NegotiatedResponse, wire_scope
+from python.sop.utils.instrumentation import TRACE_HEADER, instrumentation
 from python.sop.utils.parsing import JSONParser
 
+if TYPE_CHECKING:
+    from python.sop.server.app import App
+    from python.sop.server.entity import ServerEntity
+
+logger = logging.getLogger(__name__)
+
 
 class ServerAPI(BaseAPI):
     # just narrowing the types here
@@ -18,138 +39,572 @@ class ServerAPI(BaseAPI):
     parent: ServerAPI = None
     app: App = None
 
-    _fastapi: FastAPI = FastAPI()
-
-    # ServerEntity sets this on __init_subclass__
-    _rpc_entity_cls: Optional[Type[ServerEntity]]
-    # ServerEntity sets this on __init__
-    _rpc_entity_instance: Optional[ServerEntity]
+    # ServerEntity sets this when it's defined, see `bind_entity`
+    _rpc_entity_cls: Optional[Type[ServerEntity]] = None
+    # routes declared on this api not yet in the app's route table
+    _compiled_routes: int = 0
 
     # ... HTTP verb-specific decorators already defined in the base class
 
     def endpoint(self, verb, path=None):
-        """Returns decorator to register a function as an endpoint."""
-        return self._fastapi.api_route(path, methods=[verb])
+        """Returns decorator to register a function as an endpoint.
+
+        The app's own endpoints are registered right away. Those of entity
+        apis are recorded, and compiled into the app's flat route table when
+        the app is finalized (see `compile_routes`).
+        """
+        if self.app is self:
+            return self._fastapi.api_route(path, methods=[verb])
+
+        def declare(fn):
+            self.route_specs.append((verb, path, fn))
+            return fn
+
+        return declare
+
+    @functools.cached_property
+    def route_specs(self) -> list[tuple[str, str, Callable]]:
+        # (verb, path, endpoint), in declaration order. classmethod endpoints
+        # are bound to the entity type when compiled
+        return []
+
+    @functools.cached_property
+    def _fastapi(self) -> FastAPI:
+        # each app serves its own routes; mounted apis add theirs to it
+        if self.app is self:
+            return FastAPI()
+        return self.app._fastapi
+
+    @functools.cached_property
+    def route_table(self) -> RouteTable:
+        table = RouteTable()
+        self._fastapi.router.routes.append(table)
+        return table
+
+    def compile_routes(self) -> None:
+        """Adds the routes declared on every mounted api to the route table.
+
+        Routes get full paths, eg `/User/{id}`; nothing is mounted.
+        """
+        pending = list(self.sub_apis.values())
+        while pending:
+            api = pending.pop()
+            pending.extend(api.sub_apis.values())
+            for verb, path, endpoint in api.route_specs[api._compiled_routes :]:
+                if isinstance(endpoint, classmethod):
+                    assert api._rpc_entity_cls is not None, "Entity api without entity"
+                    endpoint = endpoint.__get__(None, api._rpc_entity_cls)
+                self.route_table.add(
+                    self._fastapi.router.route_class(
+                        "/" + api._add_prefix(path or ""),
+                        endpoint=endpoint,
+                        methods=[verb],
+                    )
+                )
+            api._compiled_routes = len(api.route_specs)
 
     cls_rpc_get_endpoint: Callable
     cls_rpc_post_endpoint: Callable
-    instance_rpc_get_endpoint: Callable
-    instance_rpc_post_endpoint: Callable
     jit_index_instance_rpc_get_endpoint: Callable
     jit_index_instance_rpc_post_endpoint: Callable
 
     def init_cls_rpc_endpoint(self):
         assert self._rpc_entity_cls is not None, "Must set _rpc_entity_cls first"
 
-        def _cls_rpc_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
-        ) -> Any:
-            args, kwds = JSONParser.parse(args), JSONParser.parse(kwds)
-            if hasattr(self._rpc_entity_cls, method_name):
-                fn = getattr(self._rpc_entity_cls, method_name)
-                if callable(fn) and inspect.ismethod(fn):
-                    return fn(*args, **kwds)
-            raise NotImplementedError
-
         @self.get_endpoint("/rpc")
-        def cls_rpc_get_endpoint(
+        async def cls_rpc_get_endpoint(
             method_name: str, args: list[Any], kwds: dict[str, Any]
         ) -> Any:
-            return _cls_rpc_endpoint(method_name, args, kwds)
+            result = await self._cls_rpc(method_name, args, kwds)
+            return NegotiatedResponse(result)
 
         self.cls_rpc_get_endpoint = cls_rpc_get_endpoint
 
         @self.post_endpoint("/rpc")
-        def cls_rpc_post_endpoint(
+        async def cls_rpc_post_endpoint(
             method_name: str, args: list[Any], kwds: dict[str, Any]
         ) -> Any:
-            return _cls_rpc_endpoint(method_name, args, kwds)
+            result = await self._cls_rpc(method_name, args, kwds)
+            return NegotiatedResponse(result)
 
         self.cls_rpc_post_endpoint = cls_rpc_post_endpoint
 
-    def init_instance_rpc_endpoint(self):
-        assert (
-            self._rpc_entity_instance is not None
-        ), "Must set _rpc_entity_instance first"
+    def init_jit_index_instance_rpc_endpoint(self):
+        """Registers `/{id}/rpc`, ie, instance rpc, loading the instance by id."""
+        assert self._rpc_entity_cls is not None, "Must set _rpc_entity_cls first"
 
-        def _instance_rpc_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
+        @self.get_endpoint("/{id}/rpc")
+        async def jit_index_instance_rpc_get_endpoint(
+            id: str, method_name: str, args: list[Any], kwds: dict[str, Any]
         ) -> Any:
-            args, kwds = JSONParser.parse(args), JSONParser.parse(kwds)
-            if hasattr(self._rpc_entity_instance, method_name):
-                fn = getattr(self._rpc_entity_instance, method_name)
-                if callable(fn) and inspect.ismethod(fn):
-                    return fn(*args, **kwds)
-            raise NotImplementedError
+            result = await self._jit_index_instance_rpc(id, method_name, args, kwds)
+            return NegotiatedResponse(result)
 
-        @self.get_endpoint("/rpc")
-        def instance_rpc_get_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
+        self.jit_index_instance_rpc_get_endpoint = jit_index_instance_rpc_get_endpoint
+
+        @self.post_endpoint("/{id}/rpc")
+        async def jit_index_instance_rpc_post_endpoint(
+            id: str, method_name: str, args: list[Any], kwds: dict[str, Any]
         ) -> Any:
-            return _instance_rpc_endpoint(method_name, args, kwds)
+            result = await self._jit_index_instance_rpc(id, method_name, args, kwds)
+            return NegotiatedResponse(result)
 
-        self.instance_rpc_get_endpoint = instance_rpc_get_endpoint
+        self.jit_index_instance_rpc_post_endpoint = jit_index_instance_rpc_post_endpoint
 
-        @self.post_endpoint("/rpc")
-        def instance_rpc_post_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
-        ) -> Any:
-            return _instance_rpc_endpoint(method_name, args, kwds)
+    batch_rpc_endpoint: Callable
 
-        self.instance_rpc_post_endpoint = instance_rpc_post_endpoint
+    def init_batch_rpc_endpoint(self):
+        """Registers `/rpc/batch`, which runs many RPC calls in one request.
 
-    def init_jit_index_instance_rpc_endpoint(self):
-        assert self._rpc_entity_cls is not None, "Must set _rpc_entity_cls first"
+        Each call is `{"path": ..., "method_name": ..., "args": ..., "kwds": ...}`
+        where `path` is the prefix of the API the call was made against, ie,
+        `<type>` for class-level calls and `<type>/<id>` for instance-level
+        calls. Results come back in order as `{"result": ...}` or
+        `{"error": {"status_code": ..., "detail": ...}}`, so one failed call
+        does not fail the rest of the batch. Each call is also its own unit
+        of work, committed (or rolled back) on its own: it's dispatched like
+        a single rpc, under its entity's concurrency limit.
+        """
 
-        @self.post_endpoint("/rpc/{id}")
-        def _jit_index_instance_rpc_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
-        ) -> Any:
-            args, kwds = JSONParser.parse(args), JSONParser.parse(kwds)
-            entity_instance = self._rpc_entity_cls.get_by_id(id)
-            if hasattr(entity_instance, method_name):
-                fn = getattr(entity_instance, method_name)
-                if callable(fn) and inspect.ismethod(fn):
-                    return fn(*args, **kwds)
-            raise NotImplementedError
-
-        @self.post_endpoint("/rpc/{id}")
-        def jit_index_instance_rpc_get_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
-        ) -> Any:
-            return _jit_index_instance_rpc_endpoint(method_name, args, kwds)
+        @self.post_endpoint("/rpc/batch")
+        async def batch_rpc_endpoint(
+            calls: list[dict[str, Any]]
+        ) -> NegotiatedResponse:
+            # run in order, so a batch behaves like the calls made one by one
+            results = [await self._batch_rpc_call(call) for call in calls]
+            return NegotiatedResponse(results)
 
-        self.jit_index_instance_rpc_get_endpoint = jit_index_instance_rpc_get_endpoint
+        self.batch_rpc_endpoint = batch_rpc_endpoint
 
-        @self.post_endpoint("/rpc/{id}")
-        def jit_index_instance_rpc_post_endpoint(
-            method_name: str, args: list[Any], kwds: dict[str, Any]
-        ) -> Any:
-            return _jit_index_instance_rpc_endpoint(method_name, args, kwds)
+    change_feed_endpoint: Callable
+    change_feed_sse_endpoint: Callable
 
-        self.jit_index_instance_rpc_post_endpoint = jit_index_instance_rpc_post_endpoint
+    def init_change_feed_endpoint(self):
+        """Registers the change feed: websocket `/feed` and SSE `/feed/sse`.
+
+        Over the websocket, clients send `{"op": "subscribe", "id": ...,
+        "guid": ...}` (or `"entity": ..., "where": {...}` instead of `guid`),
+        `{"op": "unsubscribe", "id": ...}` and, after reconnecting, `{"op":
+        "resume", "after": <cursor>}`. The server sends lists of `{"op",
+        "entity", "id", "version", "changes"}` events as writes commit, each
+        list ending with a `{"op": "cursor"}`, or `{"op": "resync"}` if the
+        client fell too far behind. For clients that can't use websockets,
+        `/feed/sse?subscriptions=[...]&after=<cursor>` streams the same lists
+        as server-sent events.
+
+        Connections are authenticated with `App.authenticate`, and events go
+        through the caller's access plan, see `ServerEntity._feed_view`.
+        """
+
+        @self._fastapi.websocket("/feed")
+        async def change_feed_endpoint(websocket: WebSocket):
+            try:
+                caller = await self._authenticate(websocket)
+            except HTTPException:
+                # before accepting, ie, the handshake gets a 403
+                await websocket.close(code=1008)
+                return
+            await websocket.accept()
+            subscriber = self.app.feed.connect(caller)
+            await websocket.send_text(encode_batch([subscriber.cursor]))
+
+            async def receive():
+                while True:
+                    message = await websocket.receive_json()
+                    try:
+                        await self._handle_feed_message(subscriber, message)
+                    except (KeyError, ValueError) as e:
+                        await websocket.send_json({"op": "error", "detail": str(e)})
+
+            async def send():
+                while True:
+                    # awaiting the socket is the backpressure: while a slow
+                    # client drains, new events coalesce in its queue
+                    batch = await subscriber.next_batch(visible=self._visible_events)
+                    await websocket.send_text(encode_batch(batch))
+
+            tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+            try:
+                done, _ = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is not None and not isinstance(
+                        error, WebSocketDisconnect
+                    ):
+                        logger.error("change feed connection failed", exc_info=error)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                self.app.feed.disconnect(subscriber)
+
+        self.change_feed_endpoint = change_feed_endpoint
+
+        @self.get_endpoint("/feed/sse")
+        async def change_feed_sse_endpoint(
+            request: Request, subscriptions: str, after: Optional[str] = None
+        ) -> StreamingResponse:
+            # authenticated by the request scope middleware
+            subscriber = self.app.feed.connect(current_caller())
+            after = after or request.headers.get("last-event-id")
+            try:
+                for message in json.loads(subscriptions):
+                    await self._handle_feed_message(
+                        subscriber, {**message, "op": "subscribe"}
+                    )
+                if after is not None:
+                    subscriber.handle({"op": "resume", "after": after})
+            except (KeyError, TypeError, ValueError) as e:
+                self.app.feed.disconnect(subscriber)
+                raise HTTPException(status_code=422, detail=str(e))
+
+            def event(batch: list[dict]) -> str:
+                # the cursor doubles as the event id, for `Last-Event-ID`
+                return f"id: {batch[-1]['cursor']}\ndata: {encode_batch(batch)}\n\n"
+
+            async def events():
+                try:
+                    if after is None:
+                        # a resumed stream keeps the client's cursor until
+                        # the missed events are sent
+                        yield event([subscriber.cursor])
+                    while True:
+                        batch = await subscriber.next_batch(
+                            timeout=15, visible=self._visible_events
+                        )
+                        if batch:
+                            yield event(batch)
+                        else:
+                            # keeps proxies from closing an idle stream
+                            yield ": keepalive\n\n"
+                finally:
+                    self.app.feed.disconnect(subscriber)
 
-    def mount_sub_api(self, child: ServerAPI):
-        self._fastapi.mount(child.prefix, child._fastapi)
-        return super().mount_sub_api(child)
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        self.change_feed_sse_endpoint = change_feed_sse_endpoint
+
+    async def _authenticate(self, connection: HTTPConnection) -> Any:
+        caller = self.app.authenticate(connection)
+        if inspect.isawaitable(caller):
+            caller = await caller
+        return caller
+
+    async def _handle_feed_message(
+        self, subscriber: Subscriber, message: dict[str, Any]
+    ) -> None:
+        if message.get("op") == "subscribe" and message.get("guid") is not None:
+            # an entity the caller can't see can't be subscribed to
+            guid = str(message["guid"])
+            name, _, id = guid.partition(":")
+            entity_cls = self.app.db.entities.get(name)
+            if entity_cls is None:
+                raise ValueError(f"Unknown entity {name}")
+            if not await self._as_subscriber(subscriber, entity_cls._visible, id):
+                raise ValueError(f"No entity {guid}")
+            subscriber.seen.add(guid)
+        subscriber.handle(message)
+
+    async def _visible_events(
+        self, subscriber: Subscriber, events: list[ChangeEvent]
+    ) -> list[ChangeEvent]:
+        entities = self.app.db.entities
+        if not any(
+            entities[event.entity]._access_plan().row_restrictions
+            for event in events
+            if event.entity in entities
+        ):
+            # no event needs the db to check
+            return events
+        return await self._as_subscriber(
+            subscriber, self._feed_views, subscriber, events
+        )
+
+    def _feed_views(self, subscriber: Subscriber, events: list[ChangeEvent]):
+        entities = self.app.db.entities
+        views = []
+        for event in events:
+            entity_cls = entities.get(event.entity)
+            if entity_cls is None:
+                continue
+            view = entity_cls._feed_view(event, subscriber.seen)
+            if view is not None:
+                views.append(view)
+        return views
+
+    async def _as_subscriber(self, subscriber: Subscriber, fn: Callable, *args) -> Any:
+        # runs `fn` in a db session on the dispatcher's pool, as the
+        # subscriber's caller
+        def call():
+            with caller_scope(subscriber.caller), acl_scope():
+                return fn(*args)
+
+        # under a concurrency limit of its own, so feeds can't starve rpcs
+        return await self.app.dispatcher.call("feed", call)
+
+    def init_request_scope_middleware(self):
+        """Opens the per-request scopes (acl memo, response codec, db stats)."""
+
+        @self._fastapi.middleware("http")
+        async def request_scope(request, call_next):
+            # in case the app wasn't started (eg under a bare TestClient)
+            self.app.finalize()
+            try:
+                caller = await self._authenticate(request)
+            except HTTPException as e:
+                return JSONResponse(
+                    {"detail": e.detail}, status_code=e.status_code, headers=e.headers
+                )
+            with caller_scope(caller), acl_scope(), wire_scope(
+                request.headers.get("accept")
+            ), self.app.data.request_scope():
+                if not instrumentation.enabled:
+                    return await call_next(request)
+                # continues the client's trace, if it sent one
+                with instrumentation.span(
+                    "server.request",
+                    trace_id=request.headers.get(TRACE_HEADER),
+                    method=request.method,
+                    path=request.url.path,
+                ) as span:
+                    response = await call_next(request)
+                    # labelled by route template (eg `GET /User/{id}`), not path
+                    route = request.scope.get("sop_route") or request.scope.get(
+                        "route"
+                    )
+                    span.label = f"{request.method} {getattr(route, 'path', '?')}"
+                    span.attrs["status_code"] = response.status_code
+                    response.headers[TRACE_HEADER] = span.trace_id
+                    return response
+
+    def init_metrics_endpoint(self, path: str):
+        """Serves the instrumentation metrics at `path`, for Prometheus."""
+
+        @self._fastapi.get(path, include_in_schema=False)
+        async def metrics_endpoint() -> PlainTextResponse:
+            return PlainTextResponse(
+                instrumentation.metrics.prometheus(),
+                media_type="text/plain; version=0.0.4",
+            )
+
+        self.metrics_endpoint = metrics_endpoint
+
+    def init_health_endpoints(
+        self, live_path: Optional[str], ready_path: Optional[str]
+    ):
+        """Serves liveness and readiness probes; readiness fails once draining."""
+
+        def mark_draining():
+            self.app.draining = True
+
+        self._fastapi.add_event_handler("shutdown", mark_draining)
+        if live_path is not None:
+
+            @self._fastapi.get(live_path, include_in_schema=False)
+            async def live_endpoint() -> PlainTextResponse:
+                return PlainTextResponse("ok")
+
+            self.live_endpoint = live_endpoint
+        if ready_path is not None:
+
+            @self._fastapi.get(ready_path, include_in_schema=False)
+            async def ready_endpoint() -> PlainTextResponse:
+                if self.app.ready:
+                    return PlainTextResponse("ready")
+                return PlainTextResponse("not ready", status_code=503)
+
+            self.ready_endpoint = ready_endpoint
+
+    def init_database_lifecycle(self):
+        """Sets up the entity types and binds the app's database at startup.
+
+        Disconnects at shutdown.
+        """
+        self._fastapi.add_event_handler("startup", self.app.finalize)
+        self._fastapi.add_event_handler("startup", self.app.data.bind)
+        self._fastapi.add_event_handler("shutdown", self.app.data.disconnect)
+
+    def init_compression_middleware(self, minimum_size: int):
+        """Gzips responses of at least `minimum_size` bytes, if accepted."""
+        self._fastapi.add_middleware(GZipMiddleware, minimum_size=minimum_size)
+
+    @property
+    def _rpc_entity_name(self) -> str:
+        return self._rpc_entity_cls.__name__
+
+    async def _dispatch(self, fn: Callable, *args, **kwds) -> Any:
+        # awaits coroutine methods, runs sync ones on the app's thread pool,
+        # both under the entity type's concurrency limit
+        return await self.app.dispatcher.call(self._rpc_entity_name, fn, *args, **kwds)
+
+    def _rpc_method(self, entity_cls, method_name: str) -> RPCMethod:
+        method = entity_cls._rpc_methods.get(method_name)
+        if method is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{entity_cls.__name__} has no RPC method {method_name}",
+            )
+        return method
+
+    async def _call_rpc_method(self, method: RPCMethod, target, args, kwds) -> Any:
+        args, kwds = method.parse_arguments(args, kwds)
+        return method.serialize(await self._dispatch(method.fn, target, *args, **kwds))
+
+    async def _cls_rpc(
+        self, method_name: str, args: list[Any], kwds: dict[str, Any]
+    ) -> Any:
+        entity_cls = self._rpc_entity_cls
+        method = self._rpc_method(entity_cls, method_name)
+        if not method.is_classmethod:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{method_name} is an instance method. Call it on an id.",
+            )
+        # with no instance to check, the predicate gets the entity type
+        plan = entity_cls._access_plan()
+        if method_name in plan.restricted and not await self._dispatch(
+            plan.allows, entity_cls, method_name
+        ):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        return await self._call_rpc_method(method, entity_cls, args, kwds)
+
+    async def _jit_index_instance_rpc(
+        self, id: str, method_name: str, args: list[Any], kwds: dict[str, Any]
+    ) -> Any:
+        entity_cls = self._rpc_entity_cls
+        method = self._rpc_method(entity_cls, method_name)
+        args, kwds = method.parse_arguments(args, kwds)
+
+        # loaded and called in one dispatch, ie, in one db session: orm
+        # instances can't be used past the session that loaded them
+        def load():
+            entity_instance = entity_cls._load(id)
+            if entity_instance is None:
+                raise HTTPException(status_code=404, detail=f"No entity with id {id}")
+            # the table bypasses ServerEntity.__getattribute__, so apply its acl
+            if not entity_cls._access_plan().allows(entity_instance, method_name):
+                raise HTTPException(status_code=403, detail="Forbidden")
+            return entity_instance
+
+        def finish(entity_instance, result):
+            # the orm tracks whether the method wrote the entity
+            if entity_instance._status_ != "loaded":
+                entity_cls._invalidate_cached(entity_instance.id)
+            # eg an entity, which serializes from its session
+            return method.serialize(result)
+
+        def target(entity_instance):
+            return entity_cls if method.is_classmethod else entity_instance
+
+        if method.is_async:
+
+            async def load_and_call():
+                entity_instance = load()
+                result = await method.fn(target(entity_instance), *args, **kwds)
+                return finish(entity_instance, result)
+
+        else:
+
+            def load_and_call():
+                entity_instance = load()
+                result = method.fn(target(entity_instance), *args, **kwds)
+                return finish(entity_instance, result)
+
+        return await self._dispatch(load_and_call)
+
+    def resolve_rpc_target(self, path: str) -> Callable[[str, list, dict], Any]:
+        """Finds the rpc handler that `<path>/rpc` would have been routed to."""
+        api = self
+        segments = [segment for segment in path.split("/") if segment]
+        # descend through the mounted entity apis
+        while segments and segments[0] in api.sub_apis:
+            api = api.sub_apis[segments.pop(0)]
+        match segments:
+            case [] if api._rpc_entity_cls is not None:
+                return api._cls_rpc
+            case [id] if api._rpc_entity_cls is not None:
+                return functools.partial(api._jit_index_instance_rpc, id)
+            case _:
+                raise HTTPException(status_code=404, detail=f"No RPC target at {path}")
+
+    async def _batch_rpc_call(self, call: dict[str, Any]) -> dict[str, Any]:
+        try:
+            fn = self.resolve_rpc_target(call.get("path", ""))
+            return {
+                "result": await fn(
+                    call["method_name"], call.get("args", []), call.get("kwds", {})
+                )
+            }
+        except HTTPException as e:
+            return {"error": {"status_code": e.status_code, "detail": e.detail}}
+        except Exception as e:
+            return {"error": {"status_code": 500, "detail": f"{type(e).__name__}: {e}"}}
+
+    @functools.cached_property
+    def sub_apis(self) -> dict[str, ServerAPI]:
+        # mounted apis by their (unprefixed) path segment
+        return {}
+
+    def mount_sub_api(self, prefix: str, api: ServerAPI):
+        # only recorded; its routes are compiled into the app's route table
+        api = super().mount_sub_api(prefix, api)
+        self.sub_apis[str(prefix)] = api
+        return api
+
+    @functools.cached_property
+    def _pending_restrictions(self) -> list[Callable[[Any], None]]:
+        # declared in the entity's class body, before the entity exists
+        return []
+
+    def bind_entity(self, entity_cls: Type[ServerEntity]) -> None:
+        """Makes this the api of `entity_cls`, applying the acls declared so far."""
+        self._rpc_entity_cls = entity_cls
+        for apply in self._pending_restrictions:
+            apply(entity_cls.Meta)
+        self._pending_restrictions.clear()
+        entity_cls._invalidate_access_plan()
+
+    def _restrict(self, apply: Callable[[Any], None]) -> None:
+        if self._rpc_entity_cls is None:
+            self._pending_restrictions.append(apply)
+            return
+        apply(self._rpc_entity_cls.Meta)
+        self._rpc_entity_cls._invalidate_access_plan()
 
     def access_control(self, *attrs, predicate):
-        # must be associated with an entity for this to work
+        """Restricts `attrs` to callers for whom `predicate(entity)` holds."""
+        names = []
         for attr in attrs:
             if isinstance(attr, str):
-                self._rpc_entity_cls.Meta._access_restrictions[attr] = predicate
+                names.append(attr)
             elif hasattr(attr, "__name__"):
-                self._rpc_entity_cls.Meta._access_restrictions[attr.__name__] = predicate
+                names.append(attr.__name__)
             else:
                 raise ValueError(
                     f"Invalid hidden attribute {attr}. Must be str or have __name__ defined."
                 )
+        self._restrict(
+            lambda meta: meta._access_restrictions.update(
+                dict.fromkeys(names, predicate)
+            )
+        )
         if len(attrs) == 1:
             return attrs[0]
 
     def hidden(self, *attrs):
         return self.access_control(*attrs, predicate=lambda entity: False)
 
+    def restrict_rows(self, predicate, filter_by=None):
+        """Leaves the rows failing `predicate(entity)` out of every read.
+
+        Pass `filter_by`, a function returning the same condition as field
+        values (eg `{"owner": user}`), to have list endpoints apply it in the
+        db query instead of loading every row to check it.
+        """
+        restriction = RowRestriction(predicate, filter_by)
+        self._restrict(lambda meta: meta._row_restrictions.append(restriction))
+
     def merge(self, other: ServerAPI):
         """Merges another API into this one."""
-        self._fastapi.router.routes.extend(other._fastapi.router.routes)
+        self.route_specs.extend(other.route_specs)
@@ -1,12 +1,223 @@
-from typing import Any
+from functools import cached_property
+from typing import Any, Type
 
 from pony.orm import Database
+from starlette.requests import HTTPConnection
 
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
 
 from python.sop.base.app import MakeBaseApp
-from python.sop.client.api import ClientAPI, SubController
-from python.sop.client.entity import ClientEntity
+from python.sop.server.api import ServerAPI
+from python.sop.server.bus import Bus, LocalBus
+from python.sop.server.cache import (
+    LRUResponseCache,
+    ResponseCache,
+    SharedBackend,
+    SharedResponseCache,
+)
+from python.sop.server.db import DataAccess
+from python.sop.server.dispatch import Dispatcher
+from python.sop.server.entity import ServerEntity
+from python.sop.server.feed import ChangeEvent, ChangeFeed
+from python.sop.utils.instrumentation import instrumentation
+from python.sop.utils.single_flight import SingleFlight
 
 
-class App(MakeBaseApp(ClientAPI, ClientEntity)):
-    db = Database()
+class App(MakeBaseApp(ServerAPI, ServerEntity)):
+    # `db` is bound to this at startup (or on first use); `db_options` are
+    # `Database.bind` keywords, by default an in-memory sqlite database
+    db_provider: str = "sqlite"
+    db_options: dict = None
+    db_create_tables: bool = True
+    # connections held at once are capped at `db_pool_size + db_max_overflow`
+    # and at most `db_pool_size` are kept open while idle
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pre_ping: bool = True
+
+    # size of the thread pool that sync rpc handlers run on
+    dispatch_max_workers: int = 32
+    # max concurrent rpc calls per entity type, unless the entity sets
+    # `Meta.max_concurrency`. defaults to half of `dispatch_max_workers`
+    dispatch_entity_concurrency: int = None
+    # entities with undelivered changes a change feed client may fall behind
+    # by before it's told to resync instead
+    feed_max_pending: int = 1000
+    # recent feed events kept for clients resuming after a reconnect
+    feed_replay_size: int = 1000
+    # cache of read responses, for entities with `Meta.response_cache_ttl`.
+    # In process by default; give a `SharedBackend` (eg over redis) to share
+    # it, and its invalidations, between server processes
+    response_cache_max_size: int = 10_000
+    response_cache_backend: SharedBackend = None
+    # run concurrent identical reads (same route, entity and visibility class,
+    # see `Meta.read_visibility`) once, eg in a thundering herd after a deploy
+    single_flight_reads: bool = True
+    # liveness (the process serves requests) and readiness (it's set up and
+    # not shutting down) probes, eg for a load balancer. None to not serve one
+    health_path: str = "/healthz"
+    ready_path: str = "/readyz"
+    # gzip responses of at least this many bytes; None to never compress
+    compress_min_size: int = None
+    # time requests, rpc dispatch, parsing, acl checks and db sessions, see
+    # `python.sop.utils.instrumentation`. Metrics are served at `metrics_path`
+    instrumented: bool = False
+    metrics_path: str = "/metrics"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.draining = False
+        self.init_database_lifecycle()
+        self.init_health_endpoints(self.health_path, self.ready_path)
+        self.init_request_scope_middleware()
+        if self.compress_min_size is not None:
+            self.init_compression_middleware(self.compress_min_size)
+        if self.instrumented:
+            instrumentation.enable()
+            if self.metrics_path is not None:
+                self.init_metrics_endpoint(self.metrics_path)
+        self.init_batch_rpc_endpoint()
+        self.init_change_feed_endpoint()
+
+    @cached_property
+    def db(self) -> Database:
+        return Database()
+
+    @cached_property
+    def Entity(self) -> Type[ServerEntity]:
+        class Entity(self.T_Entity, self.db.Entity):
+            class Meta(self.T_Entity.Meta):
+                app = self
+
+        # pony leaves classes named `Entity` unmapped, so this is the base of
+        # the app's tables rather than one; its subclasses map to `db`
+        Entity._database_ = self.db
+        self.registry.discard(Entity)
+        return Entity
+
+    @cached_property
+    def data(self) -> DataAccess:
+        return DataAccess(
+            self.db,
+            provider=self.db_provider,
+            options=self.db_options,
+            create_tables=self.db_create_tables,
+            pool_size=self.db_pool_size,
+            max_overflow=self.db_max_overflow,
+            pool_timeout=self.db_pool_timeout,
+            pre_ping=self.db_pre_ping,
+        )
+
+    @cached_property
+    def dispatcher(self) -> Dispatcher:
+        return Dispatcher(
+            max_workers=self.dispatch_max_workers,
+            default_entity_concurrency=self.dispatch_entity_concurrency,
+            session=self.data.session,
+            run_async=self.data.run_async,
+        )
+
+    @cached_property
+    def feed(self) -> ChangeFeed:
+        return ChangeFeed(
+            max_pending=self.feed_max_pending, replay_size=self.feed_replay_size
+        )
+
+    @cached_property
+    def bus(self) -> Bus:
+        # on its own, a process has no one to tell; see `use_bus`
+        return self._attach_bus(LocalBus())
+
+    def use_bus(self, bus: Bus) -> None:
+        """Connects the app to its other server processes, before it serves.
+
+        Change feed events and response cache invalidations go out over it,
+        so every worker's feed clients and cache see every worker's writes.
+        """
+        previous = self.__dict__.get("bus")
+        if previous is not None:
+            previous.close()
+        self.bus = self._attach_bus(bus)
+
+    def _attach_bus(self, bus: Bus) -> Bus:
+        bus.subscribe("feed", self.feed.publish)
+        bus.subscribe("invalidate", self._invalidate_local)
+        bus.start()
+        return bus
+
+    def authenticate(self, connection: HTTPConnection) -> Any:
+        """Returns who a request or change feed connection is from.
+
+        Raise a 401 `HTTPException` to turn it away. Acl predicates get the
+        result from `current_caller()`, and feed events are filtered for it.
+        Override it to check credentials, eg a bearer token; by default
+        everyone gets in, as None. It may be a coroutine.
+        """
+        return None
+
+    def publish_change(self, event: ChangeEvent) -> None:
+        """Sends a committed change to every worker's feed subscribers."""
+        self.feed.publish(event)
+        self.bus.publish("feed", event)
+
+    def invalidate_reads(self, guids: list[str]) -> None:
+        """Drops the cached reads of `guids`, in every worker."""
+        self._invalidate_local(guids)
+        if not isinstance(self.response_cache, SharedResponseCache):
+            # a shared cache was invalidated for everyone already
+            self.bus.publish("invalidate", guids)
+
+    def _invalidate_local(self, guids: list[str]) -> None:
+        for guid in guids:
+            self.response_cache.invalidate(guid)
+
+    @property
+    def ready(self) -> bool:
+        """Whether the app is set up to serve, and isn't shutting down."""
+        return (
+            self.registry.is_finalized and self.data.is_bound and not self.draining
+        )
+
+    @cached_property
+    def single_flight(self) -> SingleFlight:
+        return SingleFlight()
+
+    @cached_property
+    def response_cache(self) -> ResponseCache:
+        if self.response_cache_backend is not None:
+            return SharedResponseCache(self.response_cache_backend)
+        return LRUResponseCache(max_size=self.response_cache_max_size)
+
+    def dispatch_metrics(self) -> dict[str, Any]:
+        return self.dispatcher.metrics()
+
+    def db_metrics(self) -> dict[str, Any]:
+        return self.data.metrics()
+
+    def response_cache_metrics(self) -> dict[str, Any]:
+        stats = self.response_cache.stats
+        return {**vars(stats), "hit_rate": stats.hit_rate}
+
+    def single_flight_metrics(self) -> dict[str, Any]:
+        stats = self.single_flight.stats
+        return {**vars(stats), "hit_rate": stats.hit_rate}
+
+    def finalize(self) -> None:
+        if self.registry.is_finalized:
+            return
+        super().finalize()
+        self.compile_routes()
+
+    def run(self, **options) -> None:
+        """Serves the app with uvicorn (the `serve` extra), eg `run(port=8000)`.
+
+        In one process; see `python.sop.server.runner` to use every core.
+        """
+        if uvicorn is None:
+            raise ImportError("App.run needs uvicorn: install sop[serve]")
+        self.finalize()
+        uvicorn.run(self._fastapi, **options)
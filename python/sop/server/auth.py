@@ -5,8 +5,10 @@ from typing import Type
 from pony.orm import Required, Set, db_session, select, Optional
 
 
+from python.sop.server.acl import current_caller
 from python.sop.server.api import ServerAPI
 from python.sop.server.app import App
+from python.sop.server.dispatch import rpc
 from python.sop.server.entity import ServerEntity
 
 
@@ -16,6 +18,12 @@ class AuthEnhancedServerAPI(ServerAPI):
             *attrs, predicate=lambda entity: entity.owner == self.app.current_user
         )
 
+    def owned_rows_only(self):
+        return self.restrict_rows(
+            predicate=lambda entity: entity.owner == self.app.current_user,
+            filter_by=lambda: {"owner": self.app.current_user},
+        )
+
     def requires_role(self, role):
         return self.access_control(
             predicate=lambda entity: self.app.current_user.has_role(role)
@@ -23,7 +31,10 @@ class AuthEnhancedServerAPI(ServerAPI):
 
 
 class App(App):
-    current_user: User
+    @property
+    def current_user(self) -> User:
+        # whoever `authenticate` let in, for this request or feed connection
+        return current_caller()
 
     @cached_property
     def Entity(self) -> Type[ServerEntity]:
@@ -34,6 +45,9 @@ class App(App):
 
             owner: User = Required("User")
 
+        # the base of the app's tables, like `App.Entity`'s
+        Entity._database_ = self.db
+        self.registry.discard(Entity)
         return Entity
 
 
@@ -51,10 +65,10 @@ class User(app.Entity):
 
     Meta.api.hidden("create")
 
-    @classmethod
+    @rpc.cls
     def login(cls, email: str, password: str) -> User:
         ...
 
-    @classmethod
+    @rpc.cls
     def logout(cls) -> None:
         ...
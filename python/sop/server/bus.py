@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Bus:
+    """Carries messages between the server processes of one app.
+
+    The app uses it to tell its other workers about response cache
+    invalidations and change feed events. Messages are picklable values on
+    named channels. A process doesn't get its own messages back: whatever
+    it publishes, it has already applied itself. Implement it over eg redis
+    pub/sub to span machines.
+    """
+
+    def __init__(self) -> None:
+        self.handlers: dict[str, list[Callable[[Any], None]]] = {}
+
+    @abstractmethod
+    def publish(self, channel: str, message: Any) -> None:
+        pass
+
+    def subscribe(self, channel: str, handler: Callable[[Any], None]) -> None:
+        self.handlers.setdefault(channel, []).append(handler)
+
+    def start(self) -> None:
+        """Called once by the app that uses it, in the process it serves from."""
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def _deliver(self, channel: str, message: Any) -> None:
+        for handler in self.handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                # one bad message mustn't stop the rest being delivered
+                logger.exception("bus handler for %r failed", channel)
+
+
+class LocalBus(Bus):
+    """A bus between apps in one process, eg to test multi-worker behaviour.
+
+    On its own it reaches no one, which makes it the default for a single
+    server process. `connect()` returns another bus on the same wire.
+    """
+
+    def __init__(self, _peers: Optional[list[LocalBus]] = None) -> None:
+        super().__init__()
+        self._peers = _peers if _peers is not None else []
+        self._peers.append(self)
+
+    def connect(self) -> LocalBus:
+        return LocalBus(self._peers)
+
+    def publish(self, channel: str, message: Any) -> None:
+        for peer in list(self._peers):
+            if peer is not self:
+                peer._deliver(channel, message)
+
+    def close(self) -> None:
+        if self in self._peers:
+            self._peers.remove(self)
+
+
+class IPCBus(Bus):
+    """A worker's end of an `IPCHub`, ie, a bus between processes on one box.
+
+    Created by the supervisor and handed to the worker process; it starts
+    reading in the worker.
+    """
+
+    def __init__(self, worker_id: int, inbox, outbox) -> None:
+        super().__init__()
+        self.worker_id = worker_id
+        # to the hub, shared by every worker
+        self.inbox = inbox
+        # from the hub, this worker's own
+        self.outbox = outbox
+        self._reader: Optional[threading.Thread] = None
+
+    def __getstate__(self) -> dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "inbox": self.inbox,
+            "outbox": self.outbox,
+        }
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__init__(state["worker_id"], state["inbox"], state["outbox"])
+
+    def publish(self, channel: str, message: Any) -> None:
+        self.inbox.put((self.worker_id, channel, message))
+
+    def start(self) -> None:
+        if self._reader is None:
+            self._reader = threading.Thread(
+                target=self._read, name="sop-bus", daemon=True
+            )
+            self._reader.start()
+
+    def _read(self) -> None:
+        while True:
+            item = self.outbox.get()
+            if item is None:
+                return
+            channel, message = item
+            self._deliver(channel, message)
+
+    def close(self) -> None:
+        self.outbox.put(None)
+
+
+class IPCHub:
+    """Relays `IPCBus` messages between a supervisor's worker processes."""
+
+    def __init__(self, context) -> None:
+        # a multiprocessing context, eg `multiprocessing.get_context("spawn")`
+        self.context = context
+        self.inbox = context.Queue()
+        self.outboxes: dict[int, Any] = {}
+        self._lock = threading.Lock()
+        self._relay: Optional[threading.Thread] = None
+
+    def connect(self, worker_id: int) -> IPCBus:
+        outbox = self.context.Queue()
+        with self._lock:
+            self.outboxes[worker_id] = outbox
+        return IPCBus(worker_id, self.inbox, outbox)
+
+    def disconnect(self, worker_id: int) -> None:
+        with self._lock:
+            outbox = self.outboxes.pop(worker_id, None)
+        if outbox is not None:
+            outbox.close()
+
+    def start(self) -> None:
+        self._relay = threading.Thread(
+            target=self._run, name="sop-bus-hub", daemon=True
+        )
+        self._relay.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self.inbox.get()
+            if item is None:
+                return
+            sender, channel, message = item
+            with self._lock:
+                outboxes = [
+                    outbox
+                    for worker_id, outbox in self.outboxes.items()
+                    if worker_id != sender
+                ]
+            for outbox in outboxes:
+                try:
+                    outbox.put((channel, message))
+                except ValueError:
+                    # closed: its worker was stopped meanwhile
+                    pass
+
+    def close(self) -> None:
+        self.inbox.put(None)
+        if self._relay is not None:
+            self._relay.join(timeout=5)
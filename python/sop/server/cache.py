@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+from python.sop.utils.codecs import Codec, json_codec, msgpack_codec
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    # reads that finished after a write to the same entity, so weren't stored
+    stale_stores: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclass
+class CachedRead:
+    """A read endpoint's answer for one caller visibility class."""
+
+    # the serialized entity, or list of them
+    data: Any
+    version: int = 0
+    expires_at: float = 0.0
+    # encoded body and its etag, by media type, filled in as they're sent
+    bodies: dict[str, tuple[bytes, str]] = field(default_factory=dict)
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """Interface for the server's cache of read responses.
+
+    Entries are keyed by guid (or `<type>:*` for whole-table reads) and the
+    caller's visibility class, since callers with different acl views of an
+    entity must never share a response. `invalidate` drops every view of a
+    guid. A read takes a token from `lookup` before it touches the db and
+    hands it back to `store`; if the guid was invalidated in between, the
+    read may have seen the old row and isn't stored.
+    """
+
+    def __init__(self) -> None:
+        self.stats = ResponseCacheStats()
+
+    @abstractmethod
+    def lookup(
+        self, guid: str, visibility: Hashable
+    ) -> tuple[Optional[CachedRead], Any]:
+        """Returns the fresh entry, if any, and a token for `store`."""
+        pass
+
+    @abstractmethod
+    def store(
+        self, guid: str, visibility: Hashable, entry: CachedRead, token: Any
+    ) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate(self, guid: str) -> None:
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+
+class LRUResponseCache(ResponseCache):
+    """In-process cache, evicting the least recently used entry past `max_size`."""
+
+    def __init__(self, max_size: int = 10_000) -> None:
+        super().__init__()
+        self.max_size = max_size
+        self._entries: OrderedDict[tuple[str, Hashable], CachedRead] = OrderedDict()
+        # guid -> its cached visibility classes, to invalidate them together
+        self._views: dict[str, set[Hashable]] = {}
+        # bumped by every invalidation: a bounded, if conservative, token
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(
+        self, guid: str, visibility: Hashable
+    ) -> tuple[Optional[CachedRead], Any]:
+        key = (guid, visibility)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not entry.fresh:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+            return entry, self._invalidations
+
+    def store(
+        self, guid: str, visibility: Hashable, entry: CachedRead, token: Any
+    ) -> None:
+        key = (guid, visibility)
+        with self._lock:
+            if token != self._invalidations:
+                self.stats.stale_stores += 1
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._views.setdefault(guid, set()).add(visibility)
+            self.stats.stores += 1
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _drop(self, key: tuple[str, Hashable]) -> None:
+        del self._entries[key]
+        guid, visibility = key
+        views = self._views[guid]
+        views.discard(visibility)
+        if not views:
+            del self._views[guid]
+
+    def invalidate(self, guid: str) -> None:
+        with self._lock:
+            self._invalidations += 1
+            for visibility in self._views.pop(guid, ()):
+                del self._entries[(guid, visibility)]
+                self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+            self._views.clear()
+
+
+class SharedBackend:
+    """Interface for a store shared by server processes, eg redis or memcached.
+
+    Values are bytes; `incr` must be atomic across processes.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        pass
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Adds one to the integer at `key` (0 if unset); returns the result."""
+        pass
+
+
+class InMemoryBackend(SharedBackend):
+    """`SharedBackend` in a dict, eg for tests or a single process."""
+
+    def __init__(self) -> None:
+        self._values: dict[str, tuple[bytes, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._values[key] = (value, expires_at)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, expires_at = self._values.get(key, (b"0", None))
+            count = int(value) + 1
+            self._values[key] = (str(count).encode(), expires_at)
+            return count
+
+
+class SharedResponseCache(ResponseCache):
+    """Response cache in a `SharedBackend`, so server processes share entries.
+
+    Each guid has a generation counter in the backend, and entries are
+    stored under the generation their read started at, so invalidating is
+    one `incr` and older generations' entries are never read again (the
+    backend expires them). `clear` bumps a counter shared by every guid.
+    Visibility classes are keyed by their `str`. Stats are this process' own.
+
+    Entries are encoded with `codec`, msgpack if installed, else JSON; never
+    pickled, so whoever can write to the backend can't run code in the
+    server. Encoded bodies aren't shared: each process renders its own.
+    """
+
+    def __init__(
+        self,
+        backend: SharedBackend,
+        namespace: str = "sop",
+        codec: Optional[Codec] = None,
+    ) -> None:
+        super().__init__()
+        self.backend = backend
+        self.namespace = namespace
+        # msgpack keeps datetimes and UUIDs as they are; JSON makes them strings
+        self.codec = codec or msgpack_codec or json_codec
+
+    def _counter(self, name: str) -> int:
+        value = self.backend.get(f"{self.namespace}:gen:{name}")
+        return int(value) if value is not None else 0
+
+    def _generation(self, guid: str) -> str:
+        return f"{self._counter('*')}.{self._counter(guid)}"
+
+    def _key(self, guid: str, visibility: Hashable, generation: str) -> str:
+        return f"{self.namespace}:read:{guid}:{generation}:{visibility}"
+
+    def lookup(
+        self, guid: str, visibility: Hashable
+    ) -> tuple[Optional[CachedRead], Any]:
+        generation = self._generation(guid)
+        raw = self.backend.get(self._key(guid, visibility, generation))
+        if raw is None:
+            self.stats.misses += 1
+            return None, generation
+        entry = self._decode(raw)
+        if entry is None:
+            self.stats.misses += 1
+            return None, generation
+        self.stats.hits += 1
+        return entry, generation
+
+    def store(
+        self, guid: str, visibility: Hashable, entry: CachedRead, token: Any
+    ) -> None:
+        ttl = entry.expires_at - time.monotonic()
+        if ttl <= 0:
+            return
+        # if the guid was invalidated since `token`, nothing reads this key
+        self.backend.set(
+            self._key(guid, visibility, token), self._encode(entry, ttl), ttl=ttl
+        )
+        self.stats.stores += 1
+
+    def _encode(self, entry: CachedRead, ttl: float) -> bytes:
+        # monotonic clocks are per process, so the expiry goes as wall time
+        return self.codec.encode(
+            {"data": entry.data, "version": entry.version, "expires": time.time() + ttl}
+        )
+
+    def _decode(self, raw: bytes) -> Optional[CachedRead]:
+        try:
+            item = self.codec.decode(raw)
+            ttl = item["expires"] - time.time()
+            return CachedRead(item["data"], item["version"], time.monotonic() + ttl)
+        except (KeyError, TypeError, ValueError):
+            # eg written by another version; read it from the db instead
+            return None
+
+    def invalidate(self, guid: str) -> None:
+        self.backend.incr(f"{self.namespace}:gen:{guid}")
+        self.stats.invalidations += 1
+
+    def clear(self) -> None:
+        self.backend.incr(f"{self.namespace}:gen:*")
@@ -0,0 +1,965 @@
+"""Generates static clients from a server app's entities, routes and rpcs.
+
+    python -m python.sop.server.codegen myservice.entities:app \\
+        --python myservice/client.py --typescript web/src/client.ts
+
+The dynamic client builds rpcs on attribute misses and has its fields
+declared by hand. A generated Python client declares every field, rpc and
+route of the server's entities as plain attributes and methods of
+`StaticEntity` subclasses (see `python.sop.client.static`), with their
+return parsers compiled at import. The TypeScript client is one
+self-contained module over `fetch`: an interface per entity and a class of
+its routes and rpcs. Pydantic models are typed as plain objects in both.
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from decimal import Decimal
+import inspect
+from inspect import Parameter
+import re
+import types
+import typing
+from typing import Any, Optional, Union
+from uuid import UUID
+
+from fastapi import BackgroundTasks, Request, Response, WebSocket, params
+from pydantic import BaseModel
+from pydantic.fields import FieldInfo, Undefined
+import stringcase
+
+from python.sop.client.static import StaticEntity
+from python.sop.server.dispatch import _type_hints
+from python.sop.server.runner import load_app
+from python.sop.server.versions import VERSION_FIELDS
+
+_EMPTY = Parameter.empty
+
+# the rpc routes every entity serves; clients call them through their rpcs
+_RPC_ROUTES = {
+    ("GET", "/rpc"),
+    ("POST", "/rpc"),
+    ("GET", "/{id}/rpc"),
+    ("POST", "/{id}/rpc"),
+}
+
+
+@dataclass
+class FieldSpec:
+    name: str
+    # the column's python type, or the referenced entity's name
+    type: Any
+    required: bool
+    reference: bool = False
+
+
+@dataclass
+class ParamSpec:
+    name: str
+    type: Any
+    kind: inspect._ParameterKind = Parameter.POSITIONAL_OR_KEYWORD
+    default: Any = _EMPTY
+
+
+@dataclass
+class RPCSpec:
+    name: str
+    params: list[ParamSpec]
+    returns: Any
+    is_classmethod: bool
+
+
+@dataclass
+class RouteSpec:
+    name: str
+    verb: str
+    # relative to the entity's prefix, eg `/{id}/archive`
+    path: str
+    # path params first; params neither in the path nor the body are query
+    params: list[ParamSpec]
+    body: list[str]
+    # whether the body is `{name: value}` rather than the one body param
+    embed: bool
+    returns: Any
+
+
+@dataclass
+class EntitySpec:
+    name: str
+    # of its routes, eg `resource` for `/resource/{id}`
+    prefix: str
+    id_type: Any
+    fields: list[FieldSpec]
+    # the built-in (ie, `ServerEntity`) routes it serves, as (verb, path)
+    crud: set[tuple[str, str]] = field(default_factory=set)
+    routes: list[RouteSpec] = field(default_factory=list)
+    rpcs: list[RPCSpec] = field(default_factory=list)
+
+
+def describe(app) -> list[EntitySpec]:
+    """Collects what the clients are generated from, finalizing the app."""
+    app.finalize()
+    base = app.T_Entity
+    builtin_routes = {
+        (verb, path) for verb, path, _ in base.Meta.api.route_specs
+    } | _RPC_ROUTES
+    builtin_names = set(dir(base))
+    classes = [cls for cls in app.registry.costs if cls is not vars(app).get("Entity")]
+    names = {cls: cls.__name__ for cls in classes}
+    entities = []
+    for cls in classes:
+        entity = EntitySpec(
+            name=cls.__name__,
+            prefix=cls.Meta.api.prefix,
+            id_type=cls._pk_attrs_[0].py_type,
+            fields=_fields(cls, names),
+        )
+        # merged apis can repeat their bases' routes
+        seen = set()
+        for verb, path, endpoint in cls.Meta.api.route_specs:
+            if (verb, path) in builtin_routes:
+                entity.crud.add((verb, path))
+            elif (verb, path) not in seen:
+                entity.routes.append(_route(verb, path, endpoint))
+            seen.add((verb, path))
+        entity.rpcs = [
+            _rpc(method)
+            for name, method in cls._rpc_methods.items()
+            if name not in builtin_names
+        ]
+        _check_names(entity)
+        entities.append(entity)
+    return entities
+
+
+def _fields(cls: type, names: dict[type, str]) -> list[FieldSpec]:
+    fields = []
+    for attr in cls._attrs_:
+        if attr.is_collection or attr.name in VERSION_FIELDS:
+            continue
+        # relations name their entity until the db mapping is generated
+        reference = isinstance(attr.py_type, str) or attr.py_type in names
+        type_ = names.get(attr.py_type, attr.py_type) if reference else attr.py_type
+        fields.append(FieldSpec(attr.name, type_, attr.is_required, reference))
+    return fields
+
+
+def _rpc(method) -> RPCSpec:
+    hints = _type_hints(method.fn)
+    return RPCSpec(
+        name=method.name,
+        params=[
+            ParamSpec(
+                param.name,
+                hints.get(param.name, param.annotation),
+                param.kind,
+                param.default,
+            )
+            for param in method.signature.parameters.values()
+        ],
+        returns=hints.get("return", method.signature.return_annotation),
+        is_classmethod=method.is_classmethod,
+    )
+
+
+def _route(verb: str, path: str, endpoint: Any) -> RouteSpec:
+    fn = endpoint.__func__ if isinstance(endpoint, classmethod) else endpoint
+    signature = inspect.signature(fn)
+    hints = _type_hints(fn)
+    parameters = list(signature.parameters.values())
+    if isinstance(endpoint, classmethod):
+        parameters = parameters[1:]
+    path_names = re.findall(r"{(\w+)(?::\w+)?}", path or "")
+    specs, body, embed = [ParamSpec(name, str) for name in path_names], [], False
+    for param in parameters:
+        annotation = hints.get(param.name, param.annotation)
+        if param.name in path_names:
+            specs[path_names.index(param.name)].type = annotation
+            continue
+        if _is_injected(param, annotation):
+            continue
+        default = param.default
+        if isinstance(default, FieldInfo):
+            if isinstance(default, params.Body) and default.embed:
+                embed = True
+            default = default.default
+            if default is Ellipsis or default is Undefined:
+                default = _EMPTY
+        specs.append(ParamSpec(param.name, annotation, default=default))
+        if _is_body(param, annotation):
+            body.append(param.name)
+    # every param but the path's is sent by name, so required ones can go
+    # first, as the generated signatures need
+    path_specs, specs = specs[: len(path_names)], specs[len(path_names) :]
+    specs.sort(key=lambda spec: spec.default is not _EMPTY)
+    return RouteSpec(
+        name=fn.__name__,
+        verb=verb,
+        path=path or "",
+        params=path_specs + specs,
+        body=body,
+        embed=embed or len(body) > 1,
+        returns=hints.get("return", signature.return_annotation),
+    )
+
+
+def _is_injected(param: Parameter, annotation: Any) -> bool:
+    # filled in by fastapi rather than sent by the caller
+    if isinstance(param.default, params.Depends):
+        return True
+    return inspect.isclass(annotation) and issubclass(
+        annotation, (Request, Response, WebSocket, BackgroundTasks)
+    )
+
+
+def _is_body(param: Parameter, annotation: Any) -> bool:
+    # how fastapi reads it: explicitly, or by type
+    if isinstance(param.default, params.Body):
+        return True
+    if isinstance(param.default, params.Param):
+        return False
+    if inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+        return True
+    return (typing.get_origin(annotation) or annotation) in (list, set, tuple, dict)
+
+
+def _import(module: str, names: list[str]) -> list[str]:
+    line = f"from {module} import {', '.join(names)}"
+    if len(line) <= 88:
+        return [line]
+    return [f"from {module} import (", *(f"    {name}," for name in names), ")"]
+
+
+def _is_literal(value: Any) -> bool:
+    # can be written out in generated code
+    return value is None or type(value) in (bool, int, float, str)
+
+
+def _check_names(entity: EntitySpec) -> None:
+    # fields and methods share the generated class' namespace, along with
+    # everything `StaticEntity` defines
+    taken = set(dir(StaticEntity))
+    for name in [
+        *(field.name for field in entity.fields if field.name != "id"),
+        *(route.name for route in entity.routes),
+        *(rpc.name for rpc in entity.rpcs),
+    ]:
+        if name in taken:
+            raise ValueError(
+                f"{entity.name}.{name} clashes with another member of the "
+                "generated client; rename it"
+            )
+        taken.add(name)
+
+
+# python
+
+
+def generate_python(entities: list[EntitySpec], source: str = "") -> str:
+    """The source of a static Python client of `entities`.
+
+    `source` is what they were generated from, eg `myservice.entities:app`.
+    """
+    return _PythonClient(entities).module(source)
+
+
+class _PythonClient:
+    def __init__(self, entities: list[EntitySpec]) -> None:
+        self.entities = entities
+        self.names = {entity.name for entity in entities}
+        self.imports: set[str] = set()
+        # name -> type expression of each return parser
+        self.parsers: dict[str, str] = {}
+        # whether the module uses `UNSET`, `without_unset` and `encode_body`
+        self.helpers: set[str] = set()
+
+    def module(self, source: str) -> str:
+        classes = [self.entity(entity) for entity in self.entities]
+        static = sorted({"StaticApp", "reference_fields", *self.helpers})
+        header = [
+            f'"""Static client of `{source}`.' if source else '"""Static client.',
+            "",
+            "Generated by `python -m python.sop.server.codegen`; don't edit it,",
+            "regenerate it. Set `app.base_url` before the first request.",
+            '"""',
+            "from __future__ import annotations",
+            "",
+            *sorted({*self.imports, "from typing import Any, Optional"}),
+            "",
+            *_import("python.sop.client.static", static),
+            "from python.sop.utils.codecs import decode_response",
+            "from python.sop.utils.parsing import JSONParser",
+            "",
+            "app = StaticApp()",
+        ]
+        sections = ["\n".join(header), *classes]
+        references = [
+            f"reference_fields({entity.name}, "
+            + ", ".join(f'"{field.name}"' for field in entity.fields if field.reference)
+            + ")"
+            for entity in self.entities
+            if any(field.reference for field in entity.fields)
+        ]
+        if references:
+            sections.append("\n".join(references))
+        footer = []
+        if self.parsers:
+            footer += [
+                "# compiled at import rather than on first use",
+                *(
+                    f"{name} = JSONParser.for_type({type_})"
+                    for name, type_ in self.parsers.items()
+                ),
+                "",
+            ]
+        names = [entity.name for entity in self.entities]
+        footer += [
+            f"ENTITIES = ({', '.join(names)}{',' if len(names) == 1 else ''})",
+            "",
+            "for _entity in ENTITIES:",
+            "    _entity.parser().field_parsers",
+        ]
+        sections.append("\n".join(footer))
+        return "\n\n\n".join(sections) + "\n"
+
+    def entity(self, entity: EntitySpec) -> str:
+        lines = [f"class {entity.name}(app.Entity):"]
+        for field in entity.fields:
+            type_ = self.type(field.type)
+            if field.name == "id" or field.required:
+                lines.append(f"    {field.name}: {type_}")
+            else:
+                lines.append(f"    {field.name}: Optional[{type_}] = None")
+        for route in entity.routes:
+            lines += self.route(entity, route, aio=False)
+            lines += self.route(entity, route, aio=True)
+        for rpc in entity.rpcs:
+            lines += self.rpc(entity, rpc, aio=False)
+            lines += self.rpc(entity, rpc, aio=True)
+        return "\n".join(lines)
+
+    def rpc(self, entity: EntitySpec, rpc: RPCSpec, aio: bool) -> list[str]:
+        target = "cls" if rpc.is_classmethod else "self"
+        call = [
+            f'"{rpc.name}"',
+            self.args(rpc.params),
+            self.kwds(
+                [
+                    param
+                    for param in rpc.params
+                    if param.kind
+                    not in (Parameter.POSITIONAL_ONLY, Parameter.VAR_POSITIONAL)
+                ]
+            ),
+        ]
+        parser = self.parser(entity, rpc.name, rpc.returns)
+        if parser is not None:
+            call.append(f"rpc_ret_parser={parser}")
+        rpc_call = f"await {target}.api.aio.rpc" if aio else f"{target}.api.rpc"
+        return [
+            "",
+            *(["    @classmethod"] if rpc.is_classmethod else []),
+            self.define(rpc.name, target, rpc.params, rpc.returns, aio),
+            *self.call(f"return {rpc_call}", call),
+        ]
+
+    def route(self, entity: EntitySpec, route: RouteSpec, aio: bool) -> list[str]:
+        path_names = re.findall(r"{(\w+)(?::\w+)?}", route.path)
+        path = re.sub(r"{(\w+)(?::\w+)?}", r"{\1}", route.path)
+        call = [f'"{route.verb}"', f'f"{path}"' if path_names else f'"{path}"']
+        query = [
+            param
+            for param in route.params
+            if param.name not in path_names and param.name not in route.body
+        ]
+        if query:
+            call.append(f"params={self.kwds(query)}")
+        if route.body:
+            self.helpers.add("encode_body")
+            body = [param for param in route.params if param.name in route.body]
+            value = self.kwds(body) if route.embed else body[0].name
+            call += [
+                f"data=encode_body({value})",
+                'headers={"Content-Type": "application/json"}',
+            ]
+        request = "await cls.api.aio.request" if aio else "cls.api.request"
+        parser = self.parser(entity, route.name, route.returns)
+        decoded = "decode_response(response)"
+        return [
+            "",
+            "    @classmethod",
+            self.define(route.name, "cls", route.params, route.returns, aio),
+            f"        # {route.verb} `<host>/<type>{route.path}`",
+            *self.call(f"response = {request}", call),
+            "        response.raise_for_status()",
+            f"        return {parser}.parse({decoded})"
+            if parser is not None
+            else f"        return {decoded}",
+        ]
+
+    def define(
+        self, name: str, first: str, params: list[ParamSpec], returns: Any, aio: bool
+    ) -> str:
+        parts, keyword_only = [first], False
+        for i, param in enumerate(params):
+            type_ = self.type(param.type)
+            if param.kind is Parameter.VAR_POSITIONAL:
+                parts.append(f"*{param.name}: {type_}")
+                keyword_only = True
+            elif param.kind is Parameter.VAR_KEYWORD:
+                parts.append(f"**{param.name}: {type_}")
+            else:
+                if param.kind is Parameter.KEYWORD_ONLY and not keyword_only:
+                    parts.append("*")
+                    keyword_only = True
+                text = f"{param.name}: {type_}"
+                if param.default is not _EMPTY:
+                    text += f" = {self.default(param.default)}"
+                parts.append(text)
+                following = params[i + 1].kind if i + 1 < len(params) else None
+                if (
+                    param.kind is Parameter.POSITIONAL_ONLY
+                    and following is not Parameter.POSITIONAL_ONLY
+                ):
+                    parts.append("/")
+        prefix = "    async def" if aio else "    def"
+        name = f"{name}_async" if aio else name
+        line = f"{prefix} {name}({', '.join(parts)}) -> {self.type(returns)}:"
+        if len(line) <= 88:
+            return line
+        return "\n".join(
+            [
+                f"{prefix} {name}(",
+                *(f"        {part}," for part in parts),
+                f"    ) -> {self.type(returns)}:",
+            ]
+        )
+
+    @staticmethod
+    def call(head: str, args: list[str]) -> list[str]:
+        line = f"        {head}({', '.join(args)})"
+        if len(line) <= 88:
+            return [line]
+        return [
+            f"        {head}(",
+            *(f"            {arg}," for arg in args),
+            "        )",
+        ]
+
+    def default(self, value: Any) -> str:
+        if _is_literal(value):
+            return repr(value)
+        self.helpers.add("UNSET")
+        return "UNSET"
+
+    def args(self, params: list[ParamSpec]) -> str:
+        items = []
+        for param in params:
+            if param.kind is Parameter.POSITIONAL_ONLY:
+                items.append(param.name)
+            elif param.kind is Parameter.VAR_POSITIONAL:
+                items.append(f"*{param.name}")
+        return f"[{', '.join(items)}]"
+
+    def kwds(self, params: list[ParamSpec]) -> str:
+        items = []
+        for param in params:
+            if param.kind is Parameter.VAR_KEYWORD:
+                items.append(f"**{param.name}")
+            else:
+                items.append(f'"{param.name}": {param.name}')
+        kwds = f"{{{', '.join(items)}}}"
+        if any(
+            param.default is not _EMPTY and not _is_literal(param.default)
+            for param in params
+        ):
+            self.helpers.add("without_unset")
+            return f"without_unset({kwds})"
+        return kwds
+
+    def parser(self, entity: EntitySpec, name: str, returns: Any) -> Optional[str]:
+        type_ = self.type(returns)
+        if type_ in ("Any", "None"):
+            # the decoded json is already what it returns
+            return None
+        parser = f"_{entity.name}_{name}_parser"
+        self.parsers[parser] = type_
+        return parser
+
+    def type(self, annotation: Any) -> str:
+        if annotation in (_EMPTY, Any, object):
+            return "Any"
+        if annotation is None or annotation is type(None):
+            return "None"
+        if isinstance(annotation, typing.ForwardRef):
+            annotation = annotation.__forward_arg__
+        if isinstance(annotation, str):
+            return annotation if annotation in self.names else "Any"
+        if inspect.isclass(annotation):
+            return self.class_type(annotation)
+        origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+        if origin is typing.Annotated:
+            return self.type(args[0])
+        if origin in (Union, types.UnionType):
+            options = [self.type(arg) for arg in args if arg is not type(None)]
+            inner = " | ".join(dict.fromkeys(options))
+            return f"Optional[{inner}]" if len(options) < len(args) else inner
+        if origin in (list, set, frozenset):
+            return f"{origin.__name__}[{self.type(args[0]) if args else 'Any'}]"
+        if origin is tuple:
+            items = ("..." if arg is Ellipsis else self.type(arg) for arg in args)
+            return f"tuple[{', '.join(items)}]"
+        if origin is dict and len(args) == 2:
+            return f"dict[{self.type(args[0])}, {self.type(args[1])}]"
+        return "Any"
+
+    def class_type(self, cls: type) -> str:
+        if cls.__name__ in self.names and hasattr(cls, "_rpc_methods"):
+            # a server entity
+            return cls.__name__
+        for builtin in (bool, int, float, str, bytes):
+            if issubclass(cls, builtin):
+                return builtin.__name__
+        if cls in (datetime, date, time, Decimal, UUID):
+            self.imports.add(f"from {cls.__module__} import {cls.__name__}")
+            return cls.__name__
+        if cls in (list, set, frozenset, tuple, dict):
+            return cls.__name__
+        if issubclass(cls, BaseModel):
+            return "dict[str, Any]"
+        return "Any"
+
+
+# typescript
+
+
+def generate_typescript(entities: list[EntitySpec], source: str = "") -> str:
+    """The source of a static TypeScript client of `entities`."""
+    return _TypeScriptClient(entities).module(source)
+
+
+# the crud methods of an entity's api class, by the route they call. The
+# placeholders are filled in per entity
+_TS_CRUD = {
+    ("POST", "/create"): """
+  create(data: Partial<__T__>): Promise<__ID__> {
+    return this.client.request("POST", "__P__/create", { body: data });
+  }""",
+    ("GET", "/{id}"): """
+  getById(id: __ID__): Promise<__T__> {
+    return this.client.request("GET", `__P__/${encodeURIComponent(id)}`);
+  }""",
+    ("GET", "/many"): """
+  getMany(ids: __ID__[]): Promise<{ items: __T__[]; missing: string[] }> {
+    return this.client.request("GET", "__P__/many", { params: { ids } });
+  }""",
+    ("GET", "/"): """
+  getAll(): Promise<__T__[]> {
+    return this.client.request("GET", "__P__/");
+  }""",
+    ("GET", "/page"): """
+  getPage(after?: string | null, limit?: number): Promise<Page<__T__>> {
+    return this.client.request("GET", "__P__/page", { params: { after, limit } });
+  }""",
+    ("POST", "/query"): """
+  query(document: QueryDocument): Promise<{ items: Partial<__T__>[] }> {
+    return this.client.request("POST", "__P__/query", { body: document });
+  }""",
+    ("PUT", "/{id}"): """
+  updateById(id: __ID__, data: Partial<__T__>): Promise<{ version: number }> {
+    const path = `__P__/${encodeURIComponent(id)}`;
+    return this.client.request("PUT", path, { body: data });
+  }""",
+    ("PATCH", "/{id}"): """
+  patchById(
+    id: __ID__,
+    version: number | null,
+    changes: Partial<__T__>,
+  ): Promise<Delta<__T__>> {
+    const path = `__P__/${encodeURIComponent(id)}`;
+    return this.client.request("PATCH", path, { body: { version, changes } });
+  }""",
+    ("DELETE", "/{id}"): """
+  deleteById(id: __ID__): Promise<{ version: number }> {
+    return this.client.request("DELETE", `__P__/${encodeURIComponent(id)}`);
+  }""",
+    ("POST", "/create_many"): """
+  createMany(items: Partial<__T__>[]): Promise<BulkResult<__ID__>[]> {
+    return this.client.request("POST", "__P__/create_many", { body: items });
+  }""",
+    ("POST", "/update_many"): """
+  updateMany(
+    items: { id: __ID__; version: number | null; changes: Partial<__T__> }[],
+  ): Promise<BulkResult<Delta<__T__>>[]> {
+    return this.client.request("POST", "__P__/update_many", { body: items });
+  }""",
+    ("POST", "/delete_many"): """
+  deleteMany(ids: __ID__[]): Promise<BulkResult<{ version: number }>[]> {
+    return this.client.request("POST", "__P__/delete_many", { body: ids });
+  }""",
+}
+
+_TS_RUNTIME = """\
+export interface Page<T> {
+  items: T[];
+  next_cursor: string | null;
+}
+
+export interface Delta<T> {
+  version: number;
+  changes: Partial<T>;
+}
+
+export type BulkResult<T> =
+  | { result: T }
+  | { error: { status_code: number; detail: unknown } };
+
+export interface QueryDocument {
+  where?: [string, string, unknown][];
+  order_by?: string[];
+  limit?: number;
+  offset?: number;
+  fields?: string[];
+}
+
+export interface RequestOptions {
+  // arrays repeat the param; undefined and null values are left out
+  params?: Record<string, unknown>;
+  body?: unknown;
+}
+
+export class SOPError extends Error {
+  constructor(
+    readonly status: number,
+    readonly detail: unknown,
+  ) {
+    super(`SOP request failed with ${status}: ${JSON.stringify(detail)}`);
+  }
+}
+
+export class SOPClient {
+  constructor(
+    public baseUrl: string = "http://localhost:8000",
+    // sent with every request, eg an Authorization header
+    public headers: Record<string, string> = {},
+  ) {}
+
+  async request<T>(
+    verb: string,
+    path: string,
+    options: RequestOptions = {},
+  ): Promise<T> {
+    const base = this.baseUrl.endsWith("/") ? this.baseUrl : `${this.baseUrl}/`;
+    const url = new URL(path, base);
+    for (const [key, value] of Object.entries(options.params ?? {})) {
+      for (const item of Array.isArray(value) ? value : [value]) {
+        if (item !== undefined && item !== null) {
+          url.searchParams.append(key, String(item));
+        }
+      }
+    }
+    const headers: Record<string, string> = {
+      Accept: "application/json",
+      ...this.headers,
+    };
+    let body: string | undefined;
+    if (options.body !== undefined) {
+      headers["Content-Type"] = "application/json";
+      body = JSON.stringify(options.body);
+    }
+    const response = await fetch(url, { method: verb, headers, body });
+    const text = await response.text();
+    let data: unknown = text;
+    try {
+      data = text ? JSON.parse(text) : null;
+    } catch {
+      // not json, eg a proxy's error page
+    }
+    if (!response.ok) {
+      const detail = (data as { detail?: unknown } | null)?.detail ?? data;
+      throw new SOPError(response.status, detail);
+    }
+    return data as T;
+  }
+
+  rpc<T>(
+    path: string,
+    methodName: string,
+    args: unknown[],
+    kwds: Record<string, unknown>,
+  ): Promise<T> {
+    return this.request<T>("POST", `${path}/rpc`, {
+      params: { method_name: methodName },
+      body: { args, kwds },
+    });
+  }
+}
+"""
+
+# not allowed as parameter names
+_TS_RESERVED = frozenset(
+    """break case catch class const continue debugger default delete do else
+    enum export extends false finally for function if import in instanceof new
+    null return super switch this throw true try typeof var void while with
+    implements interface let package private protected public static yield
+    await arguments eval""".split()
+)
+
+
+class _TypeScriptClient:
+    def __init__(self, entities: list[EntitySpec]) -> None:
+        self.entities = entities
+        self.names = {entity.name for entity in entities}
+
+    def module(self, source: str) -> str:
+        lines = [
+            f"// Static client of `{source}`." if source else "// Static client.",
+            "// Generated by `python -m python.sop.server.codegen`; don't edit it,",
+            "// regenerate it.",
+            "",
+            _TS_RUNTIME,
+        ]
+        for entity in self.entities:
+            lines += [self.interface(entity), "", self.api(entity), ""]
+        lines += [
+            "export class Client extends SOPClient {",
+            *(
+                f"  readonly {_lower_first(entity.name)} = "
+                f"new {entity.name}Api(this);"
+                for entity in self.entities
+            ),
+            "}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def interface(self, entity: EntitySpec) -> str:
+        lines = [
+            f"export type {entity.name}Id = {self.type(entity.id_type)};",
+            "",
+            f"export interface {entity.name} {{",
+        ]
+        for field in entity.fields:
+            if field.name == "id":
+                type_ = f"{entity.name}Id"
+            elif field.reference:
+                # sent as the referenced entity's id
+                type_ = f"{field.type}Id" if field.type in self.names else "unknown"
+            else:
+                type_ = self.type(field.type)
+            if not field.required and field.name != "id":
+                type_ = f"{type_} | null"
+            lines.append(f"  {field.name}: {type_};")
+        lines.append("}")
+        return "\n".join(lines)
+
+    def api(self, entity: EntitySpec) -> str:
+        lines = [
+            f"export class {entity.name}Api {{",
+            "  constructor(private readonly client: SOPClient) {}",
+        ]
+        for route, template in _TS_CRUD.items():
+            if route in entity.crud:
+                lines.append(
+                    template.replace("__T__", entity.name)
+                    .replace("__ID__", f"{entity.name}Id")
+                    .replace("__P__", entity.prefix)
+                )
+        for route in entity.routes:
+            lines += self.route(entity, route)
+        for rpc in entity.rpcs:
+            lines += self.rpc(entity, rpc)
+        lines.append("}")
+        return "\n".join(lines)
+
+    def rpc(self, entity: EntitySpec, rpc: RPCSpec) -> list[str]:
+        params = [param.name for param in rpc.params]
+        if rpc.is_classmethod:
+            path = f'"{entity.prefix}"'
+            first = []
+        else:
+            id_name = "entityId" if "id" in params else "id"
+            path = f"`{entity.prefix}/${{encodeURIComponent({id_name})}}`"
+            first = [f"{id_name}: {entity.name}Id"]
+        args = [
+            f"...{_ts_name(param.name)}"
+            if param.kind is Parameter.VAR_POSITIONAL
+            else _ts_name(param.name)
+            for param in rpc.params
+            if param.kind in (Parameter.POSITIONAL_ONLY, Parameter.VAR_POSITIONAL)
+        ]
+        kwds = self.object(
+            [
+                param
+                for param in rpc.params
+                if param.kind
+                not in (Parameter.POSITIONAL_ONLY, Parameter.VAR_POSITIONAL)
+            ]
+        )
+        return self.method(
+            stringcase.camelcase(rpc.name),
+            first + self.params(rpc.params),
+            self.type(rpc.returns),
+            "this.client.rpc",
+            [path, f'"{rpc.name}"', f"[{', '.join(args)}]", kwds],
+        )
+
+    def route(self, entity: EntitySpec, route: RouteSpec) -> list[str]:
+        path_names = re.findall(r"{(\w+)(?::\w+)?}", route.path)
+        path = entity.prefix + "/" + route.path.lstrip("/")
+        path = re.sub(
+            r"{(\w+)(?::\w+)?}",
+            lambda match: f"${{encodeURIComponent({_ts_name(match[1])})}}",
+            path,
+        )
+        options = []
+        query = [
+            param
+            for param in route.params
+            if param.name not in path_names and param.name not in route.body
+        ]
+        if query:
+            options.append(f"params: {self.object(query)}")
+        if route.body:
+            body = [param for param in route.params if param.name in route.body]
+            options.append(
+                f"body: {self.object(body) if route.embed else _ts_name(body[0].name)}"
+            )
+        args = [f'"{route.verb}"', f"`{path}`"]
+        if options:
+            args.append(f"{{ {', '.join(options)} }}")
+        return self.method(
+            stringcase.camelcase(route.name),
+            self.params(route.params),
+            self.type(route.returns),
+            "this.client.request",
+            args,
+        )
+
+    @staticmethod
+    def method(
+        name: str, params: list[str], returns: str, call: str, args: list[str]
+    ) -> list[str]:
+        # wrapped like prettier would, at 80 columns
+        signature = [f"  {name}({', '.join(params)}): Promise<{returns}> {{"]
+        if len(signature[0]) > 80:
+            signature = [
+                f"  {name}(",
+                *(f"    {param}," for param in params),
+                f"  ): Promise<{returns}> {{",
+            ]
+        body = [f"    return {call}({', '.join(args)});"]
+        if len(body[0]) > 80:
+            body = [f"    return {call}(", *(f"      {arg}," for arg in args), "    );"]
+        return ["", *signature, *body, "  }"]
+
+    def params(self, params: list[ParamSpec]) -> list[str]:
+        rendered = []
+        for i, param in enumerate(params):
+            name, type_ = _ts_name(param.name), self.type(param.type)
+            if param.kind is Parameter.VAR_POSITIONAL:
+                # an array rather than a rest parameter, which must come last
+                rendered.append(f"{name}: {type_}[] = []")
+            elif param.kind is Parameter.VAR_KEYWORD:
+                rendered.append(f"{name}: Record<string, {type_}> = {{}}")
+            elif param.default is _EMPTY:
+                rendered.append(f"{name}: {type_}")
+            elif any(
+                later.default is _EMPTY
+                and later.kind not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+                for later in params[i + 1 :]
+            ):
+                # a required parameter follows, so it can't be `?` optional
+                rendered.append(f"{name}: {type_} | undefined = undefined")
+            else:
+                # left out, ie, undefined, the server applies its default
+                rendered.append(f"{name}?: {type_}")
+        return rendered
+
+    @staticmethod
+    def object(params: list[ParamSpec]) -> str:
+        items = []
+        for param in params:
+            name = _ts_name(param.name)
+            if param.kind is Parameter.VAR_KEYWORD:
+                items.append(f"...{name}")
+            elif name == param.name:
+                items.append(name)
+            else:
+                items.append(f"{param.name}: {name}")
+        return f"{{ {', '.join(items)} }}" if items else "{}"
+
+    def type(self, annotation: Any) -> str:
+        if annotation in (_EMPTY, Any, object):
+            return "unknown"
+        if annotation is None or annotation is type(None):
+            return "null"
+        if isinstance(annotation, typing.ForwardRef):
+            annotation = annotation.__forward_arg__
+        if isinstance(annotation, str):
+            return annotation if annotation in self.names else "unknown"
+        if inspect.isclass(annotation):
+            return self.class_type(annotation)
+        origin, args = typing.get_origin(annotation), typing.get_args(annotation)
+        if origin is typing.Annotated:
+            return self.type(args[0])
+        if origin in (Union, types.UnionType):
+            return " | ".join(dict.fromkeys(self.type(arg) for arg in args))
+        if origin in (list, set, frozenset) or (
+            origin is tuple and len(args) == 2 and args[1] is Ellipsis
+        ):
+            item = self.type(args[0]) if args else "unknown"
+            return f"({item})[]" if " " in item else f"{item}[]"
+        if origin is tuple:
+            return f"[{', '.join(self.type(arg) for arg in args)}]"
+        if origin is dict and len(args) == 2:
+            return f"Record<string, {self.type(args[1])}>"
+        return "unknown"
+
+    def class_type(self, cls: type) -> str:
+        if cls.__name__ in self.names and hasattr(cls, "_rpc_methods"):
+            return cls.__name__
+        if issubclass(cls, bool):
+            return "boolean"
+        if issubclass(cls, (int, float, Decimal)):
+            return "number"
+        if issubclass(cls, (str, bytes, datetime, date, time, UUID)):
+            # bytes go as base64, the rest in their iso/hex forms
+            return "string"
+        if cls in (list, set, frozenset, tuple):
+            return "unknown[]"
+        if cls is dict or issubclass(cls, BaseModel):
+            return "Record<string, unknown>"
+        return "unknown"
+
+
+def _ts_name(name: str) -> str:
+    return f"{name}_" if name in _TS_RESERVED else name
+
+
+def _lower_first(name: str) -> str:
+    return name[:1].lower() + name[1:]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "target", help="<module>:<app> of the server app, the app defaults to `app`"
+    )
+    parser.add_argument("--python", help="where to write the Python client")
+    parser.add_argument("--typescript", help="where to write the TypeScript client")
+    args = parser.parse_args()
+    if not args.python and not args.typescript:
+        parser.error("give --python, --typescript or both")
+    entities = describe(load_app(args.target))
+    if args.python:
+        with open(args.python, "w") as f:
+            f.write(generate_python(entities, args.target))
+    if args.typescript:
+        with open(args.typescript, "w") as f:
+            f.write(generate_typescript(entities, args.target))
+
+
+if __name__ == "__main__":
+    main()
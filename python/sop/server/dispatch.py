@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import sys
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from inspect import Parameter
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, ContextManager, Mapping, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+from python.sop.utils.instrumentation import instrumentation
+from python.sop.utils.parsing import JSON, JSONParser
+
+
+@dataclass
+class DispatchStats:
+    # calls waiting on the entity's concurrency limit
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    max_queued: int = 0
+    limit: Optional[int] = None
+
+
+async def _await(awaitable: Awaitable) -> Any:
+    return await awaitable
+
+
+class Dispatcher:
+    """Runs RPC handlers for the server api.
+
+    Coroutine methods are awaited on the event loop, in a session from
+    `run_async`. Sync methods (eg, blocking ORM work) run on a bounded
+    thread pool, each in a `session`, so they don't hold up the loop. Each
+    entity type gets its own concurrency limit, so one slow entity type
+    can't take every worker and starve the rest of the server.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        default_entity_concurrency: Optional[int] = None,
+        session: Callable[[], ContextManager] = contextlib.nullcontext,
+        run_async: Callable[[Awaitable], Awaitable] = _await,
+    ) -> None:
+        self.max_workers = max_workers
+        # sync handlers run in one of these, eg the app's db session, and
+        # async ones are awaited through this, eg in a session on the loop
+        self.session = session
+        self.run_async = run_async
+        # by default an entity type may use at most half of the pool
+        self.default_entity_concurrency = default_entity_concurrency or max(
+            max_workers // 2, 1
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sop-dispatch"
+        )
+        self._entity_concurrency: dict[str, int] = {}
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self.stats: dict[str, DispatchStats] = {}
+
+    def set_entity_concurrency(self, entity_name: str, limit: int) -> None:
+        self._entity_concurrency[entity_name] = limit
+        self._semaphores.pop(entity_name, None)
+
+    def _semaphore_for(self, entity_name: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(entity_name)
+        if semaphore is None:
+            limit = self._entity_concurrency.get(
+                entity_name, self.default_entity_concurrency
+            )
+            semaphore = self._semaphores[entity_name] = asyncio.Semaphore(limit)
+            self.stats.setdefault(entity_name, DispatchStats()).limit = limit
+        return semaphore
+
+    async def call(self, entity_name: str, fn: Callable, *args, **kwds) -> Any:
+        semaphore = self._semaphore_for(entity_name)
+        stats = self.stats[entity_name]
+        stats.queued += 1
+        stats.max_queued = max(stats.max_queued, stats.queued)
+        async with semaphore:
+            stats.queued -= 1
+            stats.running += 1
+            try:
+                with instrumentation.span("server.dispatch", label=entity_name):
+                    result = await self._run(fn, *args, **kwds)
+            except Exception:
+                stats.failed += 1
+                raise
+            finally:
+                stats.running -= 1
+            stats.completed += 1
+            return result
+
+    async def _run(self, fn: Callable, *args, **kwds) -> Any:
+        if inspect.iscoroutinefunction(fn):
+            return await self.run_async(fn(*args, **kwds))
+        loop = asyncio.get_running_loop()
+        # in the caller's context, so request-scoped state (eg the acl memo)
+        # is visible to the handler
+        context = contextvars.copy_context()
+        result = await loop.run_in_executor(
+            self.executor,
+            functools.partial(context.run, self._in_session, fn, *args, **kwds),
+        )
+        # sync wrappers around async methods still hand back an awaitable
+        if inspect.isawaitable(result):
+            result = await self.run_async(result)
+        return result
+
+    def _in_session(self, fn: Callable, *args, **kwds) -> Any:
+        with self.session():
+            return fn(*args, **kwds)
+
+    @property
+    def executor_queue_depth(self) -> int:
+        # work submitted to the pool but not yet picked up by a thread
+        return self.executor._work_queue.qsize()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "executor_queue_depth": self.executor_queue_depth,
+            "entities": {
+                entity_name: dict(vars(stats))
+                for entity_name, stats in self.stats.items()
+            },
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self.executor.shutdown(wait=wait)
+
+
+def to_json(value: Any) -> JSON:
+    """Generic serializer for return values with no usable annotation."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [to_json(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): to_json(item) for key, item in value.items()}
+    if hasattr(value, "serialize"):
+        # entities, acl'd and without their version columns
+        return to_json(value.serialize())
+    if hasattr(value, "to_dict"):
+        # other orm entities
+        return to_json(value.to_dict())
+    return value
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def serializer_for(annotation: Any) -> Callable[[Any], JSON]:
+    """Builds a serializer specialized to a return annotation."""
+    if annotation in (inspect.Signature.empty, Any):
+        return to_json
+    if annotation in (None, type(None), bool, int, float, str):
+        return _identity
+    if inspect.isclass(annotation) and issubclass(annotation, BaseModel):
+        return lambda value: None if value is None else value.dict()
+    origin, type_args = typing.get_origin(annotation), typing.get_args(annotation)
+    if origin in (list, tuple, set, frozenset) and len(type_args) == 1:
+        item_serializer = serializer_for(type_args[0])
+        return lambda value: [item_serializer(item) for item in value]
+    if origin is dict and len(type_args) == 2:
+        value_serializer = serializer_for(type_args[1])
+        return lambda value: {
+            str(key): value_serializer(item) for key, item in value.items()
+        }
+    return to_json
+
+
+@dataclass(frozen=True)
+class RPCMethod:
+    """Precompiled dispatch entry for one rpc-exposed entity method."""
+
+    name: str
+    # the plain function, ie, with the classmethod unwrapped
+    fn: Callable
+    is_classmethod: bool
+    # a coroutine function, awaited on the event loop
+    is_async: bool
+    signature: inspect.Signature
+    arg_parsers: Mapping[str, JSONParser]
+    # parsers of the params that can be passed positionally, in order, so
+    # positional args can be matched to their parsers without binding
+    positional_parsers: tuple[Optional[JSONParser], ...]
+    serialize: Callable[[Any], JSON]
+    # the signature's shape, so calls are checked without binding it:
+    # how many args it takes positionally (at least, for calls without
+    # keywords, `sys.maxsize` if it needs some, and at most, `sys.maxsize`
+    # with *args), the index of each param that can be passed either way,
+    # the names it takes as keywords (None with **kwds) and its required
+    # params, as (index, name) pairs, with a None name if it's positional
+    # only and an index of `sys.maxsize` if it's keyword only
+    min_positional: int
+    max_positional: int
+    positional_index: Mapping[str, int]
+    keyword_names: Optional[frozenset[str]]
+    required: tuple[tuple[int, Optional[str]], ...]
+
+    @classmethod
+    def compile(cls, name: str, attr: Any) -> RPCMethod:
+        is_classmethod = isinstance(attr, classmethod)
+        fn = attr.__func__ if is_classmethod else attr
+        signature = inspect.signature(fn)
+        hints = _type_hints(fn)
+        # drop `cls`/`self`; it's bound when the method is called
+        params = list(signature.parameters.values())[1:]
+        signature = signature.replace(parameters=params)
+        arg_parsers = {}
+        for param in params:
+            annotation = hints.get(param.name, param.annotation)
+            if annotation is inspect.Parameter.empty:
+                continue
+            parser = JSONParser.for_type(annotation)
+            if parser is not None:
+                arg_parsers[param.name] = parser
+        positional = [
+            param
+            for param in params
+            if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD)
+        ]
+        kinds = {param.kind for param in params}
+        required = [
+            param
+            for param in params
+            if param.default is Parameter.empty
+            and param.kind not in (Parameter.VAR_POSITIONAL, Parameter.VAR_KEYWORD)
+        ]
+        return cls(
+            name=name,
+            fn=fn,
+            is_classmethod=is_classmethod,
+            is_async=inspect.iscoroutinefunction(fn),
+            signature=signature,
+            arg_parsers=MappingProxyType(arg_parsers),
+            positional_parsers=tuple(
+                arg_parsers.get(param.name) for param in positional
+            ),
+            serialize=serializer_for(hints.get("return", signature.return_annotation)),
+            min_positional=(
+                sys.maxsize
+                if any(param.kind is Parameter.KEYWORD_ONLY for param in required)
+                else len(required)
+            ),
+            max_positional=(
+                sys.maxsize if Parameter.VAR_POSITIONAL in kinds else len(positional)
+            ),
+            positional_index=MappingProxyType(
+                {
+                    param.name: i
+                    for i, param in enumerate(positional)
+                    if param.kind is Parameter.POSITIONAL_OR_KEYWORD
+                }
+            ),
+            keyword_names=(
+                None
+                if Parameter.VAR_KEYWORD in kinds
+                else frozenset(
+                    param.name
+                    for param in params
+                    if param.kind
+                    in (Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY)
+                )
+            ),
+            required=tuple(
+                (
+                    positional.index(param) if param in positional else sys.maxsize,
+                    None if param.kind is Parameter.POSITIONAL_ONLY else param.name,
+                )
+                for param in required
+            ),
+        )
+
+    def call(self, target: Any, args: list[Any], kwds: dict[str, Any]) -> Any:
+        """Checks and parses the json args, then calls the method on `target`."""
+        args, kwds = self.parse_arguments(args, kwds)
+        return self.fn(target, *args, **kwds)
+
+    def parse_arguments(
+        self, args: list[Any], kwds: dict[str, Any]
+    ) -> tuple[list[Any], dict[str, Any]]:
+        """Raises a 422 if the call doesn't match the method's signature.
+
+        Checked before the call, so a `TypeError` raised inside the method
+        is the method's error, not the caller's.
+        """
+        if kwds:
+            fits = self._fits(args, kwds)
+        else:
+            fits = self.min_positional <= len(args) <= self.max_positional
+        if not fits:
+            try:
+                self.signature.bind(*args, **kwds)
+            except TypeError as e:
+                # only bound here, for its message
+                raise HTTPException(status_code=422, detail=str(e))
+        if not self.arg_parsers:
+            return args, kwds
+        with instrumentation.span("parse", label="rpc_arguments", method=self.name):
+            return self._parse_arguments(args, kwds)
+
+    def _fits(self, args: list[Any], kwds: dict[str, Any]) -> bool:
+        count = len(args)
+        if count > self.max_positional:
+            return False
+        keyword_names, positional_index = self.keyword_names, self.positional_index
+        for name in kwds:
+            if keyword_names is not None and name not in keyword_names:
+                return False
+            # passed both ways
+            if positional_index.get(name, count) < count:
+                return False
+        for index, name in self.required:
+            if index >= count and (name is None or name not in kwds):
+                return False
+        return True
+
+    def _parse_arguments(self, args, kwds) -> tuple[list[Any], dict[str, Any]]:
+        parsers = self.arg_parsers
+        positional_parsers = self.positional_parsers
+        args = list(args)
+        for i, parser in enumerate(positional_parsers[: len(args)]):
+            if parser is not None:
+                args[i] = parser.parse(args[i])
+        kwds = {
+            name: parsers[name].parse(arg) if name in parsers else arg
+            for name, arg in kwds.items()
+        }
+        return args, kwds
+
+
+def _type_hints(fn: Callable) -> dict[str, Any]:
+    try:
+        return typing.get_type_hints(fn)
+    except Exception:
+        # unresolvable forward refs; fall back to the raw annotations
+        return {}
+
+
+def rpc(fn: Callable) -> Callable:
+    """Exposes an entity method over rpc, ie, `<type>/<id>/rpc`.
+
+    Only methods marked with `@rpc` (instance methods) or `@rpc.cls`
+    (classmethods, `<type>/rpc`) are callable by clients. `@rpc` also marks
+    an already wrapped classmethod.
+    """
+    func = fn.__func__ if isinstance(fn, classmethod) else fn
+    func.__sop_rpc__ = True
+    return fn
+
+
+def _rpc_cls(fn: Callable) -> classmethod:
+    return rpc(classmethod(fn))
+
+
+rpc.cls = _rpc_cls
+
+
+def is_rpc(attr: Any) -> bool:
+    func = attr.__func__ if isinstance(attr, classmethod) else attr
+    return getattr(func, "__sop_rpc__", False)
+
+
+def build_dispatch_table(entity_cls: type) -> Mapping[str, RPCMethod]:
+    """Collects the rpc-exposed methods of an entity class.
+
+    Methods marked with `@rpc`/`@rpc.cls` on the classes in the mro are
+    exposed; an override that isn't marked hides the method again. Orm
+    base classes (pony) and `object` are skipped, as are names starting
+    with `_`.
+    """
+    table: dict[str, RPCMethod] = {}
+    for klass in reversed(entity_cls.__mro__):
+        if klass is object or klass.__module__.startswith("pony."):
+            continue
+        for name, attr in vars(klass).items():
+            if name.startswith("_"):
+                continue
+            if is_rpc(attr) and (
+                isinstance(attr, classmethod) or inspect.isfunction(attr)
+            ):
+                table[name] = RPCMethod.compile(name, attr)
+            elif name in table:
+                # overridden by something that isn't an rpc method
+                del table[name]
+    return MappingProxyType(table)
@@ -1,17 +1,37 @@
 from abc import abstractmethod
+import base64
+import hashlib
 from functools import cached_property
 import inspect
-from typing import Any, Callable, Self
-from fastapi import HTTPException
+import json
+import time
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Mapping, Optional, Self
+from fastapi import Body, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from pony.orm import desc, flush
 
 import pydantic
-from python.sop.client.api import ClientAPI, SubController
 
 from python.sop.base.entity import BaseEntity
-from python.sop.server.app import App
+from python.sop.server.acl import AccessPlan, RowRestriction, acl_scope, forget
 from python.sop.server.api import ServerAPI
+from python.sop.server.cache import CachedRead
+from python.sop.server.dispatch import RPCMethod, build_dispatch_table
+from python.sop.server.feed import ChangeEvent
+from python.sop.server.versions import (
+    VERSION_FIELDS,
+    add_version_columns,
+    changed_since,
+    record_write,
+    row_version,
+)
+from python.sop.server.wire import NegotiatedResponse, response_codec
 from python.sop.utils.parsing import ClassParser, JSONParser
 
+if TYPE_CHECKING:
+    from python.sop.server.app import App
+
 
 class ServerEntity(BaseEntity):
     """Not intended for direct subclassing. Use `app.Entity` instead."""
@@ -22,65 +42,800 @@ class ServerEntity(BaseEntity):
         # use cls.controller to access the class level controller
         # use self.controller to access the instance level controller
         api: ServerAPI = ServerAPI()
-        app: App
+        app: "App"
 
         _access_restrictions: dict[str, Callable] = {}
-        _access_restrictions: dict[str, Callable] = {}
+        _row_restrictions: list[RowRestriction] = []
+
+        # max concurrent rpc calls for this entity type (see `App.dispatcher`)
+        max_concurrency: Optional[int] = None
+        # upper bound for `limit`/`batch_size` on the paginated routes
+        max_page_size: int = 1000
+        # rows `create_many` inserts per flush
+        bulk_chunk_size: int = 500
+        # seconds `get_by_id`/`get_many`/`get_all` responses are served from
+        # the app's `response_cache`. None to always read the db. Writes
+        # through the crud routes and instance rpcs invalidate them; other
+        # writes (eg by classmethod rpcs) show once the entry expires
+        response_cache_ttl: Optional[float] = None
+        # returns the caller's visibility class, eg their role: callers in one
+        # class must get the same acl'd view of every entity, so they can share
+        # cached and concurrent reads. Entities with access restrictions only
+        # share reads with one; return None to not share a caller's reads
+        read_visibility: Optional[Callable[[], Hashable]] = None
 
         def __init_subclass__(cls) -> None:
             super().__init_subclass__()
             cls._access_restrictions = cls._access_restrictions.copy()
+            cls._row_restrictions = cls._row_restrictions.copy()
+
+    _rpc_methods: Mapping[str, RPCMethod] = MappingProxyType({})
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        # before the orm maps the class. `Entity` is the app's unmapped base,
+        # and subtypes of a table share its columns
+        if cls.__name__ != "Entity" and not hasattr(cls, "_version"):
+            add_version_columns(cls)
+        super().__init_subclass__(**kwargs)
+        if cls.__name__ != "Entity":
+            # its own api from the start, so acls can be declared before the
+            # app is finalized. The bases' routes are merged into it then
+            meta = cls._get_meta()
+            if any(
+                meta.api is getattr(getattr(base, "Meta", None), "api", None)
+                for base in cls.__bases__
+            ):
+                meta.api = type(meta.api)()
+            meta.api.bind_entity(cls)
 
     @Meta.api.post_endpoint("/create")
     @classmethod
-    def create(cls, **kwargs):
-        ...
+    def create(cls, data: dict[str, Any] = Body(...)) -> NegotiatedResponse:
+        """Inserts an entity and returns its id."""
+        with cls.app.data.session():
+            id, version, serialized = cls._insert(data)
+        cls._publish("create", id, version, serialized, serialized)
+        return NegotiatedResponse(id)
 
-    @Meta.api.get_endpoint("/{id}")
+    # bulk variants of create/update_by_id/delete_by_id. Each runs as one
+    # transaction and returns one `{"result": ...}` or `{"error":
+    # {"status_code": ..., "detail": ...}}` per item, in order, so refused
+    # rows don't fail the rest
+
+    @Meta.api.post_endpoint("/create_many")
     @classmethod
-    def get_by_id(cls, id: str) -> Self:
-        ...
+    def create_many(cls, items: list[dict[str, Any]] = Body(...)) -> NegotiatedResponse:
+        """Inserts every item. Results are the new ids."""
+        results, created = [], []
+        with cls.app.data.session():
+            for result in cls._insert_many(items):
+                if isinstance(result, HTTPException):
+                    results.append(_row_error(result))
+                    continue
+                results.append({"result": result[0]})
+                created.append(result)
+        for id, version, serialized in created:
+            cls._publish("create", id, version, serialized, serialized)
+        return NegotiatedResponse(results)
+
+    @Meta.api.post_endpoint("/update_many")
+    @classmethod
+    def update_many(cls, items: list[dict[str, Any]] = Body(...)) -> NegotiatedResponse:
+        """Applies `{"id", "changes", "version"}` items like `patch_by_id`.
+
+        Results are the same `{"version", "changes"}` deltas.
+        """
+        results, updated = [], []
+        with cls.app.data.session():
+            rows = cls._load_many([cls._coerce_id(item.get("id")) for item in items])
+            for item in items:
+                entity = rows.get(cls._coerce_id(item.get("id")))
+                changes, version = item.get("changes") or {}, item.get("version")
+                try:
+                    if entity is None:
+                        detail = f"No entity with id {item.get('id')}"
+                        raise HTTPException(status_code=404, detail=detail)
+                    write = cls._apply_write(entity, changes, version)
+                except HTTPException as e:
+                    results.append(_row_error(e))
+                    continue
+                results.append({"result": _delta(version, *write)})
+                if changes:
+                    updated.append((entity.id, write[0], changes, write[2]))
+        for id, new_version, changes, data in updated:
+            cls._publish("update", id, new_version, changes, data)
+        return NegotiatedResponse(results)
+
+    @Meta.api.post_endpoint("/delete_many")
+    @classmethod
+    def delete_many(cls, ids: list[str] = Body(...)) -> NegotiatedResponse:
+        """Deletes every id with one query. Results are the final versions."""
+        ids = list(dict.fromkeys(ids))
+        keys = {id: cls._coerce_id(id) for id in ids}
+        with cls.app.data.session():
+            rows = cls._load_many(list(keys.values()))
+            deleted = {
+                key: (row_version(row) + 1, row.serialize())
+                for key, row in rows.items()
+            }
+            if deleted:
+                found = list(deleted)
+                cls.select(lambda e: e.id in found).delete(bulk=True)
+        results = []
+        for id in ids:
+            key = keys[id]
+            if key not in deleted:
+                error = HTTPException(status_code=404, detail=f"No entity with id {id}")
+                results.append(_row_error(error))
+                continue
+            version, data = deleted.pop(key)
+            cls._publish("delete", key, version, None, data)
+            results.append({"result": {"version": version}})
+        return NegotiatedResponse(results)
+
+    # registered before `/{id}` so that route doesn't swallow them
+
+    @Meta.api.get_endpoint("/page")
+    @classmethod
+    def get_page(
+        cls, after: Optional[str] = None, limit: int = 100
+    ) -> NegotiatedResponse:
+        """Keyset pagination over the table, ordered by id.
+
+        Returns `{"items": [...], "next_cursor": ...}`. Pass `next_cursor` back
+        as `after` to get the following page; it's None on the last page.
+        """
+        limit = max(1, min(limit, cls.Meta.max_page_size))
+        plan = cls._access_plan()
+        with cls.app.data.session():
+            # fetch one extra row to know whether there is a next page
+            rows = cls._keyset_query(_decode_cursor(after))[: limit + 1]
+            items = [row.serialize() for row in plan.visible_rows(rows[:limit])]
+            next_cursor = None
+            if len(rows) > limit:
+                next_cursor = _encode_cursor(rows[limit - 1].id)
+        return NegotiatedResponse({"items": items, "next_cursor": next_cursor})
+
+    @Meta.api.get_endpoint("/stream")
+    @classmethod
+    def stream_all(cls, batch_size: int = 500) -> StreamingResponse:
+        """Streams the whole table, one entity per payload.
+
+        In the negotiated codec's stream format, eg NDJSON for JSON. Rows are
+        read page by page, so neither side ever holds the full table.
+        """
+        batch_size = max(1, min(batch_size, cls.Meta.max_page_size))
+        plan = cls._access_plan()
+        # the request's scope, and so its codec, is gone once the body runs
+        codec = response_codec()
+
+        def items():
+            after = None
+            while True:
+                # runs after the request's own scope has closed
+                with cls.app.data.session(), acl_scope():
+                    rows = cls._keyset_query(after)[:batch_size]
+                    chunk = [row.serialize() for row in plan.visible_rows(rows)]
+                    after = rows[-1].id if rows else None
+                for item in chunk:
+                    yield codec.encode_item(item)
+                if len(rows) < batch_size:
+                    return
+
+        return StreamingResponse(
+            items(), media_type=codec.stream_media_type, headers={"Vary": "Accept"}
+        )
+
+    @Meta.api.post_endpoint("/query")
+    @classmethod
+    def query(cls, document: dict[str, Any] = Body(...)) -> NegotiatedResponse:
+        """Runs a query document, as built by the client's `Query`, in one query.
+
+        `{"where": [[field, op, value], ...], "order_by": ["-field", ...],
+        "limit": n, "offset": n, "fields": [...]}`, all optional. Fields and
+        operators are checked against the entity's columns and `QUERY_OPERATORS`,
+        so a document can't run anything else. Filtering or ordering on acl'd
+        fields is refused, since the results would reveal them; rows the caller
+        can't see are left out, so a page can come back short.
+        """
+        plan = cls._access_plan()
+        with cls.app.data.session():
+            query, fields = cls._compile_query(document)
+            items = [
+                row.serialize(only=fields or None)
+                for row in plan.visible_rows(query)
+            ]
+        return NegotiatedResponse({"items": items})
+
+    @classmethod
+    def _compile_query(cls, document: dict[str, Any]) -> tuple[Any, list[str]]:
+        restricted = cls._access_plan().restricted
+
+        def column(name: Any, queried: bool = True):
+            attr = cls._adict_.get(name) if isinstance(name, str) else None
+            if attr is None or attr.is_collection or name in VERSION_FIELDS:
+                raise HTTPException(status_code=422, detail=f"Unknown field {name}")
+            if queried and name in restricted:
+                raise HTTPException(
+                    status_code=403, detail=f"Can't query on restricted field {name}"
+                )
+            return attr
+
+        for key in ("where", "order_by", "fields"):
+            if not isinstance(document.get(key) or [], list):
+                raise HTTPException(status_code=422, detail=f"`{key}` must be a list")
+        query = cls._access_plan().filter_query(cls.select())
+        for condition in document.get("where") or []:
+            try:
+                name, op, value = condition
+            except (TypeError, ValueError):
+                raise HTTPException(
+                    status_code=422, detail=f"Invalid condition {condition}"
+                )
+            attr = column(name)
+            template = QUERY_OPERATORS.get(op)
+            if template is None:
+                raise HTTPException(status_code=422, detail=f"Unknown operator {op}")
+            if op == "in" and not isinstance(value, list):
+                raise HTTPException(
+                    status_code=422, detail=f"`in` needs a list, not {value!r}"
+                )
+            parse = cls._column_parser(attr)
+            try:
+                value = [parse(item) for item in value] if op == "in" else parse(value)
+            except (TypeError, ValueError) as e:
+                raise HTTPException(
+                    status_code=422, detail=f"Invalid value for {name}: {e}"
+                )
+            # only the validated column name goes into the query text; the
+            # value is passed as a parameter
+            query = query.filter(template.format(name=name), {}, {"value": value})
+        order_by = document.get("order_by") or ["id"]
+        for name in order_by:
+            descending = isinstance(name, str) and name.startswith("-")
+            attr = column(name[1:] if descending else name)
+            query = query.order_by(desc(attr) if descending else attr)
+        max_page_size = cls.Meta.max_page_size
+        limit = min(_count(document, "limit", max_page_size), max_page_size)
+        offset = _count(document, "offset", 0)
+        fields = document.get("fields") or []
+        for name in fields:
+            column(name, queried=False)
+        if fields and "id" not in fields:
+            fields = ["id", *fields]
+        return query[offset : offset + limit], fields
+
+    @classmethod
+    def _column_parser(cls, attr) -> Callable[[Any], Any]:
+        if attr.is_relation:
+            # references are sent as ids
+            return lambda id: attr.py_type._load(id)
+        return JSONParser.for_type(attr.py_type).parse
 
     @Meta.api.get_endpoint("/many")
     @classmethod
-    def get_many(cls, ids: list[str]) -> list[Self]:
-        ...
+    def get_many(cls, ids: list[str] = Query(...)) -> NegotiatedResponse:
+        """Loads every id in one query.
+
+        Returns `{"items": [...], "missing": [...]}` with items in the order
+        of `ids` (duplicates dropped) and the ids that don't exist.
+        """
+        ids = list(dict.fromkeys(ids))
+        keys = {id: cls._coerce_id(id) for id in ids}
+        view = cls._cache_view()
+        cache = cls.app.response_cache
+        found, tokens = {}, {}
+        if view is not None:
+            for key in keys.values():
+                entry, tokens[key] = cache.lookup(cls._guid(key), view)
+                if entry is not None:
+                    found[key] = entry.data
+        unread = [key for key in keys.values() if key not in found]
+        if unread:
+            with cls.app.data.session():
+                # rows the caller can't see are reported missing
+                rows = cls._load_many(unread)
+                read = {
+                    key: (row.serialize(), row_version(row))
+                    for key, row in rows.items()
+                }
+            for key, (data, version) in read.items():
+                found[key] = data
+                if view is not None:
+                    entry = CachedRead(data, version, cls._cache_expiry())
+                    cache.store(cls._guid(key), view, entry, tokens[key])
+        items = [found[keys[id]] for id in ids if keys[id] in found]
+        missing = [id for id in ids if keys[id] not in found]
+        return NegotiatedResponse({"items": items, "missing": missing})
+
+    @classmethod
+    def _coerce_id(cls, id: Any) -> Any:
+        # ids arrive as strings from paths and query params
+        pk_type = cls._pk_attrs_[0].py_type
+        try:
+            return pk_type(id)
+        except (TypeError, ValueError):
+            return id
+
+    @classmethod
+    def _keyset_query(cls, after: Optional[Any] = None):
+        query = cls._access_plan().filter_query(cls.select())
+        if after is not None:
+            query = query.filter(lambda entity: entity.id > after)
+        return query.order_by(cls.id)
+
+    @classmethod
+    def _load(cls, id: Any) -> Optional[Self]:
+        # orm lookup, None if missing or hidden; call it inside a session
+        key = cls._coerce_id(id)
+        plan = cls._access_plan()
+        entity = plan.filter_query(cls.select(lambda e: e.id == key)).first()
+        if entity is None or not plan.visible_rows([entity]):
+            return None
+        return entity
+
+    @classmethod
+    def _visible(cls, id: Any) -> bool:
+        # whether the caller can see the entity; call it inside a session
+        return cls._load(id) is not None
+
+    @classmethod
+    def _feed_view(cls, event: ChangeEvent, seen: set[str]) -> Optional[ChangeEvent]:
+        """The event as the caller may be sent it, None if they can't see it.
+
+        Call it inside a session, as the feed subscriber. acl'd fields were
+        left out of the event already (see `_publish`); this applies the row
+        restrictions to the entity as it is now. A deleted row can't be
+        checked, so a delete is only sent to connections that were shown the
+        entity (`seen`, eg by a subscription to it).
+        """
+        if not cls._access_plan().row_restrictions:
+            return event
+        if event.op == "delete":
+            return event if event.guid in seen else None
+        if cls._load(event.id) is None:
+            return None
+        seen.add(event.guid)
+        return event
+
+    @classmethod
+    def _guid(cls, key: Any) -> str:
+        # `guid` of the entity with this (coerced) id, without loading it
+        return f"{cls.__name__}:{key}"
+
+    @classmethod
+    def _cache_view(cls) -> Optional[Hashable]:
+        # the caller's visibility class, or None if its reads aren't cached
+        if cls.Meta.response_cache_ttl is None:
+            return None
+        return cls._read_view()
+
+    @classmethod
+    def _read_view(cls) -> Optional[Hashable]:
+        # the caller's visibility class, or None if its reads aren't shared
+        visibility = cls.Meta.read_visibility
+        if visibility is not None:
+            return visibility()
+        plan = cls._access_plan()
+        if plan.restricted or plan.row_restrictions:
+            # one caller's view could be served to another
+            return None
+        return "*"
+
+    @classmethod
+    def _read_once(cls, route: str, guid: str, read: Callable[[], Any]) -> Any:
+        # concurrent identical reads by callers with the same view share one
+        view = cls._read_view() if cls.app.single_flight_reads else None
+        if view is None:
+            return read()
+        return cls.app.single_flight.do((route, guid, view), read)
+
+    @classmethod
+    def _cache_expiry(cls) -> float:
+        return time.monotonic() + (cls.Meta.response_cache_ttl or 0.0)
+
+    @classmethod
+    def _invalidate_cached(cls, key: Any) -> None:
+        """Drops the cached reads of an entity and its table once committed."""
+        if cls.Meta.response_cache_ttl is None:
+            return
+        guids = [cls._guid(key), f"{cls.__name__}:*"]
+        cls.app.data.after_commit(lambda: cls.app.invalidate_reads(guids))
+
+    @classmethod
+    def _access_plan(cls) -> AccessPlan:
+        plan = _access_plans.get(cls)
+        if plan is None:
+            plan = _access_plans[cls] = AccessPlan(
+                cls.Meta._access_restrictions, cls.Meta._row_restrictions
+            )
+        return plan
+
+    @classmethod
+    def _invalidate_access_plan(cls) -> None:
+        # after the restrictions changed; recompiled on next use
+        _access_plans.pop(cls, None)
+
+    @Meta.api.get_endpoint("/{id}")
+    @classmethod
+    def get_by_id(cls, id: str, request: Request) -> Response:
+        """Returns the entity with an ETag for the caller's view of it.
+
+        A request whose `If-None-Match` matches gets an empty 304, so clients
+        can revalidate their cached copy without downloading it again.
+        """
+        key = cls._coerce_id(id)
+        guid, view = cls._guid(key), cls._cache_view()
+        entry = None
+        if view is not None:
+            entry, token = cls.app.response_cache.lookup(guid, view)
+        if entry is None:
+            entry = cls._read_once("get_by_id", guid, lambda: cls._read_entry(key))
+            if view is not None:
+                cls.app.response_cache.store(guid, view, entry, token)
+        codec = response_codec()
+        encoded = entry.bodies.get(codec.media_type)
+        if encoded is None:
+            body = codec.encode(entry.data)
+            # hashed after acl nulling, so callers with different views never
+            # share an etag
+            etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+            encoded = entry.bodies[codec.media_type] = (body, etag)
+        body, etag = encoded
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            # where the client's delta sync starts from
+            "X-Version": str(entry.version),
+            "Vary": "Accept",
+        }
+        if_none_match = _parse_etags(request.headers.get("if-none-match"))
+        if etag in if_none_match or "*" in if_none_match:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type=codec.media_type, headers=headers)
+
+    @classmethod
+    def _read_entry(cls, key: Any) -> CachedRead:
+        with cls.app.data.session():
+            entity = cls._load(key)
+            if entity is None:
+                raise HTTPException(status_code=404, detail=f"No entity with id {key}")
+            return CachedRead(
+                entity.serialize(), row_version(entity), cls._cache_expiry()
+            )
 
     @Meta.api.get_endpoint("/")
     @classmethod
-    def get_all(cls) -> list[Self]:
-        ...
+    def get_all(cls) -> NegotiatedResponse:
+        """Every entity the caller can see; `/page` and `/stream` scale better."""
+        view = cls._cache_view()
+        guid = f"{cls.__name__}:*"
+        if view is not None:
+            entry, token = cls.app.response_cache.lookup(guid, view)
+            if entry is not None:
+                return NegotiatedResponse(entry.data)
+        items = cls._read_once("get_all", guid, cls._read_all)
+        if view is not None:
+            entry = CachedRead(items, expires_at=cls._cache_expiry())
+            cls.app.response_cache.store(guid, view, entry, token)
+        return NegotiatedResponse(items)
+
+    @classmethod
+    def _read_all(cls) -> list[dict[str, Any]]:
+        plan = cls._access_plan()
+        with cls.app.data.session():
+            rows = plan.filter_query(cls.select()).order_by(cls.id)
+            return [row.serialize() for row in plan.visible_rows(rows)]
 
     @Meta.api.put_endpoint("/{id}")
     @classmethod
-    def update_by_id(cls, id: int, data: Self):
-        ...
+    def update_by_id(
+        cls, id: str, data: dict[str, Any] = Body(...)
+    ) -> NegotiatedResponse:
+        """Writes `data` unconditionally and returns the new version."""
+        return NegotiatedResponse({"version": cls._write(id, data)[0]})
+
+    @Meta.api.patch_endpoint("/{id}")
+    @classmethod
+    def patch_by_id(
+        cls, id: str, patch: dict[str, Any] = Body(...)
+    ) -> NegotiatedResponse:
+        """Delta sync: applies `patch["changes"]`, made at `patch["version"]`.
+
+        Returns `{"version": ..., "changes": {...}}` with only the fields that
+        changed server-side since that version. Writing a field that changed
+        since then to a different value is a conflict: nothing is written and
+        the 409 lists the current values. A null version skips the check
+        (last write wins) and returns every field.
+        """
+        version = patch.get("version")
+        write = cls._write(id, patch.get("changes") or {}, version)
+        return NegotiatedResponse(_delta(version, *write))
+
+    @classmethod
+    def _write(
+        cls, id: str, changes: dict[str, Any], version: Optional[int] = None
+    ) -> tuple[int, set[str], dict[str, Any]]:
+        with cls.app.data.session():
+            entity = cls._load(id)
+            if entity is None:
+                raise HTTPException(status_code=404, detail=f"No entity with id {id}")
+            entity_id = entity.id
+            new_version, changed, data = cls._apply_write(entity, changes, version)
+        if changes:
+            cls._publish("update", entity_id, new_version, changes, data)
+        return new_version, changed, data
+
+    @classmethod
+    def _apply_write(
+        cls, entity: Self, changes: dict[str, Any], version: Optional[int] = None
+    ) -> tuple[int, set[str], dict[str, Any]]:
+        # call inside a session. Everything is checked before anything is
+        # written, so a refused write leaves the entity untouched. Returns the
+        # new version, the fields changed by others since `version` and the
+        # serialized entity after the write
+        current = entity.serialize()
+        unknown = [name for name in changes if name not in current or name == "id"]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Can't write fields {unknown}")
+        plan = cls._access_plan()
+        if not all(plan.allows(entity, name) for name in changes):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        changed = set()
+        if version is not None:
+            changed = changed_since(entity, version)
+            conflicts = {
+                name: current[name]
+                for name in changed & changes.keys()
+                if _json_value(current[name]) != _json_value(changes[name])
+            }
+            if conflicts:
+                raise HTTPException(
+                    status_code=409,
+                    detail={
+                        "conflicts": _json_value(conflicts),
+                        "version": row_version(entity),
+                    },
+                )
+        for name, value in changes.items():
+            setattr(entity, name, value)
+        data = entity.serialize()
+        new_version = record_write(entity, changes) if changes else row_version(entity)
+        return new_version, changed - changes.keys(), data
+
+    @classmethod
+    def _insert(cls, data: dict[str, Any]) -> tuple[Any, int, dict[str, Any]]:
+        # call inside a session. Returns the new id, version and the
+        # serialized entity
+        (result,) = cls._insert_many([data])
+        if isinstance(result, HTTPException):
+            raise result
+        return result
+
+    @classmethod
+    def _insert_many(
+        cls, items: list[dict[str, Any]]
+    ) -> list[tuple[Any, int, dict[str, Any]] | HTTPException]:
+        # call inside a session. Per item, what `_insert` returns or the
+        # HTTPException refusing it. Rows are inserted with one flush per
+        # chunk of `Meta.bulk_chunk_size`, and read back with one query
+        size = cls.Meta.bulk_chunk_size
+        results = []
+        for start in range(0, len(items), size):
+            results.extend(cls._insert_chunk(items[start : start + size]))
+        return results
+
+    @classmethod
+    def _insert_chunk(
+        cls, items: list[dict[str, Any]]
+    ) -> list[tuple[Any, int, dict[str, Any]] | HTTPException]:
+        rows = []
+        for data in items:
+            try:
+                rows.append(cls._new_row(data))
+            except HTTPException as e:
+                rows.append(e)
+        # assigns the ids
+        flush()
+        created = [row for row in rows if not isinstance(row, HTTPException)]
+        visible = cls._load_many([row.id for row in created])
+        plan = cls._access_plan()
+        results, refused = [], []
+        for data, row in zip(items, rows):
+            if isinstance(row, HTTPException):
+                results.append(row)
+                continue
+            entity = visible.get(row.id)
+            if entity is None or not all(plan.allows(entity, name) for name in data):
+                # the caller couldn't have read it back; undo just this row
+                refused.append(row.id)
+                results.append(HTTPException(status_code=403, detail="Forbidden"))
+                continue
+            version = record_write(entity, data)
+            results.append((entity.id, version, entity.serialize()))
+        if refused:
+            cls.select(lambda e: e.id in refused).delete(bulk=True)
+        return results
+
+    @classmethod
+    def _new_row(cls, data: dict[str, Any]) -> Self:
+        unknown = [
+            name
+            for name in data
+            if name not in cls._adict_
+            or cls._adict_[name].is_collection
+            or name in VERSION_FIELDS
+        ]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Can't write fields {unknown}")
+        try:
+            # the orm's constructor, so column defaults and types apply
+            return cls(**data)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    @classmethod
+    def _load_many(cls, keys: list[Any]) -> dict[Any, Self]:
+        # one query; rows the caller can't see are left out
+        plan = cls._access_plan()
+        query = plan.filter_query(cls.select(lambda e: e.id in keys))
+        return {row.id: row for row in plan.visible_rows(query)}
+
+    @classmethod
+    def _publish(
+        cls,
+        op: str,
+        id: Any,
+        version: int,
+        changes: Optional[dict[str, Any]],
+        data: Optional[dict[str, Any]],
+    ) -> None:
+        # acl'd fields are left out of the feed; clients pull them instead
+        restricted = cls._access_plan().restricted
+        data = _json_value(
+            {
+                name: value
+                for name, value in (data or {}).items()
+                if name not in restricted
+            }
+        )
+        if changes is not None:
+            changes = {name: data[name] for name in changes if name in data}
+        event = ChangeEvent(op, cls.__name__, _json_value(id), version, changes, data)
+        # subscribers only hear of committed changes
+        cls.app.data.after_commit(lambda: cls.app.publish_change(event))
+        cls._invalidate_cached(id)
 
     @Meta.api.delete_endpoint("/{id}")
     @classmethod
-    def delete_by_id(cls, id: int):
-        ...
+    def delete_by_id(cls, id: str) -> NegotiatedResponse:
+        key = cls._coerce_id(id)
+        with cls.app.data.session():
+            entity = cls._load(key)
+            if entity is None:
+                raise HTTPException(status_code=404, detail=f"No entity with id {id}")
+            version, data = row_version(entity) + 1, entity.serialize()
+            # through a query: BaseEntity.delete shadows the orm's entity.delete
+            cls.select(lambda entity: entity.id == key).delete(bulk=True)
+        cls._publish("delete", key, version, None, data)
+        return NegotiatedResponse({"version": version})
+
+    @classmethod
+    def _finalize_registration(cls) -> None:
+        super()._finalize_registration()
+        registry = cls.app.registry
+        with registry.timed(cls, "rpc"):
+            # name -> precompiled entry, so rpc calls skip hasattr/getattr/inspect
+            # and the acl'd __getattribute__ on every request
+            cls._rpc_methods = build_dispatch_table(cls)
+            cls.Meta.api.init_cls_rpc_endpoint()
+            cls.Meta.api.init_jit_index_instance_rpc_endpoint()
+        if cls.Meta.max_concurrency is not None:
+            cls.app.dispatcher.set_entity_concurrency(
+                cls.__name__, cls.Meta.max_concurrency
+            )
 
-    def __init_subclass__(cls) -> None:
-        cls.app.db.Entity.__init_subclass__(cls)
-        cls.Meta.api._rpc_entity_cls = cls
-        return super().__init_subclass__()
+    def __new__(cls, *args, **kwargs) -> Self:
+        # instances are rows, built by the orm (see `_insert`), not calls to
+        # `create` like `BaseEntity.__new__`
+        return object.__new__(cls)
 
-    def __init__(self) -> None:
-        super().__init__()
-        self.Meta = type("Meta", (self.Meta,), {})
-        self.Meta.api._rpc_entity_instance = self
+    def __init__(self, *args, **kwargs) -> None:
+        # the orm's constructor, past `BaseEntity.__init__`
+        super(BaseEntity, self).__init__(*args, **kwargs)
+
+    def serialize(self, only: Optional[list[str]] = None) -> dict[str, Any]:
+        """Returns the entity as JSON, with fields the caller can't see nulled.
+
+        `only` limits it to those fields, which are the only ones read.
+        """
+        if only is None:
+            data = self.to_dict(exclude=VERSION_FIELDS)
+        else:
+            data = self.to_dict(only=only)
+        return type(self)._access_plan().project(self, data)
 
     def __getattribute__(self, __name: str) -> Any:
-        if __name in ( 'Meta', '_access_restrictions'):
-            return super().__getattribute__(__name)
-        if __name in self.Meta._access_restrictions:
-            if not self.Meta._access_restrictions[__name](self):
-                raise HTTPException(status_code=403, detail="Forbidden")
+        # type(self) rather than self.Meta, so checking doesn't recurse, and
+        # unrestricted names (most of them, incl. the orm's) cost a set lookup
+        plan = _access_plans.get(type(self)) or type(self)._access_plan()
+        if __name in plan.restricted and not plan.allows(self, __name):
+            raise HTTPException(status_code=403, detail="Forbidden")
         return super().__getattribute__(__name)
 
     def __setattr__(self, __name: str, __value: Any) -> None:
-        if __name in self.Meta._access_restrictions:
-            if not self.Meta._access_restrictions[__name](self):
-                raise HTTPException(status_code=403, detail="Forbidden")
-        return super().__setattr__(__name, __value)
+        plan = _access_plans.get(type(self)) or type(self)._access_plan()
+        if __name in plan.restricted and not plan.allows(self, __name):
+            raise HTTPException(status_code=403, detail="Forbidden")
+        super().__setattr__(__name, __value)
+        if __name in type(self)._adict_:
+            # predicates may read the field, eg a change of owner
+            forget(self)
+
+
+# query document operator -> filter over one column, see `ServerEntity.query`
+QUERY_OPERATORS = {
+    "eq": "lambda entity: entity.{name} == value",
+    "ne": "lambda entity: entity.{name} != value",
+    "lt": "lambda entity: entity.{name} < value",
+    "le": "lambda entity: entity.{name} <= value",
+    "gt": "lambda entity: entity.{name} > value",
+    "ge": "lambda entity: entity.{name} >= value",
+    "in": "lambda entity: entity.{name} in value",
+    "contains": "lambda entity: value in entity.{name}",
+    "startswith": "lambda entity: entity.{name}.startswith(value)",
+}
+
+# entity class -> its compiled access restrictions
+_access_plans: dict[type, AccessPlan] = {}
+
+
+def _count(document: dict[str, Any], name: str, default: int) -> int:
+    # `limit` or `offset` of a query document
+    value = document.get(name)
+    if value is None:
+        return default
+    if type(value) is not int or value < (1 if name == "limit" else 0):
+        raise HTTPException(status_code=422, detail=f"Invalid {name} {value!r}")
+    return value
+
+
+def _encode_cursor(id: Any) -> str:
+    # opaque to clients, so the cursor can carry more than the id later on
+    return base64.urlsafe_b64encode(json.dumps({"id": id}).encode()).decode()
+
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Any]:
+    if cursor is None:
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor {cursor}")
+
+
+def _parse_etags(header: Optional[str]) -> set[str]:
+    if not header:
+        return set()
+    # weak validators compare equal to strong ones for GETs
+    return {tag.strip().removeprefix("W/") for tag in header.split(",")}
+
+
+def _delta(
+    version: Optional[int], new_version: int, changed: set[str], data: dict[str, Any]
+) -> dict[str, Any]:
+    # what a delta sync sends back: every field without a base version, else
+    # only the fields changed by others since it
+    if version is not None:
+        data = {name: data[name] for name in changed if name in data}
+    return {"version": new_version, "changes": data}
+
+
+def _row_error(e: HTTPException) -> dict[str, Any]:
+    return {"error": {"status_code": e.status_code, "detail": e.detail}}
+
+
+def _json_value(value: Any) -> Any:
+    # what `value` looks like on the wire, so eg datetimes compare equal to
+    # the strings clients send back
+    return json.loads(json.dumps(value, default=str))
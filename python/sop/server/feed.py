@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field, replace
+import json
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    op: str  # "create" | "update" | "delete"
+    entity: str
+    id: Any
+    version: int
+    # the changed fields (every field for a create), minus acl'd ones
+    changes: Optional[dict[str, Any]] = None
+    # the entity as of the write, to match `where` filters against; not sent
+    data: Optional[dict[str, Any]] = field(default=None, compare=False, repr=False)
+    # position in the feed of the worker delivering it, see `ChangeFeed.publish`
+    seq: int = field(default=0, compare=False)
+
+    @property
+    def guid(self) -> str:
+        return f"{self.entity}:{self.id}"
+
+    def merge(self, later: ChangeEvent) -> ChangeEvent:
+        """Coalesces two undelivered events for the same entity into one."""
+        if later.seq < self.seq:
+            # eg a replayed event meeting a live one
+            return later.merge(self)
+        if later.op == "delete" or self.op == "delete":
+            # a delete wins; a create after a delete starts over
+            return later
+        changes = {**(self.changes or {}), **(later.changes or {})}
+        # created then updated is still a create, just with the later fields
+        return replace(later, op=self.op, changes=changes)
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "op": self.op,
+            "entity": self.entity,
+            "id": self.id,
+            "version": self.version,
+            "changes": self.changes,
+        }
+
+
+@dataclass
+class Subscription:
+    """Subscribes to one entity (`guid`) or an entity type (`entity`).
+
+    A type subscription can be narrowed with `where`, a dict of field values
+    that the entity must have, eg `{"owner": 42}`.
+    """
+
+    id: str
+    guid: Optional[str] = None
+    entity: Optional[str] = None
+    where: Optional[dict[str, Any]] = None
+
+    @classmethod
+    def from_json(cls, message: dict[str, Any]) -> Subscription:
+        subscription = cls(
+            id=str(message["id"]),
+            guid=message.get("guid"),
+            entity=message.get("entity"),
+            where=message.get("where") or None,
+        )
+        if (subscription.guid is None) == (subscription.entity is None):
+            raise ValueError("Subscribe to exactly one of `guid` or `entity`")
+        return subscription
+
+    def matches(self, event: ChangeEvent) -> bool:
+        if self.guid is not None:
+            return self.guid == event.guid
+        if self.entity != event.entity:
+            return False
+        if self.where:
+            data = event.data or {}
+            return all(
+                name in data and data[name] == value
+                for name, value in self.where.items()
+            )
+        return True
+
+
+@dataclass
+class SubscriberStats:
+    delivered: int = 0
+    # events merged into an undelivered event for the same entity
+    coalesced: int = 0
+    # times the queue overflowed and the client was told to resync
+    overflows: int = 0
+
+
+class Subscriber:
+    """One client connection to the change feed.
+
+    Undelivered events are queued per entity and coalesced, so a slow
+    consumer gets the net change rather than every intermediate one, and
+    its queue is bounded by the number of distinct entities changed, not by
+    the write rate. Past `max_pending` entities the queue is dropped and the
+    client is sent a single `resync` event instead.
+
+    Each batch ends with a `cursor` event. A client that reconnects sends
+    the last one back (`{"op": "resume", "after": ...}`) to be sent the
+    events it missed, or a `resync` if they're no longer around.
+    """
+
+    def __init__(
+        self,
+        feed: ChangeFeed,
+        loop: asyncio.AbstractEventLoop,
+        max_pending: int,
+        caller: Any = None,
+    ) -> None:
+        self.feed = feed
+        # who `App.authenticate` let in; events are filtered for them
+        self.caller = caller
+        self.subscriptions: dict[str, Subscription] = {}
+        self.max_pending = max_pending
+        self.stats = SubscriberStats()
+        # guids whose events this connection may be sent, eg deletes
+        self.seen: set[str] = set()
+        self._pending: OrderedDict[str, ChangeEvent] = OrderedDict()
+        self._overflowed = False
+        # the feed position this connection has been offered every event up to
+        self._seq = feed.sequence
+        self._lock = threading.Lock()
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    @property
+    def cursor(self) -> dict[str, Any]:
+        return {"op": "cursor", "cursor": f"{self.feed.epoch}:{self._seq}"}
+
+    def handle(self, message: dict[str, Any]) -> None:
+        match message.get("op"):
+            case "subscribe":
+                subscription = Subscription.from_json(message)
+                self.subscriptions[subscription.id] = subscription
+            case "unsubscribe":
+                self.subscriptions.pop(str(message["id"]), None)
+            case "resume":
+                self.feed.replay(self, message.get("after"))
+            case op:
+                raise ValueError(f"Unknown change feed op {op}")
+
+    def offer(self, event: ChangeEvent) -> None:
+        # called from whichever thread committed the write
+        matched = any(
+            subscription.matches(event)
+            for subscription in list(self.subscriptions.values())
+        )
+        # the cursor moves past the event in the same step that queues it, so
+        # a batch taken in between can't hand out a cursor skipping it
+        with self._lock:
+            self._seq = max(self._seq, event.seq)
+            if not matched:
+                return
+            pending = self._pending.get(event.guid)
+            if pending is not None:
+                self._pending[event.guid] = pending.merge(event)
+                self.stats.coalesced += 1
+            elif self._overflowed:
+                return
+            elif len(self._pending) >= self.max_pending:
+                self._pending.clear()
+                self._overflowed = True
+                self.stats.overflows += 1
+            else:
+                self._pending[event.guid] = event
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def force_resync(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._overflowed = True
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def next_batch(
+        self,
+        timeout: Optional[float] = None,
+        visible: Optional[
+            Callable[[Subscriber, list[ChangeEvent]], Awaitable[list[ChangeEvent]]]
+        ] = None,
+    ) -> list[dict]:
+        """Waits for events and returns all of them; [] on timeout.
+
+        `visible` drops (or trims) the events the caller may not see.
+        """
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._wakeup.clear()
+        with self._lock:
+            events = list(self._pending.values())
+            self._pending.clear()
+            overflowed, self._overflowed = self._overflowed, False
+            cursor = self.cursor
+        if visible is not None and events:
+            events = await visible(self, events)
+        batch = [event.to_json() for event in events]
+        if overflowed:
+            batch.insert(0, {"op": "resync"})
+        self.stats.delivered += len(batch)
+        batch.append(cursor)
+        return batch
+
+
+class ChangeFeed:
+    """Fans committed entity writes out to subscribed clients.
+
+    Events are numbered in the order they're published, and the last
+    `replay_size` are kept so reconnecting clients can catch up. The numbers
+    are only meaningful to this feed, which `epoch` identifies: a client
+    resuming on another worker, or after a restart, is told to resync.
+    """
+
+    def __init__(self, max_pending: int = 1000, replay_size: int = 1000) -> None:
+        self.max_pending = max_pending
+        self.subscribers: set[Subscriber] = set()
+        self.published = 0
+        self.epoch = os.urandom(4).hex()
+        self.sequence = 0
+        self._recent: deque[ChangeEvent] = deque(maxlen=replay_size)
+        self._lock = threading.Lock()
+
+    def connect(self, caller: Any = None) -> Subscriber:
+        with self._lock:
+            subscriber = Subscriber(
+                self, asyncio.get_running_loop(), self.max_pending, caller
+            )
+            self.subscribers.add(subscriber)
+        return subscriber
+
+    def replay(self, subscriber: Subscriber, after: Optional[str]) -> None:
+        """Offers `subscriber` the kept events published after cursor `after`."""
+        epoch, _, seq = str(after).partition(":")
+        with self._lock:
+            oldest = self._recent[0].seq if self._recent else self.sequence + 1
+            if epoch != self.epoch or not seq.isdigit() or int(seq) < oldest - 1:
+                subscriber.force_resync()
+                return
+            for event in self._recent:
+                if event.seq > int(seq):
+                    subscriber.offer(event)
+
+    def disconnect(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def publish(self, event: ChangeEvent) -> None:
+        # offered under the lock, so every subscriber sees events in order
+        with self._lock:
+            self.published += 1
+            self.sequence += 1
+            event = replace(event, seq=self.sequence)
+            self._recent.append(event)
+            for subscriber in self.subscribers:
+                subscriber.offer(event)
+
+    def metrics(self) -> dict[str, Any]:
+        with self._lock:
+            subscribers = list(self.subscribers)
+        return {
+            "published": self.published,
+            "subscribers": len(subscribers),
+            "subscriptions": sum(len(s.subscriptions) for s in subscribers),
+            "coalesced": sum(s.stats.coalesced for s in subscribers),
+            "overflows": sum(s.stats.overflows for s in subscribers),
+        }
+
+
+def encode_batch(batch: list[dict]) -> str:
+    return json.dumps(batch, default=str)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from typing import Any
+
+from fastapi.routing import APIRoute
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+
+
+def _match_order(route: APIRoute) -> list[bool]:
+    # static segments before parameters, so `/User/rpc` isn't read as an id
+    return [segment.startswith("{") for segment in route.path.split("/")[2:]]
+
+
+class RouteTable(BaseRoute):
+    """Every entity route of an app, in one flat table.
+
+    Routes have full paths with parameterized segments (eg
+    `/User/{id}/rpc`) and are grouped by their first segment, ie, the
+    entity type. Matching a request is a dict lookup plus a scan of that
+    type's few routes, however many entity types or live instances there
+    are. It's added to the app's router as a single route.
+    """
+
+    def __init__(self) -> None:
+        self.by_segment: dict[str, list[APIRoute]] = {}
+
+    @property
+    def routes(self) -> list[APIRoute]:
+        return [route for routes in self.by_segment.values() for route in routes]
+
+    def add(self, route: APIRoute) -> None:
+        segment = route.path.strip("/").split("/", 1)[0]
+        routes = self.by_segment.setdefault(segment, [])
+        routes.append(route)
+        routes.sort(key=_match_order)
+
+    def matches(self, scope: Scope) -> tuple[Match, Scope]:
+        if scope["type"] != "http":
+            return Match.NONE, {}
+        segment = scope["path"].lstrip("/").split("/", 1)[0]
+        partial = None
+        for route in self.by_segment.get(segment, ()):
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return match, {**child_scope, "sop_route": route}
+            if match == Match.PARTIAL and partial is None:
+                # eg right path, wrong method: a 405 unless something else fits
+                partial = {**child_scope, "sop_route": route}
+        if partial is not None:
+            return Match.PARTIAL, partial
+        return Match.NONE, {}
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await scope["sop_route"].handle(scope, receive, send)
+
+    def url_path_for(self, name: str, **path_params: Any):
+        for route in self.routes:
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                continue
+        raise NoMatchFound(name, path_params)
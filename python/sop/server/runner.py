@@ -0,0 +1,278 @@
+"""Serves a server app from several worker processes, eg one per core.
+
+    python -m python.sop.server.runner myservice.entities:app --workers 4
+
+The supervisor binds the listening socket and starts the workers, which
+all accept on it. Each worker imports the app itself, so its database
+pool is opened in the worker at startup, never shared between processes.
+Workers tell each other about change feed events and response cache
+invalidations over an `IPCHub` the supervisor runs.
+
+Signals to the supervisor:
+- SIGHUP reloads: workers are replaced one at a time. A new worker is
+  started and, once it's ready, an old one is stopped, ie, it finishes its
+  in-flight requests (for up to `graceful_timeout` seconds). New workers
+  import the app again, so they run the current code.
+- SIGTERM and SIGINT stop every worker, gracefully.
+Workers that exit on their own are restarted, after a delay that doubles
+with each exit in a row (up to `max_restart_delay`). After `max_restarts`
+exits in a row the supervisor gives up and stops. A worker that served for
+`stable_after` seconds resets the count.
+
+A worker is ready once uvicorn serves its socket and the app reports
+`ready`, ie, its startup handlers finalized it and bound its database.
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+import importlib
+import itertools
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Any, Optional
+
+try:
+    import uvicorn
+except ImportError:
+    uvicorn = None
+
+from python.sop.server.bus import IPCBus, IPCHub
+
+
+def load_app(target: str) -> Any:
+    """Imports `<module>:<app>`; the app defaults to `app`."""
+    module_name, _, app_name = target.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, app_name or "app")
+
+
+if uvicorn is not None:
+
+    class _WorkerServer(uvicorn.Server):
+        # tells the supervisor once the app is set up and its socket served
+        def __init__(self, config: uvicorn.Config, app: Any, ready) -> None:
+            super().__init__(config)
+            self.sop_app = app
+            self.ready = ready
+
+        async def startup(self, sockets=None) -> None:
+            await super().startup(sockets=sockets)
+            # a failed startup handler leaves `started` unset
+            if self.started and not self.should_exit and self.sop_app.ready:
+                self.ready.set()
+
+
+def _serve(
+    target: str, sock: socket.socket, bus: IPCBus, ready, options: dict[str, Any]
+) -> None:
+    # a worker process
+    app = load_app(target)
+    app.use_bus(bus)
+    config = uvicorn.Config(app._fastapi, **options)
+    _WorkerServer(config, app, ready).run(sockets=[sock])
+
+
+@dataclass
+class Worker:
+    id: int
+    process: Any
+    # set once the worker can serve
+    ready: Any
+    started_at: float = field(default_factory=time.monotonic)
+
+
+class Runner:
+    """Supervises the worker processes of one server app. See the module doc."""
+
+    def __init__(
+        self,
+        target: str,
+        workers: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 8000,
+        backlog: int = 2048,
+        graceful_timeout: float = 30.0,
+        startup_timeout: float = 60.0,
+        restart_delay: float = 0.5,
+        max_restart_delay: float = 30.0,
+        max_restarts: Optional[int] = 10,
+        stable_after: float = 30.0,
+        **options,
+    ) -> None:
+        if uvicorn is None:
+            raise ImportError("the runner needs uvicorn: install sop[serve]")
+        self.target = target
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        # None to restart forever
+        self.max_restarts = max_restarts
+        self.stable_after = stable_after
+        # workers that exited in a row, without one serving `stable_after`
+        self.exits = 0
+        # passed to `uvicorn.Config` in each worker, eg `log_level`
+        self.options = options
+        # workers import the app from scratch rather than inherit the
+        # supervisor's state
+        self.context = multiprocessing.get_context("spawn")
+        self.running: list[Worker] = []
+        self._ids = itertools.count()
+        self._requests: list[str] = []
+        # when the restarts of exited workers are due
+        self._restarts: list[float] = []
+        self._socket: Optional[socket.socket] = None
+        self._hub: Optional[IPCHub] = None
+
+    def start(self) -> None:
+        """Binds the socket and starts the workers; `run` also supervises them."""
+        self._socket = self._bind()
+        self._hub = IPCHub(self.context)
+        self._hub.start()
+        for _ in range(self.workers):
+            self._spawn()
+
+    def run(self) -> None:
+        self.start()
+        signal.signal(signal.SIGHUP, lambda *_: self._requests.append("reload"))
+        signal.signal(signal.SIGTERM, lambda *_: self._requests.append("stop"))
+        signal.signal(signal.SIGINT, lambda *_: self._requests.append("stop"))
+        try:
+            while True:
+                request = self._requests.pop(0) if self._requests else None
+                if request == "stop":
+                    return
+                if request == "reload":
+                    self.reload()
+                self._restart_exited()
+                time.sleep(0.2)
+        finally:
+            self.stop()
+
+    def _bind(self) -> socket.socket:
+        family = socket.AF_INET6 if ":" in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self) -> Worker:
+        worker_id = next(self._ids)
+        ready = self.context.Event()
+        process = self.context.Process(
+            target=_serve,
+            args=(
+                self.target,
+                self._socket,
+                self._hub.connect(worker_id),
+                ready,
+                self.options,
+            ),
+            name=f"sop-worker-{worker_id}",
+        )
+        process.start()
+        worker = Worker(worker_id, process, ready)
+        self.running.append(worker)
+        return worker
+
+    def _wait_ready(self, worker: Worker) -> bool:
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if worker.ready.wait(0.2):
+                return True
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    def _stop_workers(self, workers: list[Worker]) -> None:
+        for worker in workers:
+            # uvicorn stops accepting and finishes in-flight requests
+            worker.process.terminate()
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in workers:
+            worker.process.join(max(deadline - time.monotonic(), 0))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            self._hub.disconnect(worker.id)
+            if worker in self.running:
+                self.running.remove(worker)
+
+    def reload(self) -> bool:
+        """Replaces every worker, one at a time. False if a new one didn't start,
+        in which case the remaining old workers are kept.
+        """
+        for old in list(self.running):
+            new = self._spawn()
+            if not self._wait_ready(new):
+                self._stop_workers([new])
+                return False
+            self._stop_workers([old])
+        return True
+
+    def _restart_exited(self) -> None:
+        now = time.monotonic()
+        for worker in list(self.running):
+            if worker.process.is_alive():
+                continue
+            self.running.remove(worker)
+            self._hub.disconnect(worker.id)
+            if worker.ready.is_set() and now - worker.started_at >= self.stable_after:
+                self.exits = 0
+            self.exits += 1
+            if self.max_restarts is not None and self.exits > self.max_restarts:
+                raise RuntimeError(
+                    f"workers exited {self.exits} times in a row; giving up"
+                )
+            delay = self.restart_delay * 2 ** (self.exits - 1)
+            self._restarts.append(now + min(delay, self.max_restart_delay))
+        due = [at for at in self._restarts if at <= now]
+        for at in due:
+            self._restarts.remove(at)
+            self._spawn()
+
+    def stop(self) -> None:
+        self._stop_workers(list(self.running))
+        if self._hub is not None:
+            self._hub.close()
+        if self._socket is not None:
+            self._socket.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", help="<module>:<app>, the app defaults to `app`")
+    parser.add_argument("--workers", type=int, help="defaults to the cpu count")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--graceful-timeout", type=float, default=30.0)
+    parser.add_argument("--restart-delay", type=float, default=0.5)
+    parser.add_argument(
+        "--max-restarts", type=int, default=10, help="workers exiting in a row"
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    Runner(
+        args.target,
+        workers=args.workers,
+        host=args.host,
+        port=args.port,
+        graceful_timeout=args.graceful_timeout,
+        restart_delay=args.restart_delay,
+        max_restarts=args.max_restarts,
+        log_level=args.log_level,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from pony.orm import Json, Required
+
+# columns every entity table gets, left out of its fields
+VERSION_FIELDS = frozenset({"_version", "_field_versions"})
+
+
+def add_version_columns(cls: type) -> None:
+    """Declares the version columns on an entity type about to be mapped.
+
+    Every write bumps the row's `_version` and stores, in `_field_versions`,
+    the version each field it wrote changed at. So a client that last
+    synced at version `v` can be sent only the fields changed after `v`, and
+    a client writing a field someone else changed after `v` can be told
+    about the conflict. Versions live in the row and are written in the same
+    transaction as the fields, so every worker sees them and they survive
+    restarts.
+    """
+    cls._version = Required(int, default=0)
+    cls._field_versions = Required(Json, default={})
+
+
+def row_version(entity: Any) -> int:
+    return entity._version
+
+
+def changed_since(entity: Any, version: int) -> set[str]:
+    return {
+        name
+        for name, changed_at in entity._field_versions.items()
+        if changed_at > version
+    }
+
+
+def record_write(entity: Any, fields: Iterable[str]) -> int:
+    """Records a write of `fields`, in its session; returns the new version."""
+    new_version = entity._version + 1
+    # a new dict, so the orm sees the column changed
+    entity._field_versions = {
+        **entity._field_versions,
+        **dict.fromkeys(fields, new_version),
+    }
+    entity._version = new_version
+    return new_version
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Mapping, Optional
+
+from fastapi.responses import Response
+
+from python.sop.utils.codecs import Codec, json_codec, negotiate
+
+# the codec negotiated for the current request's response
+_codec: ContextVar[Codec] = ContextVar("sop_response_codec", default=json_codec)
+
+
+@contextmanager
+def wire_scope(accept: Optional[str]) -> Iterator[Codec]:
+    """Negotiates the response codec for the current request."""
+    token = _codec.set(negotiate(accept))
+    try:
+        yield _codec.get()
+    finally:
+        _codec.reset(token)
+
+
+def response_codec() -> Codec:
+    return _codec.get()
+
+
+class NegotiatedResponse(Response):
+    """Response rendered with the codec the request's `Accept` asked for.
+
+    Returned as is, it also skips fastapi's `jsonable_encoder`, so datetimes
+    and UUIDs reach binary codecs as native values instead of strings.
+    """
+
+    def __init__(
+        self,
+        content: Any,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        codec: Optional[Codec] = None,
+    ) -> None:
+        self.codec = codec or _codec.get()
+        super().__init__(
+            content,
+            status_code=status_code,
+            headers={"Vary": "Accept", **(headers or {})},
+            media_type=self.codec.media_type,
+        )
+
+    def render(self, content: Any) -> bytes:
+        return self.codec.encode(content)
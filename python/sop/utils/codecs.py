@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+from abc import abstractmethod
+import base64
+import calendar
+from datetime import date, datetime, timezone
+import json
+import struct
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec:
+    """Encodes payloads to and decodes them from one wire format.
+
+    Streams (eg `stream_all`) are a sequence of payloads, sent as
+    `stream_media_type` and read back with a `StreamDecoder`.
+    """
+
+    media_type: str
+    stream_media_type: str
+
+    @abstractmethod
+    def encode(self, data: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, body: bytes) -> Any:
+        pass
+
+    @abstractmethod
+    def encode_item(self, data: Any) -> bytes:
+        """Encodes one payload of a stream."""
+        pass
+
+    @abstractmethod
+    def stream_decoder(self) -> StreamDecoder:
+        pass
+
+
+class StreamDecoder:
+    """Decodes a stream's payloads from its body, as the chunks arrive."""
+
+    @abstractmethod
+    def feed(self, chunk: bytes) -> Iterator[Any]:
+        """Yields the payloads completed by `chunk`."""
+        pass
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "dict"):
+        # pydantic models
+        return value.dict()
+    # rather than sending eg a repr the client can't parse back
+    raise TypeError(f"Can't encode {type(value).__name__} as JSON")
+
+
+class JSONCodec(Codec):
+    media_type = "application/json"
+    # one payload per line
+    stream_media_type = "application/x-ndjson"
+
+    def encode(self, data: Any) -> bytes:
+        return json.dumps(data, default=_json_default, separators=(",", ":")).encode()
+
+    def decode(self, body: bytes) -> Any:
+        return json.loads(body)
+
+    def encode_item(self, data: Any) -> bytes:
+        return self.encode(data) + b"\n"
+
+    def stream_decoder(self) -> StreamDecoder:
+        return _LineDecoder()
+
+
+class _LineDecoder(StreamDecoder):
+    def __init__(self) -> None:
+        self._buffer = b""
+
+    def feed(self, chunk: bytes) -> Iterator[Any]:
+        *lines, self._buffer = (self._buffer + chunk).split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+class MsgpackCodec(Codec):
+    """msgpack, with datetimes, dates and UUIDs as native extension types.
+
+    Decoded payloads hold `datetime`/`date`/`UUID` objects rather than
+    strings, and the parsers take them as they are.
+    """
+
+    media_type = "application/msgpack"
+    # payloads back to back; each is self-delimiting
+    stream_media_type = "application/msgpack-seq"
+
+    # ext type codes; aware datetimes use msgpack's own timestamp type (-1)
+    NAIVE_DATETIME = 1
+    DATE = 2
+    UUID = 3
+
+    _seconds_micros = struct.Struct(">qI")
+
+    def encode(self, data: Any) -> bytes:
+        return msgpack.packb(
+            data, default=self._default, use_bin_type=True, datetime=True
+        )
+
+    def decode(self, body: bytes) -> Any:
+        return msgpack.unpackb(body, **self._unpack_options)
+
+    def encode_item(self, data: Any) -> bytes:
+        return self.encode(data)
+
+    def stream_decoder(self) -> StreamDecoder:
+        return _MsgpackDecoder(msgpack.Unpacker(**self._unpack_options))
+
+    @property
+    def _unpack_options(self) -> dict[str, Any]:
+        return dict(
+            ext_hook=self._ext_hook,
+            raw=False,
+            strict_map_key=False,
+            timestamp=3,  # as aware datetimes
+        )
+
+    def _default(self, value: Any) -> Any:
+        if isinstance(value, datetime):
+            # aware datetimes never get here (`datetime=True`)
+            seconds = calendar.timegm(value.timetuple())
+            return msgpack.ExtType(
+                self.NAIVE_DATETIME,
+                self._seconds_micros.pack(seconds, value.microsecond),
+            )
+        if isinstance(value, date):
+            return msgpack.ExtType(self.DATE, struct.pack(">I", value.toordinal()))
+        if isinstance(value, UUID):
+            return msgpack.ExtType(self.UUID, value.bytes)
+        if isinstance(value, (set, frozenset, tuple)):
+            return list(value)
+        if hasattr(value, "dict"):
+            return value.dict()
+        raise TypeError(f"Can't encode {type(value).__name__} as msgpack")
+
+    def _ext_hook(self, code: int, data: bytes) -> Any:
+        if code == self.NAIVE_DATETIME:
+            seconds, micros = self._seconds_micros.unpack(data)
+            moment = datetime.fromtimestamp(seconds, timezone.utc)
+            return moment.replace(tzinfo=None, microsecond=micros)
+        if code == self.DATE:
+            return date.fromordinal(struct.unpack(">I", data)[0])
+        if code == self.UUID:
+            return UUID(bytes=data)
+        return msgpack.ExtType(code, data)
+
+
+class _MsgpackDecoder(StreamDecoder):
+    def __init__(self, unpacker) -> None:
+        self._unpacker = unpacker
+
+    def feed(self, chunk: bytes) -> Iterator[Any]:
+        self._unpacker.feed(chunk)
+        yield from self._unpacker
+
+
+json_codec = JSONCodec()
+msgpack_codec = MsgpackCodec() if msgpack is not None else None
+
+# available codecs by media type
+CODECS: dict[str, Codec] = {
+    codec.media_type: codec for codec in (json_codec, msgpack_codec) if codec
+}
+
+
+# by the media type of their streams
+STREAM_CODECS: dict[str, Codec] = {
+    codec.stream_media_type: codec for codec in CODECS.values()
+}
+
+
+def negotiate(accept: Optional[str]) -> Codec:
+    """Picks the codec for an `Accept` header; JSON unless asked otherwise."""
+    if not accept:
+        return json_codec
+    best, best_q = json_codec, -1.0
+    for part in accept.split(","):
+        media_type, *params = (piece.strip() for piece in part.split(";"))
+        codec = CODECS.get(media_type)
+        if codec is None:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if q > best_q:
+            best, best_q = codec, q
+    return best
+
+
+def accept_header(wire_format: str) -> str:
+    """`Accept` header preferring `wire_format`, with JSON as the fallback."""
+    codec = CODECS.get(f"application/{wire_format}")
+    if codec is None or codec is json_codec:
+        return json_codec.media_type
+    return f"{codec.media_type}, {json_codec.media_type};q=0.5"
+
+
+def stream_decoder(response) -> StreamDecoder:
+    """The decoder for a streamed response, by its Content-Type."""
+    content_type = response.headers.get("content-type", "")
+    codec = STREAM_CODECS.get(content_type.split(";")[0].strip(), json_codec)
+    return codec.stream_decoder()
+
+
+def decode_response(response) -> Any:
+    """Decodes a requests/httpx response body by its Content-Type."""
+    content_type = response.headers.get("content-type", "")
+    codec = CODECS.get(content_type.split(";")[0].strip())
+    if codec is None or codec is json_codec:
+        return response.json()
+    return codec.decode(response.content)
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import threading
+import time
+from typing import Any, Callable, ContextManager, Iterator, Optional
+import uuid
+
+# sent by the client and echoed by the server, so both sides' spans of one
+# call share a trace id
+TRACE_HEADER = "X-SOP-Trace-Id"
+
+_trace_id: ContextVar[Optional[str]] = ContextVar("sop_trace_id", default=None)
+
+# what `span` returns while disabled: shared, so a disabled span costs one
+# attribute check and no allocation
+_DISABLED = nullcontext()
+
+# histogram bucket bounds, in seconds
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+@dataclass
+class Span:
+    # what was timed, eg "client.request" or "acl.predicate"
+    name: str
+    # splits the span's metrics, so keep it low-cardinality (eg a route
+    # template or entity type, never an id)
+    label: Optional[str]
+    trace_id: str
+    attrs: dict[str, Any]
+    started: float = 0.0
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+
+@dataclass
+class SpanMetrics:
+    count: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+    buckets: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+
+
+class Metrics:
+    """Counts and latency histograms of finished spans, by name and label."""
+
+    def __init__(self) -> None:
+        self.spans: dict[tuple[str, Optional[str]], SpanMetrics] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: Span) -> None:
+        key = (span.name, span.label)
+        with self._lock:
+            metrics = self.spans.get(key)
+            if metrics is None:
+                metrics = self.spans[key] = SpanMetrics()
+            metrics.count += 1
+            metrics.seconds += span.seconds
+            if span.error is not None:
+                metrics.errors += 1
+            for i, bound in enumerate(BUCKETS):
+                if span.seconds <= bound:
+                    metrics.buckets[i] += 1
+                    break
+
+    def clear(self) -> None:
+        with self._lock:
+            self.spans.clear()
+
+    def prometheus(self) -> str:
+        """The metrics in Prometheus' text exposition format."""
+        with self._lock:
+            spans = dict(sorted(self.spans.items(), key=_metric_order))
+        lines = [
+            "# HELP sop_span_seconds Time spent in instrumented SOP code.",
+            "# TYPE sop_span_seconds histogram",
+        ]
+        for (name, label), metrics in spans.items():
+            labels = _labels(name, label)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, metrics.buckets):
+                cumulative += count
+                lines.append(
+                    f'sop_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines += [
+                f'sop_span_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}',
+                f"sop_span_seconds_sum{{{labels}}} {metrics.seconds}",
+                f"sop_span_seconds_count{{{labels}}} {metrics.count}",
+            ]
+        lines += [
+            "# HELP sop_span_errors_total Instrumented SOP calls that raised.",
+            "# TYPE sop_span_errors_total counter",
+        ]
+        for (name, label), metrics in spans.items():
+            lines.append(
+                f"sop_span_errors_total{{{_labels(name, label)}}} {metrics.errors}"
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _metric_order(item: tuple) -> tuple[str, str]:
+    (name, label), _ = item
+    return name, label or ""
+
+
+def _labels(name: str, label: Optional[str]) -> str:
+    labels = f'span="{_escape(name)}"'
+    if label is not None:
+        labels += f',label="{_escape(label)}"'
+    return labels
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _ActiveSpan:
+    __slots__ = ("instrumentation", "span", "token")
+
+    def __init__(self, instrumentation: Instrumentation, span: Span) -> None:
+        self.instrumentation = instrumentation
+        self.span = span
+        self.token = None
+
+    def __enter__(self) -> Span:
+        if _trace_id.get() != self.span.trace_id:
+            self.token = _trace_id.set(self.span.trace_id)
+        self.span.started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        span = self.span
+        span.seconds = time.perf_counter() - span.started
+        if exc_type is not None:
+            span.error = exc_type.__name__
+        if self.token is not None:
+            _trace_id.reset(self.token)
+        self.instrumentation._finish(span)
+
+
+class Instrumentation:
+    """Timing spans around SOP's hot paths, off until `enable`d.
+
+    Spans are nested by trace id rather than by parent: every span opened
+    while a trace is current (eg during one client call, or one server
+    request) carries its id. Finished spans are counted in `metrics` and
+    handed to each listener, eg to forward them to a tracing backend.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.metrics = Metrics()
+        self.listeners: list[Callable[[Span], None]] = []
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def add_listener(self, listener: Callable[[Span], None]) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Span], None]) -> None:
+        self.listeners.remove(listener)
+
+    def span(
+        self,
+        name: str,
+        label: Optional[str] = None,
+        trace_id: Optional[str] = None,
+        **attrs,
+    ) -> ContextManager[Optional[Span]]:
+        """Times the block, in the current trace or else a new one.
+
+        `trace_id` (eg one a client sent) takes precedence over the current.
+        """
+        if not self.enabled:
+            return _DISABLED
+        trace_id = trace_id or _trace_id.get() or uuid.uuid4().hex
+        return _ActiveSpan(self, Span(name, label, trace_id, attrs))
+
+    def trace_headers(self) -> dict[str, str]:
+        """Headers that carry the current trace id to the server, if any."""
+        trace_id = _trace_id.get() if self.enabled else None
+        return {TRACE_HEADER: trace_id} if trace_id is not None else {}
+
+    @staticmethod
+    def current_trace_id() -> Optional[str]:
+        return _trace_id.get()
+
+    def _finish(self, span: Span) -> None:
+        self.metrics.observe(span)
+        for listener in self.listeners:
+            listener(span)
+
+    @contextmanager
+    def recording(self) -> Iterator[list[Span]]:
+        """Enables instrumentation and collects the spans finished until exit."""
+        spans: list[Span] = []
+        was_enabled = self.enabled
+        self.enable()
+        self.add_listener(spans.append)
+        try:
+            yield spans
+        finally:
+            self.remove_listener(spans.append)
+            self.enabled = was_enabled
+
+
+# shared by the client and server in a process, since a trace crosses both
+instrumentation = Instrumentation()
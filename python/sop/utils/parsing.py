@@ -1,8 +1,14 @@
 from __future__ import annotations
 
 from abc import abstractmethod
-import dataclasses
-from typing import Any, Generic, Type, TypeVar
+import base64
+from datetime import date, datetime
+from functools import cached_property
+import inspect
+import types
+import typing
+from typing import Any, Generic, Optional, Type, TypeVar, Union
+from uuid import UUID
 from pydantic import BaseModel
 
 S = TypeVar("S")
@@ -32,55 +38,137 @@ ParsableType = (
 )
 
 
+class ParseError(ValueError):
+    pass
+
+
 class JSONParser(Generic[T], AbstractParser[JSON, T]):
-    S = JSON
+    """Parses decoded JSON into `T`.
 
-    __parsers = []
-    __parsers_by_type = {}
+    Use `JSONParser.for_type(T)` to get a parser compiled for a full type
+    annotation (eg `list[User]`, `dict[str, Resource]`, `Optional[int]`).
+    Compiled parsers are cached per annotation and go straight to the right
+    sub-parser for every element. A plain `JSONParser()` parses untyped
+    (`Any`) data by trying the registered parsers in priority order.
+    """
 
-    def __init__(self, T: Type[T]) -> None:
-        if T is not self.T:
-            raise ValueError(f"Cannot build parser for {T} with {self.__class__}")
-        self.__parsers.append(self)
-        self.__parsers_by_type[self.T] = self
+    S = JSON
+    T = Any
+    # parsers with a priority take part in untyped parsing, highest first
+    priority: Optional[int] = None
+
+    __parsers: list[JSONParser] = []
+    __parsers_by_type: dict[Any, JSONParser] = {}
+
+    def __init__(self) -> None:
+        if type(self) is not JSONParser:
+            self.__parsers_by_type.setdefault(self.T, self)
+            if self.priority is not None:
+                self.__parsers.append(self)
+                # stable, so equal priorities keep registration order
+                self.__parsers.sort(key=lambda parser: -parser.priority)
         super().__init__()
 
+    def accepts(self, data: JSON) -> bool:
+        """Cheap check of whether `data` has the JSON shape this parser reads."""
+        return True
+
     def parse(self, data: JSON) -> T:
-        # TODO: modify this to first attempt the most specific parser, then the least specific (lower priority)
         for parser in self.__parsers:
+            if not parser.accepts(data):
+                continue
             try:
                 return parser.parse(data)
-            except:
+            except Exception:
                 continue
-        raise Exception(f"Could not parse {data} to {self.__class__.__name__}")
+        raise ParseError(f"Could not parse {data} to {self.__class__.__name__}")
 
     @classmethod
     def for_type(cls, T: Type[T]) -> JSONParser[T]:
-        if T in cls.__parsers_by_type:
-            return cls.__parsers_by_type[T]
-        else:
-            for ParserImplementation in cls.__subclasses__():
-                if ParserImplementation.T == T:
-                    return ParserImplementation(T)
-
+        parser = cls.__parsers_by_type.get(T)
+        if parser is None:
+            parser = cls._compile(T)
+        return parser
 
-json_parser = JSONParser()
+    @classmethod
+    def _compile(cls, T: Any) -> JSONParser:
+        if T in (Any, object, inspect.Parameter.empty) or isinstance(
+            T, (str, typing.ForwardRef, TypeVar)
+        ):
+            # untyped, or a forward ref we can't resolve from here
+            return json_parser
+        origin, type_args = typing.get_origin(T), typing.get_args(T)
+        if origin is typing.Annotated:
+            return cls.for_type(type_args[0])
+        if origin in (Union, types.UnionType):
+            options = [arg for arg in type_args if arg is not type(None)]
+            inner = (
+                cls.for_type(options[0])
+                if len(options) == 1
+                else UnionParser(T, [cls.for_type(option) for option in options])
+            )
+            if len(options) < len(type_args):
+                return OptionalParser(T, inner)
+            return inner
+        if origin in (list, set, frozenset) or (
+            origin is tuple and len(type_args) == 2 and type_args[1] is Ellipsis
+        ):
+            item_type = type_args[0] if type_args else Any
+            return ListParser(T, cls.for_type(item_type), container=origin)
+        if origin is dict:
+            value_type = type_args[1] if len(type_args) == 2 else Any
+            return MapParser(T, cls.for_type(value_type))
+        if origin is not None:
+            # Literal, heterogeneous tuples, etc
+            return json_parser
+        if T in (list, tuple, set, frozenset):
+            return ListParser(T, json_parser, container=T)
+        if T is dict:
+            return MapParser(T, json_parser)
+        if inspect.isclass(T):
+            # classes that build their own parser (eg entities, lazily)
+            if hasattr(T, "_json_parser"):
+                return T._json_parser()
+            return ClassParser(T)
+        return json_parser
 
 
 class NoneParser(JSONParser[None]):
     T = None
+    priority = 100
+
+    def accepts(self, data: JSON) -> bool:
+        return data is None
 
     def parse(self, data: JSON) -> None:
         if data is not None:
-            raise Exception(f"Could not parse {data} to None")
+            raise ParseError(f"Could not parse {data} to None")
         return None
 
 
 none_parser = NoneParser()
 
 
+class BoolParser(JSONParser[bool]):
+    T = bool
+    priority = 90
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, bool)
+
+    def parse(self, data: JSON) -> bool:
+        return bool(data)
+
+
+bool_parser = BoolParser()
+
+
 class IntParser(JSONParser[int]):
     T = int
+    priority = 80
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, int) and not isinstance(data, bool)
 
     def parse(self, data: JSON) -> int:
         return int(data)
@@ -91,6 +179,10 @@ int_parser = IntParser()
 
 class FloatParser(JSONParser[float]):
     T = float
+    priority = 70
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (int, float)) and not isinstance(data, bool)
 
     def parse(self, data: JSON) -> float:
         return float(data)
@@ -99,18 +191,12 @@ class FloatParser(JSONParser[float]):
 float_parser = FloatParser()
 
 
-class BoolParser(JSONParser[bool]):
-    T = bool
-
-    def parse(self, data: JSON) -> bool:
-        return bool(data)
-
-
-bool_parser = BoolParser()
-
-
 class StrParser(JSONParser[str]):
     T = str
+    priority = 60
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, str)
 
     def parse(self, data: JSON) -> str:
         return str(data)
@@ -119,33 +205,197 @@ class StrParser(JSONParser[str]):
 str_parser = StrParser()
 
 
+class DateTimeParser(JSONParser[datetime]):
+    T = datetime
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (str, datetime))
+
+    def parse(self, data: JSON) -> datetime:
+        if isinstance(data, datetime):
+            return data
+        return datetime.fromisoformat(data)
+
+
+datetime_parser = DateTimeParser()
+
+
+class DateParser(JSONParser[date]):
+    T = date
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (str, date))
+
+    def parse(self, data: JSON) -> date:
+        if isinstance(data, date):
+            return data
+        return date.fromisoformat(data)
+
+
+date_parser = DateParser()
+
+
+class UUIDParser(JSONParser[UUID]):
+    T = UUID
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (str, UUID))
+
+    def parse(self, data: JSON) -> UUID:
+        # binary codecs already decode to UUIDs
+        if isinstance(data, UUID):
+            return data
+        return UUID(data)
+
+
+uuid_parser = UUIDParser()
+
+
+class BytesParser(JSONParser[bytes]):
+    T = bytes
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (str, bytes))
+
+    def parse(self, data: JSON) -> bytes:
+        if isinstance(data, bytes):
+            return data
+        # json carries bytes as base64
+        return base64.b64decode(data)
+
+
+bytes_parser = BytesParser()
+
+
 class ListParser(JSONParser[list]):
     T = list[JSON]
 
-    def parse(self, data: JSON) -> list:
-        if not isinstance(data, list):
-            raise Exception(f"Could not parse {data} to list")
-        return [JSONParser.parse(item) for item in data]
+    def __init__(
+        self,
+        T: Any = None,
+        item_parser: Optional[JSONParser] = None,
+        container: type = list,
+    ) -> None:
+        if T is not None:
+            self.T = T
+        else:
+            # the untyped list parser takes part in untyped parsing
+            self.priority = 20
+        self.item_parser = item_parser or json_parser
+        self.container = container or list
+        super().__init__()
 
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, list)
 
-list_parser = ListParser()
+    def parse(self, data: JSON) -> list:
+        if not isinstance(data, (list, tuple)):
+            raise ParseError(f"Could not parse {data} to list")
+        parse_item = self.item_parser.parse
+        items = [parse_item(item) for item in data]
+        return items if self.container is list else self.container(items)
 
 
 class MapParser(JSONParser[dict[str, JSON]]):
     T = dict[str, JSON]
 
+    def __init__(self, T: Any = None, value_parser: Optional[JSONParser] = None):
+        if T is not None:
+            self.T = T
+        else:
+            self.priority = 10
+        self.value_parser = value_parser or json_parser
+        super().__init__()
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, dict)
+
     def parse(self, data: JSON) -> dict:
         if not isinstance(data, dict):
-            raise Exception(f"Could not parse {data} to dict")
-        return {str(key): JSONParser.parse(value) for key, value in data.items()}
+            raise ParseError(f"Could not parse {data} to dict")
+        parse_value = self.value_parser.parse
+        return {str(key): parse_value(value) for key, value in data.items()}
 
 
-map_parser = MapParser()
+class OptionalParser(JSONParser[Optional[T]]):
+    def __init__(self, T: Any, inner: JSONParser) -> None:
+        self.T = T
+        self.inner = inner
+        super().__init__()
+
+    def accepts(self, data: JSON) -> bool:
+        return data is None or self.inner.accepts(data)
+
+    def parse(self, data: JSON) -> Optional[T]:
+        if data is None:
+            return None
+        return self.inner.parse(data)
+
+
+class UnionParser(JSONParser[T]):
+    def __init__(self, T: Any, options: list[JSONParser]) -> None:
+        self.T = T
+        self.options = options
+        super().__init__()
+
+    def accepts(self, data: JSON) -> bool:
+        return any(option.accepts(data) for option in self.options)
+
+    def parse(self, data: JSON) -> T:
+        # the JSON shape picks the option; only options that read the same
+        # shape (eg two models) have to be tried one after the other
+        for option in self.options:
+            if not option.accepts(data):
+                continue
+            try:
+                return option.parse(data)
+            except Exception:
+                continue
+        raise ParseError(f"Could not parse {data} to {self.T}")
 
 
 class ClassParser(Generic[T], JSONParser[T]):
-    T: Type[Any] = attr.ib()
+    """Parses a JSON object into a class (pydantic model, entity, ...).
+
+    Only used for its type, ie, through `for_type`: without a priority it
+    never takes part in untyped parsing, where any object would fit it.
+    """
 
-    def parse(self, data: JSON) -> BaseModel:
-        kwargs = map_parser.parse(data)
+    def __init__(self, T: Type[T]) -> None:
+        self.T = T
+        super().__init__()
+
+    def accepts(self, data: JSON) -> bool:
+        return isinstance(data, (dict, self.T))
+
+    @cached_property
+    def field_parsers(self) -> dict[str, JSONParser]:
+        # compiled on first parse, so self-referencing classes (eg a `User`
+        # with `friends: list[User]`) find this parser already registered
+        try:
+            hints = typing.get_type_hints(self.T)
+        except Exception:
+            hints = getattr(self.T, "__annotations__", {})
+        return {
+            name: JSONParser.for_type(hint)
+            for name, hint in hints.items()
+            if not name.startswith("_")
+            and typing.get_origin(hint) is not typing.ClassVar
+        }
+
+    def parse(self, data: JSON) -> T:
+        if isinstance(data, self.T):
+            return data
+        if not isinstance(data, dict):
+            raise ParseError(f"Could not parse {data} to {self.T.__name__}")
+        parsers = self.field_parsers
+        kwargs = {
+            key: parsers[key].parse(value) if key in parsers else value
+            for key, value in data.items()
+        }
         return self.T(**kwargs)
+
+
+json_parser = JSONParser()
+list_parser = ListParser()
+map_parser = MapParser()
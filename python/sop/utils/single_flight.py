@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import threading
+from typing import Any, Awaitable, Callable, Hashable
+
+
+@dataclass
+class SingleFlightStats:
+    # calls that did the work
+    executions: int = 0
+    # calls that got the result of an identical call already in flight
+    shared: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        calls = self.executions + self.shared
+        return self.shared / calls if calls else 0.0
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs concurrent calls with the same key once, across threads.
+
+    The first caller runs `fn`; callers arriving while it runs wait and get
+    its result, or its exception. Nothing is kept once it's done, so a call
+    starting afterwards runs again: this merges a burst of identical reads,
+    it doesn't cache them.
+    """
+
+    def __init__(self) -> None:
+        self.stats = SingleFlightStats()
+        self._calls: dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats.executions += 1
+            else:
+                self.stats.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """`SingleFlight` for coroutines, merging calls on the same event loop.
+
+    The work runs as its own task, so a caller being cancelled doesn't
+    cancel it for the others.
+    """
+
+    def __init__(self) -> None:
+        self.stats = SingleFlightStats()
+        self._tasks: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # tasks can only be awaited on their own loop
+        key = (id(asyncio.get_running_loop()), key)
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.stats.executions += 1
+        else:
+            self.stats.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
@@ -0,0 +1,43 @@
+"""Reports what an app's entity types cost at import and startup.
+
+    python -m python.sop.utils.startup_profile myservice.entities:app
+
+imports the module, finalizes the app's entity types as its first request
+would, and prints the cost of each, most expensive first.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import time
+
+
+def profile(target: str, limit: int = None) -> str:
+    module_name, _, app_name = target.partition(":")
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter() - started
+    app = getattr(module, app_name or "app")
+    started = time.perf_counter()
+    app.finalize()
+    finalized = time.perf_counter() - started
+    return "\n".join(
+        [
+            f"import {module_name}: {imported * 1000:.2f} ms",
+            f"finalize: {finalized * 1000:.2f} ms",
+            "",
+            app.registry.report(limit),
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", help="<module>:<app>, the app defaults to `app`")
+    parser.add_argument("--limit", type=int, help="only show the N costliest")
+    args = parser.parse_args()
+    print(profile(args.target, args.limit))
+
+
+if __name__ == "__main__":
+    main()
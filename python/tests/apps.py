@@ -0,0 +1,104 @@
+"""Server and client apps wired together in one process.
+
+The client's transports hand requests straight to the server's ASGI app, so
+tests cover the whole request path without a network.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from functools import cached_property
+import socket
+import threading
+import time
+from typing import Iterator
+
+import httpx
+from starlette.testclient import TestClient
+import uvicorn
+
+from python.sop.client.app import App as ClientApp
+from python.sop.client.transport import AsyncTransport, Transport
+from python.sop.server.app import App as ServerApp
+
+
+class InProcessTransport(Transport):
+    def __init__(self, asgi_app) -> None:
+        super().__init__(max_retries=0)
+        self.client = TestClient(asgi_app, base_url="http://sop")
+
+    def request(
+        self,
+        verb,
+        base_url,
+        path,
+        params=None,
+        data=None,
+        headers=None,
+        timeout=None,
+        stream=False,
+    ):
+        return self.client.request(
+            verb, "/" + path.lstrip("/"), params=params, content=data, headers=headers
+        )
+
+
+class InProcessAsyncTransport(AsyncTransport):
+    def __init__(self, asgi_app) -> None:
+        super().__init__()
+        self.asgi_app = asgi_app
+
+    def client_for(self, base_url: str) -> httpx.AsyncClient:
+        clients = self.clients
+        client = clients.get(base_url)
+        if client is None:
+            client = clients[base_url] = httpx.AsyncClient(
+                app=self.asgi_app, base_url=base_url
+            )
+        return client
+
+
+def make_server(**options) -> ServerApp:
+    """A server app on its own in-memory database; `options` override settings."""
+    return type("Server", (ServerApp,), options)()
+
+
+def make_client(server: ServerApp, **options) -> ClientApp:
+    """A client app talking to `server`; `options` override settings."""
+
+    class Client(ClientApp):
+        base_url = "http://sop"
+
+        @cached_property
+        def transport(self) -> Transport:
+            return InProcessTransport(server._fastapi)
+
+        @cached_property
+        def async_transport(self) -> AsyncTransport:
+            return InProcessAsyncTransport(server._fastapi)
+
+    for name, value in options.items():
+        setattr(Client, name, value)
+    return Client()
+
+
+@contextmanager
+def serve(server: ServerApp) -> Iterator[str]:
+    """Serves `server` on a free local port, for what in-process can't carry.
+
+    Yields its base url, eg for feeds, which stream until closed, or for
+    clients' real connection pools.
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    uvicorn_server = uvicorn.Server(
+        uvicorn.Config(server._fastapi, log_level="warning", ws="websockets")
+    )
+    thread = threading.Thread(target=uvicorn_server.run, kwargs={"sockets": [sock]})
+    thread.start()
+    while not uvicorn_server.started:
+        time.sleep(0.01)
+    try:
+        yield "http://127.0.0.1:%d" % sock.getsockname()[1]
+    finally:
+        uvicorn_server.should_exit = True
+        thread.join()
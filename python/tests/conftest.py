@@ -0,0 +1,16 @@
+import pytest
+from starlette.testclient import TestClient
+
+from python.sop.server.app import App as ServerApp
+from tests.apps import make_server
+
+
+@pytest.fixture
+def server() -> ServerApp:
+    return make_server()
+
+
+@pytest.fixture
+def http(server) -> TestClient:
+    # raw requests against `server`, eg to check status codes and headers
+    return TestClient(server._fastapi, base_url="http://sop")
@@ -0,0 +1,10 @@
+"""An app for the runner tests to serve; workers import it by name."""
+from pony.orm import Required
+
+from tests.apps import make_server
+
+app = make_server()
+
+
+class Note(app.Entity):
+    text = Required(str)
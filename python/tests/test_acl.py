@@ -0,0 +1,109 @@
+from fastapi import HTTPException
+import pytest
+from pony.orm import Required
+from starlette.testclient import TestClient
+
+from python.sop.server.acl import current_caller
+from python.sop.server.api import ServerAPI
+from python.sop.server.dispatch import rpc
+from tests.apps import make_server
+
+
+def _authenticate(self, connection):
+    user = connection.headers.get("x-user")
+    if user is None:
+        raise HTTPException(status_code=401, detail="Who are you?")
+    return user
+
+
+@pytest.fixture
+def server():
+    return make_server(authenticate=_authenticate)
+
+
+@pytest.fixture
+def doc(server):
+    class Doc(server.Entity):
+        owner = Required(str)
+        secret = Required(str)
+
+        @rpc
+        def hand_over(self, owner: str) -> dict:
+            # reads the secret, as the owner, before and after the write
+            self.serialize()
+            self.owner = owner
+            return self.serialize()
+
+    server.finalize()
+    return Doc
+
+
+def _as(http: TestClient, user: str) -> TestClient:
+    http.headers["x-user"] = user
+    return http
+
+
+def test_predicates_are_rechecked_after_a_write(http, doc):
+    doc.Meta.api.access_control(
+        "secret", predicate=lambda doc: doc.owner == current_caller()
+    )
+    http = _as(http, "alice")
+    id = http.post("/doc/create", json={"owner": "alice", "secret": "s"}).json()
+    response = http.post(
+        f"/doc/{id}/rpc",
+        params={"method_name": "hand_over"},
+        json={"args": ["bob"], "kwds": {}},
+    )
+    assert response.json()["secret"] is None
+
+
+def test_access_control_without_attrs_restricts_nothing(http, doc):
+    doc.Meta.api.access_control(predicate=lambda doc: False)
+    id = _as(http, "alice").post("/doc/create", json={"owner": "a", "secret": "s"})
+    assert http.get(f"/doc/{id.json()}").json()["secret"] == "s"
+
+
+def test_row_restrictions_hide_rows(http, doc):
+    doc.Meta.api.restrict_rows(
+        lambda doc: doc.owner == current_caller(),
+        filter_by=lambda: {"owner": current_caller()},
+    )
+    http = _as(http, "alice")
+    mine = http.post("/doc/create", json={"owner": "alice", "secret": "s"}).json()
+    with doc.app.data.session():
+        row = doc(owner="bob", secret="s")
+        row.flush()
+        theirs = row.id
+    assert http.get(f"/doc/{mine}").status_code == 200
+    assert http.get(f"/doc/{theirs}").status_code == 404
+
+
+def test_unauthenticated_requests_are_refused(http, doc):
+    assert http.get("/doc/1").status_code == 401
+
+
+def test_acls_can_be_declared_before_finalizing(server, http):
+    class Doc(server.Entity):
+        class Meta(server.Entity.Meta):
+            api = ServerAPI()
+
+        secret = Required(str)
+
+        Meta.api.hidden("secret")
+
+    class Memo(server.Entity):
+        secret = Required(str)
+
+    Memo.Meta.api.hidden("secret")
+    with server.data.session():
+        doc, memo = Doc(secret="s"), Memo(secret="s")
+        doc.flush(), memo.flush()
+    http = _as(http, "alice")
+    assert http.get(f"/doc/{doc.id}").json()["secret"] is None
+    assert http.get(f"/memo/{memo.id}").json()["secret"] is None
+
+
+def test_auth_app_imports():
+    from python.sop.server import auth
+
+    assert "create" in auth.User.Meta._access_restrictions
@@ -0,0 +1,69 @@
+from pony.orm import Required
+
+from tests.apps import make_server
+
+
+def _paths(app) -> set[tuple[str, str]]:
+    routes = set()
+    for route in app._fastapi.routes:
+        for method in getattr(route, "methods", None) or ["WS"]:
+            routes.add((method, getattr(route, "path", None)))
+    return routes
+
+
+def test_app_serves_its_own_routes():
+    app = make_server(instrumented=True)
+    routes = _paths(app)
+    assert ("POST", "/rpc/batch") in routes
+    assert ("WS", "/feed") in routes
+    assert ("GET", "/feed/sse") in routes
+    assert ("GET", "/healthz") in routes
+    assert ("GET", "/readyz") in routes
+    assert ("GET", "/metrics") in routes
+
+
+def test_app_sets_up_middleware_and_lifecycle():
+    app = make_server(compress_min_size=500)
+    middleware = [item.cls.__name__ for item in app._fastapi.user_middleware]
+    assert "GZipMiddleware" in middleware
+    # the request scope middleware
+    assert "BaseHTTPMiddleware" in middleware
+    startup = app._fastapi.router.on_startup
+    assert app.finalize in startup
+    assert app.data.bind in startup
+    assert app.data.disconnect in app._fastapi.router.on_shutdown
+
+
+def test_entity_apis_belong_to_the_app(server, http):
+    class Note(server.Entity):
+        text = Required(str)
+
+    server.finalize()
+    assert server.app is server
+    assert Note.Meta.api.app is server
+    assert Note.Meta.api.parent is server
+    created = http.post("/note/create", json={"text": "hi"})
+    assert created.status_code == 200
+    assert http.get(f"/note/{created.json()}").json()["text"] == "hi"
+
+
+def test_health_endpoints(server, http):
+    assert http.get("/healthz").text == "ok"
+    # not set up until finalized and bound
+    assert http.get("/readyz").status_code == 503
+    server.finalize()
+    server.data.bind()
+    assert http.get("/readyz").text == "ready"
+
+
+def test_apps_do_not_share_routes():
+    first, second = make_server(), make_server()
+
+    class Note(first.Entity):
+        text = Required(str)
+
+    first.finalize()
+    second.finalize()
+    assert first._fastapi is not second._fastapi
+    assert first.route_table.routes
+    assert not second.route_table.routes
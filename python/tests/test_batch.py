@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+from pony.orm import Required
+from starlette.responses import JSONResponse
+
+from python.sop.client.batch import RPCError
+from python.sop.server.dispatch import rpc
+from tests.apps import make_client
+
+
+@pytest.fixture
+def counter(server):
+    class Counter(server.Entity):
+        name = Required(str)
+
+        @rpc.cls
+        def add(cls, a: int, b: int) -> int:
+            return a + b
+
+        @rpc
+        def label(self, suffix: str) -> str:
+            return self.name + suffix
+
+    server.finalize()
+    with server.data.session():
+        return str(Counter._insert({"name": "c"})[0])
+
+
+@pytest.fixture
+def requests(server) -> list[str]:
+    # the paths of the requests the server got
+    paths = []
+
+    @server._fastapi.middleware("http")
+    async def record(request, call_next):
+        paths.append(request.url.path)
+        return await call_next(request)
+
+    return paths
+
+
+def test_batch_sends_one_request(server, counter, requests):
+    client = make_client(server)
+    api = client.sub_api("counter")
+    with client.batch():
+        total = api.rpc("add", [1, 2], {})
+        label = api.sub_api(counter).rpc("label", ["!"], {})
+        missing = api.rpc("nope", [], {})
+    assert requests == ["/rpc/batch"]
+    assert total.result() == 3
+    assert label.result() == "c!"
+    with pytest.raises(RPCError) as error:
+        missing.result()
+    assert error.value.status_code == 404
+
+
+def test_async_rpcs_in_one_tick_are_coalesced(server, counter, requests):
+    client = make_client(server, coalesce_rpcs=True)
+    api = client.sub_api("counter").aio
+
+    async def calls():
+        return await asyncio.gather(*(api.rpc("add", [i, i], {}) for i in range(5)))
+
+    assert asyncio.run(calls()) == [0, 2, 4, 6, 8]
+    assert requests == ["/rpc/batch"]
+
+
+def test_coalesced_rpc_errors_go_to_their_caller(server, counter):
+    client = make_client(server, coalesce_rpcs=True)
+    api = client.sub_api("counter").aio
+
+    async def calls():
+        return await asyncio.gather(
+            api.rpc("add", [1, 1], {}), api.rpc("nope", [], {}), return_exceptions=True
+        )
+
+    total, missing = asyncio.run(calls())
+    assert total == 2
+    assert isinstance(missing, RPCError)
+
+
+def test_async_rpcs_are_sent_alone_by_default(server, counter, requests):
+    client = make_client(server)
+    api = client.sub_api("counter").aio
+    assert asyncio.run(api.rpc("add", [1, 2], {})) == 3
+    assert requests == ["/counter/rpc"]
+
+
+def test_batches_with_missing_results_raise(server, counter):
+    @server._fastapi.middleware("http")
+    async def drop_a_result(request, call_next):
+        # eg a proxy cutting the batch short
+        return JSONResponse([{"result": 3}])
+
+    client = make_client(server)
+    api = client.sub_api("counter")
+    with pytest.raises(RPCError):
+        with client.batch():
+            first = api.rpc("add", [1, 2], {})
+            second = api.rpc("add", [3, 4], {})
+    for call in (first, second):
+        with pytest.raises(RPCError):
+            call.result()
+
+
+def test_calls_of_a_batch_that_raised_are_not_results(server, counter):
+    client = make_client(server)
+    api = client.sub_api("counter")
+    with pytest.raises(KeyError):
+        with client.batch():
+            total = api.rpc("add", [1, 2], {})
+            raise KeyError("oops")
+    with pytest.raises(RuntimeError):
+        total.result()
@@ -0,0 +1,97 @@
+import pytest
+from pony.orm import Optional, Required
+
+from python.sop.server import entity as server_entity
+from tests.apps import make_client
+
+
+@pytest.fixture
+def ServerNote(server):
+    class Note(server.Entity):
+        text = Required(str)
+        tag = Optional(str)
+
+    return Note
+
+
+@pytest.fixture
+def Note(server, ServerNote):
+    client = make_client(server, bulk_max_items=2)
+
+    class Note(client.Entity):
+        text: str
+        tag: str = None
+
+    server.finalize()
+    client.finalize()
+    return Note
+
+
+@pytest.fixture
+def flushes(monkeypatch) -> list[int]:
+    calls = []
+    flush = server_entity.flush
+
+    def counted():
+        calls.append(1)
+        flush()
+
+    monkeypatch.setattr(server_entity, "flush", counted)
+    return calls
+
+
+def test_create_many_reports_each_row(http, Note, flushes):
+    items = [{"text": "a"}, {"text": "b", "color": "red"}, {"tag": "t"}, {"text": "d"}]
+    results = http.post("/note/create_many", json=items).json()
+    assert [result.get("error", {}).get("status_code") for result in results] == [
+        None,
+        422,
+        422,
+        None,
+    ]
+    ids = [results[0]["result"], results[3]["result"]]
+    assert [http.get(f"/note/{id}").json()["text"] for id in ids] == ["a", "d"]
+    # one flush for the whole chunk
+    assert len(flushes) == 1
+
+
+def test_create_many_flushes_once_per_chunk(http, ServerNote, Note, flushes):
+    ServerNote.Meta.bulk_chunk_size = 2
+    results = http.post("/note/create_many", json=[{"text": "x"}] * 5).json()
+    assert len({result["result"] for result in results}) == 5
+    assert len(flushes) == 3
+
+
+def test_clients_send_bulk_requests_in_chunks(Note, server, http):
+    paths = []
+
+    @server._fastapi.middleware("http")
+    async def record(request, call_next):
+        paths.append(request.url.path)
+        return await call_next(request)
+
+    results = Note.create_many([{"text": str(i)} for i in range(5)])
+    assert paths == ["/note/create_many"] * 3
+    assert len(results) == 5
+
+
+def test_update_many_reports_conflicts_and_missing_rows(http, Note):
+    id = Note.create(text="a")
+    note = Note.get_by_id(id)
+    items = [
+        {"id": id, "version": note._version, "changes": {"text": "b"}},
+        {"id": id, "version": note._version, "changes": {"text": "c"}},
+        {"id": 999, "version": None, "changes": {"text": "d"}},
+    ]
+    results = http.post("/note/update_many", json=items).json()
+    assert results[0]["result"]["version"] == note._version + 1
+    assert [result["error"]["status_code"] for result in results[1:]] == [409, 404]
+    assert http.get(f"/note/{id}").json()["text"] == "b"
+
+
+def test_delete_many_reports_missing_rows(http, Note):
+    ids = [Note.create(text=str(i)) for i in range(2)]
+    results = http.post("/note/delete_many", json=[*ids, 999]).json()
+    assert ["result" in result for result in results] == [True, True, False]
+    assert results[2]["error"]["status_code"] == 404
+    assert all(http.get(f"/note/{id}").status_code == 404 for id in ids)
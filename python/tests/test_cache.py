@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pony.orm import Required
+
+from python.sop.server.cache import CachedRead, InMemoryBackend, SharedResponseCache
+from python.sop.server.dispatch import rpc
+from tests.apps import make_server
+
+
+@pytest.fixture(params=["in process", "shared"])
+def server(request):
+    if request.param == "shared":
+        return make_server(response_cache_backend=InMemoryBackend())
+    return make_server()
+
+
+@pytest.fixture
+def note(server, http):
+    class Note(server.Entity):
+        text = Required(str)
+        at = Required(datetime)
+
+        @rpc
+        def read(self) -> str:
+            return self.text
+
+        @rpc
+        def write(self, text: str) -> str:
+            self.text = text
+            return text
+
+        @rpc
+        async def write_later(self, text: str) -> str:
+            await asyncio.sleep(0)
+            self.text = text
+            return self.text
+
+    Note.Meta.response_cache_ttl = 60
+    server.finalize()
+    return http.post("/note/create", json={"text": "a", "at": "2024-01-01T00:00:00"})
+
+
+def _rpc(http, id, method_name, *args):
+    response = http.post(
+        f"/note/{id}/rpc",
+        params={"method_name": method_name},
+        json={"args": list(args), "kwds": {}},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_reads_are_served_from_the_cache(server, http, note):
+    id = note.json()
+    first = http.get(f"/note/{id}")
+    assert http.get(f"/note/{id}").json() == first.json()
+    assert server.response_cache.stats.hits == 1
+    assert first.json()["at"] == "2024-01-01T00:00:00"
+
+
+def test_matching_etags_get_a_304(http, note):
+    id = note.json()
+    etag = http.get(f"/note/{id}").headers["etag"]
+    revalidated = http.get(f"/note/{id}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b""
+    _rpc(http, id, "write", "b")
+    changed = http.get(f"/note/{id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["text"] == "b"
+
+
+def test_rpcs_invalidate_only_after_a_write(server, http, note):
+    id = note.json()
+    http.get(f"/note/{id}")
+    invalidations = server.response_cache.stats.invalidations
+    assert _rpc(http, id, "read") == "a"
+    assert server.response_cache.stats.invalidations == invalidations
+    _rpc(http, id, "write", "b")
+    assert server.response_cache.stats.invalidations > invalidations
+    assert http.get(f"/note/{id}").json()["text"] == "b"
+
+
+def test_async_instance_methods_run_in_the_session(http, note):
+    id = note.json()
+    assert _rpc(http, id, "write_later", "c") == "c"
+    assert http.get(f"/note/{id}").json()["text"] == "c"
+
+
+def test_shared_entries_are_not_pickled():
+    backend = InMemoryBackend()
+    cache = SharedResponseCache(backend)
+    _, token = cache.lookup("Note:1", "all")
+    at = datetime(2024, 1, 1)
+    cache.store("Note:1", "all", CachedRead({"at": at}, 3, 1e12), token)
+    entry, _ = cache.lookup("Note:1", "all")
+    assert (entry.data, entry.version) == ({"at": at}, 3)
+    # eg a pickle someone put in the backend is a miss, not code to run
+    (key,) = backend._values
+    backend.set(key, b"\x80\x04K\x01.")
+    assert cache.lookup("Note:1", "all")[0] is None
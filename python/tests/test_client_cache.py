@@ -0,0 +1,85 @@
+import time
+
+import pytest
+from pony.orm import Required
+
+from python.sop.client.cache import LRUEntityCache
+from tests.apps import make_client
+
+
+@pytest.fixture
+def statuses(server) -> list[tuple[int, bool]]:
+    # the status of each read the server answered, and if it was conditional
+    reads = []
+
+    @server._fastapi.middleware("http")
+    async def record(request, call_next):
+        response = await call_next(request)
+        if request.method == "GET":
+            reads.append((response.status_code, "if-none-match" in request.headers))
+        return response
+
+    return reads
+
+
+def _note(server, **options):
+    class Note(server.Entity):
+        text = Required(str)
+
+    client = make_client(server, **options)
+
+    class Note(client.Entity):
+        text: str
+
+    server.finalize()
+    client.finalize()
+    return Note
+
+
+def test_fresh_entries_are_served_without_a_request(server, statuses):
+    Note = _note(server, cache_ttl=60)
+    note = Note.get_by_id(Note.create(text="a"))
+    assert Note.get_by_id(note.id) is note
+    assert statuses == [(200, False)]
+    assert Note.app.cache_stats.hits == 1
+
+
+def test_expired_entries_are_revalidated(server, statuses):
+    Note = _note(server, cache_ttl=0.01)
+    note = Note.get_by_id(Note.create(text="a"))
+    time.sleep(0.02)
+    assert Note.get_by_id(note.id) is note
+    # unchanged: an empty 304 renews the entry
+    assert statuses == [(200, False), (304, True)]
+    assert Note.app.cache_stats.revalidations == 1
+
+
+def test_changed_entities_are_sent_again(server, http, statuses):
+    Note = _note(server)
+    note = Note.get_by_id(Note.create(text="a"))
+    http.put(f"/note/{note.id}", json={"text": "b"})
+    statuses.clear()
+    assert Note.get_by_id(note.id) is note
+    assert note.text == "b"
+    assert statuses == [(200, True)]
+    assert Note.app.cache_stats.revalidations == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LRUEntityCache(max_size=2)
+    cache.set("a", 1, None, 60)
+    cache.set("b", 2, None, 60)
+    cache.get("a")
+    cache.set("c", 3, None, 60)
+    assert cache.get("b") is None
+    assert [cache.get(guid).value for guid in ("a", "c")] == [1, 3]
+    assert cache.stats.evictions == 1
+
+
+def test_the_app_cache_is_bounded(server):
+    Note = _note(server, cache_max_size=2)
+    ids = [Note.create(text=str(i)) for i in range(3)]
+    for id in ids:
+        Note.get_by_id(id)
+    assert len(Note.app.cache) == 2
+    assert Note.app.cache.get(f"Note:{ids[0]}") is None
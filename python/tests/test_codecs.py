@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from pony.orm import Required
+
+from python.sop.utils.codecs import json_codec, msgpack_codec, stream_decoder
+from tests.apps import make_client
+
+CODECS = [json_codec] + ([msgpack_codec] if msgpack_codec else [])
+
+
+def test_json_refuses_values_it_cant_encode():
+    with pytest.raises(TypeError):
+        json_codec.encode({"value": object()})
+
+
+@pytest.mark.parametrize("codec", CODECS, ids=lambda codec: codec.media_type)
+def test_streams_decode_across_chunk_boundaries(codec):
+    items = [{"id": i, "text": "x" * i} for i in range(20)]
+    body = b"".join(codec.encode_item(item) for item in items)
+    decoder = codec.stream_decoder()
+    decoded = []
+    for start in range(0, len(body), 7):
+        decoded.extend(decoder.feed(body[start : start + 7]))
+    assert decoded == items
+
+
+@pytest.fixture
+def Event(server):
+    class Event(server.Entity):
+        name = Required(str)
+        at = Required(datetime)
+
+    server.finalize()
+    with server.data.session():
+        for i in range(3):
+            Event._insert({"name": f"e{i}", "at": datetime(2024, 1, 1, i)})
+    return Event
+
+
+@pytest.mark.parametrize("codec", CODECS, ids=lambda codec: codec.media_type)
+def test_stream_all_uses_the_negotiated_codec(http, Event, codec):
+    response = http.get("/event/stream", headers={"Accept": codec.media_type})
+    assert response.headers["content-type"] == codec.stream_media_type
+    items = list(stream_decoder(response).feed(response.content))
+    assert [item["name"] for item in items] == ["e0", "e1", "e2"]
+
+
+@pytest.mark.parametrize("wire_format", ["json", "msgpack"])
+def test_clients_read_streams_in_their_wire_format(server, Event, wire_format):
+    client = make_client(server, wire_format=wire_format)
+
+    class Event(client.Entity):
+        name: str
+        at: datetime
+
+    client.finalize()
+
+    async def read():
+        return [event async for event in Event.iter_all_async(stream=True)]
+
+    events = asyncio.run(read())
+    assert [event.at for event in events] == [datetime(2024, 1, 1, i) for i in range(3)]
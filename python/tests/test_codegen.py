@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+import importlib.util
+import re
+import shutil
+import subprocess
+import sys
+from typing import Optional as Maybe
+
+import pytest
+from pony.orm import Optional, Required, Set
+
+from python.sop.server.codegen import describe, generate_python, generate_typescript
+from python.sop.server.dispatch import rpc
+from tests.apps import InProcessAsyncTransport, InProcessTransport
+
+
+@pytest.fixture
+def entities(server):
+    class User(server.Entity):
+        name = Required(str)
+        notes = Set("Note")
+
+    class Note(server.Entity):
+        text = Required(str)
+        at = Optional(datetime)
+        owner = Optional(User)
+
+        @rpc.cls
+        def add(cls, a: int, b: int = 2) -> int:
+            return a + b
+
+        @rpc
+        def rename(self, text: str, *, loud: bool = False) -> str:
+            self.text = text.upper() if loud else text
+            return self.text
+
+        @rpc
+        async def tagged(self, tag: Maybe[str] = None) -> dict[str, int]:
+            return {tag or "none": len(self.text)}
+
+    server.finalize()
+    return describe(server)
+
+
+@pytest.fixture
+def generated(server, entities, tmp_path, monkeypatch):
+    path = tmp_path / "generated_client.py"
+    path.write_text(generate_python(entities, "tests:server"))
+    spec = importlib.util.spec_from_file_location("generated_client", path)
+    module = importlib.util.module_from_spec(spec)
+    # as an import would, so its annotations resolve
+    monkeypatch.setitem(sys.modules, spec.name, module)
+    spec.loader.exec_module(module)
+    module.app.base_url = "http://sop"
+    module.app.transport = InProcessTransport(server._fastapi)
+    module.app.async_transport = InProcessAsyncTransport(server._fastapi)
+    return module
+
+
+def test_python_clients_call_the_server(generated):
+    User, Note = generated.ENTITIES
+    owner = User.create(name="alice")
+    id = Note.create(text="hi", at="2024-01-01T00:00:00", owner=owner)
+    note = Note.get_by_id(id)
+    assert Note.add(1) == 3
+    assert note.rename("hey", loud=True) == "HEY"
+    assert asyncio.run(note.tagged_async("x")) == {"x": 3}
+    assert note.at == datetime(2024, 1, 1)
+    assert note.owner.name == "alice"
+
+
+def _unbalanced(source: str) -> list[str]:
+    """The brackets of `source` that don't pair up, outside strings and comments."""
+    pairs = {")": "(", "]": "[", "}": "{"}
+    stack = []
+    # template literals nest: `${` opens code inside the string again
+    tokens = re.finditer(r'//[^\n]*|"(?:\\.|[^"\\])*"|`|\$\{|[()\[\]{}]', source)
+    for token in (match.group() for match in tokens):
+        if token.startswith(("//", '"')):
+            continue
+        if stack and stack[-1] == "`" and token not in ("`", "${"):
+            continue
+        if token == "`":
+            if stack and stack[-1] == "`":
+                stack.pop()
+            else:
+                stack.append(token)
+        elif token in ("${", "(", "[", "{"):
+            stack.append(token)
+        elif stack and stack[-1] in (pairs[token], "${" if token == "}" else None):
+            stack.pop()
+        else:
+            return [token]
+    return stack
+
+
+def test_typescript_clients_are_well_formed(entities):
+    source = generate_typescript(entities, "tests:server")
+    assert _unbalanced(source) == []
+    for name in ("User", "Note"):
+        assert f"export interface {name} {{" in source
+        assert f"export class {name}Api {{" in source
+    assert "export class Client extends SOPClient {" in source
+    assert "  add(a: number, b?: number): Promise<number> {" in source
+    assert "tagged(id: NoteId, tag?: string | null)" in source
+
+
+@pytest.mark.skipif(shutil.which("tsc") is None, reason="needs the TypeScript compiler")
+def test_typescript_clients_compile(entities, tmp_path):
+    path = tmp_path / "client.ts"
+    path.write_text(generate_typescript(entities, "tests:server"))
+    options = ["--noEmit", "--strict", "--target", "es2022", "--lib", "es2022,dom"]
+    subprocess.run(["tsc", *options, path], check=True)
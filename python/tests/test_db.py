@@ -0,0 +1,72 @@
+import threading
+
+from fastapi import HTTPException
+import pytest
+from pony.orm import Required
+
+from tests.apps import make_server
+
+
+@pytest.fixture
+def server():
+    server = make_server(db_pool_size=1, db_max_overflow=0, db_pool_timeout=0.05)
+
+    class Note(server.Entity):
+        text = Required(str)
+
+    server.finalize()
+    return server
+
+
+def test_sessions_wait_for_a_free_connection_then_503(server):
+    data = server.data
+    opened, release = threading.Event(), threading.Event()
+
+    def hold():
+        with data.session():
+            opened.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    opened.wait()
+    with pytest.raises(HTTPException) as error:
+        with data.session():
+            pass
+    release.set()
+    thread.join()
+    assert error.value.status_code == 503
+    assert data.stats.timeouts == 1
+    # the slot is free again
+    with data.session():
+        pass
+    assert data.metrics()["pool"]["in_use"] == 0
+
+
+def test_session_metrics(server):
+    data = server.data
+    with data.request_scope():
+        with data.session():
+            # joins the open session
+            with data.session():
+                pass
+        with data.session():
+            pass
+    with pytest.raises(KeyError), data.session():
+        raise KeyError
+    sessions = data.metrics()["sessions"]
+    counts = {name: sessions[name] for name in ("opened", "committed", "rolled_back")}
+    assert counts == {"opened": 3, "committed": 2, "rolled_back": 1}
+    assert (sessions["requests"], sessions["split_requests"]) == (1, 1)
+    assert sessions["max_active"] == 1
+
+
+def test_after_commit_callbacks_only_run_on_commit(server):
+    data, calls = server.data, []
+    with data.session():
+        data.after_commit(lambda: calls.append("committed"))
+        assert calls == []
+    with pytest.raises(KeyError), data.session():
+        data.after_commit(lambda: calls.append("rolled back"))
+        raise KeyError
+    assert calls == ["committed"]
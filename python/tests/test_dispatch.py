@@ -0,0 +1,208 @@
+import asyncio
+import threading
+
+import pytest
+from pony.orm import Required
+from starlette.testclient import TestClient
+
+from python.sop.server.dispatch import Dispatcher, RPCMethod, build_dispatch_table, rpc
+
+
+@pytest.fixture
+def tool(server, http):
+    class Tool(server.Entity):
+        name = Required(str)
+
+        @rpc.cls
+        def add(cls, a: int, b: int) -> int:
+            return a + b
+
+        @rpc.cls
+        def broken(cls) -> None:
+            # a TypeError from inside the method, not from the call
+            len(None)
+
+        @rpc
+        def rename(self, name: str) -> str:
+            self.name = name
+            return name
+
+        @classmethod
+        def helper(cls) -> str:
+            return "not exposed"
+
+        def internal(self) -> str:
+            return "not exposed"
+
+    server.finalize()
+    return Tool, http.post("/tool/create", json={"name": "hammer"}).json()
+
+
+def _rpc(http, path, method_name, *args, **kwds):
+    return http.post(
+        f"{path}/rpc",
+        params={"method_name": method_name},
+        json={"args": list(args), "kwds": kwds},
+    )
+
+
+def test_only_marked_methods_are_exposed(tool):
+    Tool, _ = tool
+    assert set(build_dispatch_table(Tool)) == {"add", "broken", "rename"}
+
+
+def test_unmarked_and_builtin_methods_are_not_callable(http, tool):
+    _, id = tool
+    for method_name in ("helper", "get_by_id", "delete_many", "create"):
+        assert _rpc(http, "/tool", method_name).status_code == 404
+    for method_name in ("internal", "serialize", "delete", "sync"):
+        assert _rpc(http, f"/tool/{id}", method_name).status_code == 404
+
+
+def test_rpc_calls(http, tool):
+    _, id = tool
+    assert _rpc(http, "/tool", "add", 1, b=2).json() == 3
+    assert _rpc(http, f"/tool/{id}", "rename", "saw").json() == "saw"
+    assert http.get(f"/tool/{id}").json()["name"] == "saw"
+
+
+def test_arguments_not_matching_the_signature_are_422s(http, tool):
+    _, id = tool
+    assert _rpc(http, "/tool", "add", 1).status_code == 422
+    assert _rpc(http, "/tool", "add", 1, 2, c=3).status_code == 422
+    assert _rpc(http, f"/tool/{id}", "rename").status_code == 422
+
+
+def test_type_errors_inside_the_method_are_not_422s(server, tool):
+    # the 500 as a response rather than the error re-raised in the test
+    http = TestClient(server._fastapi, raise_server_exceptions=False)
+    assert _rpc(http, "/tool", "broken").status_code == 500
+
+
+def test_class_rpcs_are_access_controlled(http, tool):
+    Tool, _ = tool
+    Tool.Meta.api.hidden("add")
+    assert _rpc(http, "/tool", "add", 1, 2).status_code == 403
+
+
+
+class _Signatures:
+    def plain(self, a, b=1): ...
+
+    def keyword_only(self, a, *, b, c=1): ...
+
+    def positional_only(self, a, /, b=1): ...
+
+    def variadic(self, a, *args, b=1, **kwds): ...
+
+
+@pytest.mark.parametrize(
+    "name", ["plain", "keyword_only", "positional_only", "variadic"]
+)
+def test_calls_are_checked_like_the_signature_binds_them(name):
+    method = RPCMethod.compile(name, rpc(getattr(_Signatures, name)))
+    calls = [
+        ([], {}),
+        ([1], {}),
+        ([1, 2], {}),
+        ([1, 2, 3], {}),
+        ([], {"a": 1}),
+        ([1], {"a": 1}),
+        ([1], {"b": 2}),
+        ([1], {"b": 2, "c": 3}),
+        ([1], {"d": 4}),
+        ([1, 2], {"b": 2}),
+    ]
+    for args, kwds in calls:
+        try:
+            method.signature.bind(*args, **kwds)
+            binds = True
+        except TypeError:
+            binds = False
+        assert method._fits(args, kwds) is binds, (args, kwds)
+        if not kwds:
+            fits = method.min_positional <= len(args) <= method.max_positional
+            assert fits is binds, args
+
+
+@pytest.fixture
+def clock(server, http):
+    class Clock(server.Entity):
+        name = Required(str)
+
+        @rpc.cls
+        async def names(cls) -> list:
+            await asyncio.sleep(0)
+            # on the loop, in a session
+            return [threading.current_thread().name, cls.select().count()]
+
+        @rpc
+        async def rename(self, name: str) -> list:
+            await asyncio.sleep(0)
+            self.name = name
+            return [threading.current_thread().name, name]
+
+        @rpc
+        def thread(self) -> str:
+            return threading.current_thread().name
+
+    server.finalize()
+    return Clock, http.post("/clock/create", json={"name": "a"}).json()
+
+
+def test_async_rpcs_are_awaited_on_the_loop_and_sync_ones_on_the_pool(http, clock):
+    Clock, id = clock
+    assert Clock._rpc_methods["names"].is_async
+    assert not Clock._rpc_methods["thread"].is_async
+    thread, count = _rpc(http, "/clock", "names").json()
+    assert not thread.startswith("sop-dispatch") and count == 1
+    thread, name = _rpc(http, f"/clock/{id}", "rename", "b").json()
+    assert not thread.startswith("sop-dispatch") and name == "b"
+    assert http.get(f"/clock/{id}").json()["name"] == "b"
+    assert _rpc(http, f"/clock/{id}", "thread").json().startswith("sop-dispatch")
+
+
+def test_entity_concurrency_is_limited():
+    dispatcher = Dispatcher(max_workers=4)
+    dispatcher.set_entity_concurrency("Clock", 2)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def wait():
+            await release.wait()
+
+        calls = [
+            asyncio.create_task(dispatcher.call("Clock", wait)) for _ in range(5)
+        ]
+        await asyncio.sleep(0.01)
+        stats = dispatcher.stats["Clock"]
+        assert (stats.running, stats.queued, stats.limit) == (2, 3, 2)
+        release.set()
+        await asyncio.gather(*calls)
+
+    asyncio.run(run())
+    metrics = dispatcher.metrics()["entities"]["Clock"]
+    assert metrics["completed"] == 5 and metrics["running"] == 0
+    assert metrics["max_queued"] == 3
+    dispatcher.shutdown()
+
+
+def test_queue_depth_counts_work_waiting_for_a_thread():
+    dispatcher = Dispatcher(max_workers=1, default_entity_concurrency=3)
+    release = threading.Event()
+
+    async def run():
+        calls = [
+            asyncio.create_task(dispatcher.call("Clock", release.wait))
+            for _ in range(3)
+        ]
+        await asyncio.sleep(0.05)
+        depth = dispatcher.metrics()["executor_queue_depth"]
+        release.set()
+        await asyncio.gather(*calls)
+        return depth
+
+    assert asyncio.run(run()) == 2
+    assert dispatcher.executor_queue_depth == 0
+    dispatcher.shutdown()
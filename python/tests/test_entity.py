@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from pony.orm import Optional, Required
+
+from tests.apps import make_client
+
+
+@pytest.fixture
+def Note(server):
+    class Note(server.Entity):
+        text = Required(str)
+        tag = Optional(str)
+
+    client = make_client(server)
+
+    class Note(client.Entity):
+        text: str
+        tag: str = None
+
+    server.finalize()
+    client.finalize()
+    return Note
+
+
+def test_update_by_id_sends_the_fields_as_json(Note):
+    id = Note.create(text="old")
+    note = Note.get_by_id(id)
+    note.text = "new"
+    note.tag = "t"
+    response = Note.update_by_id(id, note)
+    assert response.status_code == 200
+    updated = Note.get_by_id(id)
+    assert (updated.text, updated.tag) == ("new", "t")
+
+
+def test_update_by_id_async_sends_the_fields_as_json(Note):
+    id = Note.create(text="old")
+    note = Note.get_by_id(id)
+    note.text = "new"
+    response = asyncio.run(Note.update_by_id_async(id, note))
+    assert response.status_code == 200
+    assert Note.get_by_id(id).text == "new"
+
+
+def test_entity_types_are_finalized_on_first_use(server):
+    class Note(server.Entity):
+        text = Required(str)
+
+    client = make_client(server)
+
+    class Note(client.Entity):
+        text: str
+
+    # neither app was finalized
+    assert Note.get_by_id(Note.create(text="hi")).text == "hi"
+
+
+@pytest.fixture
+def requests(server) -> list[str]:
+    # the paths of the requests the server got
+    paths = []
+
+    @server._fastapi.middleware("http")
+    async def record(request, call_next):
+        paths.append(request.url.path)
+        return await call_next(request)
+
+    return paths
+
+
+def test_get_many_fetches_in_one_request(Note, requests):
+    ids = [Note.create(text=str(i)) for i in range(3)]
+    requests.clear()
+    notes = Note.get_many([ids[2], "999", ids[0], ids[2]])
+    assert [note.text for note in notes] == ["2", "0"]
+    assert requests == ["/note/many"]
+
+
+def test_get_many_serves_fresh_mapped_entities(Note, requests, monkeypatch):
+    monkeypatch.setattr(Note.Meta, "cache_ttl", 60)
+    mapped = Note.get_by_id(Note.create(text="a"))
+    other = Note.create(text="b")
+    requests.clear()
+    notes = Note.get_many([mapped.id, other])
+    assert notes[0] is mapped
+    assert notes[1].text == "b"
+    # only the unmapped id was requested
+    assert requests == ["/note/many"]
+    requests.clear()
+    assert Note.get_many([mapped.id])[0] is mapped
+    assert requests == []
+
+
+def test_get_many_refetches_stale_mapped_entities(Note, http, requests):
+    mapped = Note.get_by_id(Note.create(text="a"))
+    http.put(f"/note/{mapped.id}", json={"text": "b"})
+    requests.clear()
+    # the default ttl of 0 revalidates every read
+    assert Note.get_many([mapped.id]) == [mapped]
+    assert mapped.text == "b"
+    assert requests == ["/note/many"]
@@ -0,0 +1,143 @@
+"""The change feed, against a server listening on a local port.
+
+Feeds stream until closed, which the in-process transports can't carry.
+"""
+import asyncio
+import queue
+import time
+
+from fastapi import HTTPException
+import httpx
+import pytest
+from pony.orm import Required
+
+from python.sop.client import feed as client_feed
+from python.sop.client.app import App as ClientApp
+from python.sop.server.acl import current_caller
+from python.sop.server.feed import ChangeEvent, ChangeFeed, Subscriber, Subscription
+from tests.apps import make_server, serve
+
+
+def _authenticate(self, connection):
+    user = connection.headers.get("x-user")
+    if user is None:
+        raise HTTPException(status_code=401, detail="Who are you?")
+    return user
+
+
+@pytest.fixture
+def live():
+    server = make_server(authenticate=_authenticate)
+
+    class Note(server.Entity):
+        owner = Required(str)
+        text = Required(str)
+
+    server.finalize()
+    Note.Meta.api.restrict_rows(lambda note: note.owner == current_caller())
+    with serve(server) as url:
+        yield url
+
+
+def _client(url: str, user: str) -> ClientApp:
+    class Client(ClientApp):
+        base_url = url
+        headers_overrides = {"x-user": user}
+
+    return Client()
+
+
+def _subscribe(client: ClientApp, **spec) -> queue.Queue:
+    events = queue.Queue()
+    client.feed.reconnect_delay = 0.1
+    client.feed.subscribe(**spec).on_event(events.put)
+    # connected once the first cursor arrived
+    deadline = time.monotonic() + 5
+    while client.feed.cursor is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return events
+
+
+def _create(url: str, user: str, **fields) -> str:
+    response = httpx.post(f"{url}/note/create", json=fields, headers={"x-user": user})
+    response.raise_for_status()
+    return str(response.json())
+
+
+@pytest.fixture(params=["websocket", "sse"])
+def transport(request, monkeypatch):
+    if request.param == "sse":
+        monkeypatch.setattr(client_feed, "websocket_connect", None)
+    return request.param
+
+
+def test_events_are_delivered(live, transport):
+    client = _client(live, "alice")
+    events = _subscribe(client, entity="Note")
+    id = _create(live, "alice", owner="alice", text="hi")
+    event = events.get(timeout=5)
+    assert (event["op"], str(event["id"])) == ("create", id)
+    client.feed.close()
+
+
+def test_rows_the_caller_cant_see_are_not_delivered(live, transport):
+    client = _client(live, "alice")
+    events = _subscribe(client, entity="Note")
+    _create(live, "bob", owner="bob", text="private")
+    id = _create(live, "alice", owner="alice", text="hi")
+    assert str(events.get(timeout=5)["id"]) == id
+    assert events.empty()
+    client.feed.close()
+
+
+def test_missed_events_are_sent_after_reconnecting(live, transport):
+    client = _client(live, "alice")
+    events = _subscribe(client, entity="Note")
+    cursor = client.feed.cursor
+    client.feed._disconnect()
+    id = _create(live, "alice", owner="alice", text="while away")
+    event = events.get(timeout=5)
+    assert (event["op"], str(event["id"])) == ("create", id)
+    assert client.feed.cursor != cursor
+    client.feed.close()
+
+
+def test_unauthenticated_connections_are_refused(live):
+    response = httpx.get(f"{live}/feed/sse", params={"subscriptions": "[]"})
+    assert response.status_code == 401
+    with pytest.raises(Exception):
+        client_feed.websocket_connect(live.replace("http", "ws", 1) + "/feed")
+
+
+def test_clients_resync_when_missed_events_are_gone(live, transport):
+    client = _client(live, "alice")
+    events = _subscribe(client, entity="Note")
+    # eg from before a server restart
+    client.feed.cursor = "gone:0"
+    client.feed._disconnect()
+    assert events.get(timeout=5) == {"op": "resync"}
+    client.feed.close()
+
+
+def test_cursors_only_pass_queued_events():
+    feed = ChangeFeed()
+    cursors = []
+
+    class Watching(Subscription):
+        def matches(self, event):
+            # where a batch taken mid-offer would end
+            cursors.append(subscriber.cursor["cursor"])
+            return super().matches(event)
+
+    async def offer():
+        nonlocal subscriber
+        subscriber = Subscriber(feed, asyncio.get_running_loop(), max_pending=10)
+        subscriber.subscriptions["s"] = Watching("s", entity="Note")
+        subscriber.offer(ChangeEvent("create", "Note", 1, 1, seq=1))
+        return await subscriber.next_batch(timeout=1)
+
+    subscriber = None
+    batch = asyncio.run(offer())
+    assert cursors == [f"{feed.epoch}:0"]
+    assert [event["op"] for event in batch] == ["create", "cursor"]
+    assert batch[-1]["cursor"] == f"{feed.epoch}:1"
@@ -0,0 +1,103 @@
+import pytest
+from pony.orm import Required
+from starlette.testclient import TestClient
+
+from python.sop.utils.instrumentation import (
+    TRACE_HEADER,
+    Metrics,
+    Span,
+    instrumentation,
+)
+from tests.apps import make_client, make_server
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    # instrumentation is shared by the process; leave it as it was found
+    was_enabled = instrumentation.enabled
+    instrumentation.metrics.clear()
+    yield instrumentation.metrics
+    instrumentation.metrics.clear()
+    instrumentation.enabled = was_enabled
+
+
+def test_spans_share_the_current_trace():
+    with instrumentation.recording() as spans:
+        with instrumentation.span("outer", label="a") as outer:
+            with instrumentation.span("inner", detail=1):
+                pass
+            with pytest.raises(ValueError):
+                with instrumentation.span("failing"):
+                    raise ValueError
+        with instrumentation.span("next"):
+            pass
+    inner, failing, outer_, next_ = spans
+    assert outer_ is outer
+    assert [span.name for span in spans] == ["inner", "failing", "outer", "next"]
+    assert inner.trace_id == failing.trace_id == outer.trace_id
+    assert next_.trace_id != outer.trace_id
+    assert inner.attrs == {"detail": 1}
+    assert (failing.error, outer.error) == ("ValueError", None)
+    assert instrumentation.current_trace_id() is None
+
+
+def test_disabled_spans_record_nothing(metrics):
+    instrumentation.disable()
+    with instrumentation.span("quiet") as span:
+        assert span is None
+    assert instrumentation.trace_headers() == {}
+    assert metrics.spans == {}
+
+
+def test_clients_trace_ids_reach_the_server(server):
+    class Note(server.Entity):
+        text = Required(str)
+
+    client = make_client(server)
+
+    class Note(client.Entity):
+        text: str
+
+    server.finalize()
+    client.finalize()
+    with instrumentation.recording() as spans:
+        with instrumentation.span("call") as call:
+            response = Note.api.post_request("/create", data='{"text": "a"}')
+    assert response.headers[TRACE_HEADER] == call.trace_id
+    traced = {span.name: span for span in spans}
+    assert {"client.request", "server.request"} <= traced.keys()
+    assert {span.trace_id for span in spans} == {call.trace_id}
+    # labelled by route template
+    assert traced["server.request"].label == "POST /note/create"
+    assert traced["server.request"].attrs["status_code"] == 200
+
+
+def test_metrics_are_exposed_for_prometheus():
+    metrics = Metrics()
+    for seconds, error in ((0.0002, None), (0.003, "ValueError"), (10.0, None)):
+        metrics.observe(Span("server.request", 'GET "x"', "t", {}, 0.0, seconds, error))
+    lines = metrics.prometheus().splitlines()
+    labels = 'span="server.request",label="GET \\"x\\""'
+    assert lines[:2] == [
+        "# HELP sop_span_seconds Time spent in instrumented SOP code.",
+        "# TYPE sop_span_seconds histogram",
+    ]
+    # cumulative buckets; 10s only fits +Inf
+    assert f'sop_span_seconds_bucket{{{labels},le="0.0001"}} 0' in lines
+    assert f'sop_span_seconds_bucket{{{labels},le="0.0005"}} 1' in lines
+    assert f'sop_span_seconds_bucket{{{labels},le="0.005"}} 2' in lines
+    assert f'sop_span_seconds_bucket{{{labels},le="5.0"}} 2' in lines
+    assert f'sop_span_seconds_bucket{{{labels},le="+Inf"}} 3' in lines
+    assert f"sop_span_seconds_count{{{labels}}} 3" in lines
+    assert f"sop_span_errors_total{{{labels}}} 1" in lines
+    assert "# TYPE sop_span_errors_total counter" in lines
+
+
+def test_metrics_are_served():
+    server = make_server(instrumented=True)
+    server.finalize()
+    http = TestClient(server._fastapi, base_url="http://sop")
+    http.get("/healthz")
+    response = http.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'span="server.request",label="GET /healthz"' in response.text
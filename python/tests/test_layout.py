@@ -0,0 +1,82 @@
+from typing import ClassVar
+
+import pytest
+from pony.orm import Optional, Required
+
+from python.sop.client.layout import EntityLayout, field_values
+from tests.apps import make_client
+
+
+class Point(metaclass=EntityLayout):
+    x: int
+    y: int = 0
+    label: ClassVar[str] = "point"
+
+
+def test_fields_get_slots_and_no_dict():
+    point = Point()
+    point.x = 1
+    assert (point.x, Point.label) == (1, "point")
+    assert Point.__slots__ == ("x", "y")
+    assert Point._field_defaults == {"y": 0}
+    assert not hasattr(point, "__dict__")
+    assert field_values(point) == {"x": 1}
+
+
+def test_unknown_attributes_are_rejected():
+    point = Point()
+    with pytest.raises(AttributeError):
+        point.z = 1
+    with pytest.raises(AttributeError):
+        point.z
+
+
+@pytest.fixture
+def Note(server):
+    class Note(server.Entity):
+        text = Required(str)
+        tag = Optional(str)
+        # only the server declares it
+        color = Optional(str)
+
+    client = make_client(server, auto_rpc=False)
+
+    class Note(client.Entity):
+        text: str
+        tag: str = None
+
+    server.finalize()
+    client.finalize()
+    return Note
+
+
+def test_entities_read_and_write_their_slots(Note):
+    note = Note.get_by_id(Note.create(text="a", color="red"))
+    assert (note.text, note.tag) == ("a", "")
+    note.tag = "t"
+    assert note.tag == "t"
+    assert not hasattr(note, "__dict__")
+    # kept for the server, outside the slots
+    assert note.color == "red"
+    assert note._extras == {"color": "red"}
+    # an unset field reads as its class default
+    assert Note._from_data({"id": 0, "text": "b"}).tag is None
+
+
+def test_only_user_writes_are_dirty(Note, http):
+    note = Note.get_by_id(Note.create(text="a"))
+    assert note.dirty_fields == set()
+    note.text = "b"
+    assert note.dirty_fields == {"text"}
+    note.sync()
+    assert note.dirty_fields == set()
+    # a refresh from the server writes the fields without dirtying them
+    http.put(f"/note/{note.id}", json={"text": "c"})
+    Note.get_by_id(note.id)
+    assert (note.text, note.dirty_fields) == ("c", set())
+
+
+def test_unknown_entity_attributes_are_rejected(Note):
+    note = Note.get_by_id(Note.create(text="a"))
+    with pytest.raises(AttributeError):
+        note.nothing
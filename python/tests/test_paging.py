@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from pony.orm import Required
+
+from python.sop.client.app import App as ClientApp
+from tests.apps import make_client, serve
+
+
+@pytest.fixture
+def Note(server):
+    class Note(server.Entity):
+        text = Required(str)
+
+    client = make_client(server)
+
+    class Note(client.Entity):
+        text: str
+
+    server.finalize()
+    client.finalize()
+    return Note
+
+
+@pytest.fixture
+def requests(server) -> list[str]:
+    # the paths of the requests the server got
+    paths = []
+
+    @server._fastapi.middleware("http")
+    async def record(request, call_next):
+        paths.append(request.url.path)
+        return await call_next(request)
+
+    return paths
+
+
+def _create(Note, count: int) -> None:
+    for i in range(count):
+        Note.create(text=str(i))
+
+
+def test_cursors_walk_the_table_in_order(Note):
+    _create(Note, 5)
+    pages, after = [], None
+    while True:
+        items, after = Note.get_page(after=after, limit=2)
+        pages.append([note.text for note in items])
+        if after is None:
+            break
+    assert pages == [["0", "1"], ["2", "3"], ["4"]]
+
+
+def test_a_full_last_page_has_no_cursor(Note):
+    _create(Note, 4)
+    items, after = Note.get_page(limit=2)
+    items, after = Note.get_page(after=after, limit=2)
+    assert [note.text for note in items] == ["2", "3"]
+    # rather than a cursor to an empty page
+    assert after is None
+
+
+def test_an_empty_table_is_one_empty_page(Note, http):
+    assert Note.get_page() == ([], None)
+    assert http.get("/note/page").json() == {"items": [], "next_cursor": None}
+    assert list(Note.iter_all()) == []
+
+
+def test_iter_all_exhausts_the_table(Note, requests):
+    _create(Note, 5)
+    requests.clear()
+    assert [note.text for note in Note.iter_all(batch_size=2)] == [
+        str(i) for i in range(5)
+    ]
+    assert requests == ["/note/page"] * 3
+
+
+def test_iter_all_streams_the_table(server, Note):
+    _create(Note, 5)
+
+    # streamed responses need a real connection
+    with serve(server) as url:
+
+        class Client(ClientApp):
+            base_url = url
+
+        client = Client()
+
+        class Note(client.Entity):
+            text: str
+
+        notes = list(Note.iter_all(batch_size=2, stream=True))
+    assert [note.text for note in notes] == [str(i) for i in range(5)]
+
+
+def test_iter_all_async_exhausts_the_table(Note):
+    _create(Note, 5)
+
+    async def texts():
+        return [note.text async for note in Note.iter_all_async(batch_size=2)]
+
+    assert asyncio.run(texts()) == [str(i) for i in range(5)]
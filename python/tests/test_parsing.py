@@ -0,0 +1,40 @@
+from typing import Optional
+
+import pydantic
+from pony.orm import Required
+
+from python.sop.utils.parsing import ClassParser, JSONParser
+from tests.apps import make_client
+
+
+class Point(pydantic.BaseModel):
+    x: Optional[int] = None
+
+
+def test_untyped_parsing_leaves_objects_alone():
+    JSONParser.for_type(Point)
+    ClassParser(Point)
+    assert JSONParser().parse({"y": 1}) == {"y": 1}
+    assert JSONParser().parse([{"x": 1}]) == [{"x": 1}]
+
+
+def test_typed_parsing_builds_the_class():
+    assert JSONParser.for_type(Point).parse({"x": 1}) == Point(x=1)
+    assert JSONParser.for_type(list[Point]).parse([{"x": 2}]) == [Point(x=2)]
+
+
+def test_untyped_parsing_leaves_entity_data_alone(server):
+    class Tag(server.Entity):
+        name = Required(str)
+
+    client = make_client(server)
+
+    class Tag(client.Entity):
+        name: str
+
+    client.finalize()
+    Tag.parser()
+    parser = JSONParser()
+    assert parser.parse({"id": "1", "name": "a"}) == {"id": "1", "name": "a"}
+    assert parser.parse("1") == "1"
+    assert parser.parse(1) == 1
@@ -0,0 +1,60 @@
+import pytest
+from pony.orm import Optional, Required
+
+from tests.apps import make_client
+
+
+@pytest.fixture
+def Note(server):
+    class Note(server.Entity):
+        text = Required(str)
+        size = Optional(int)
+
+    client = make_client(server)
+
+    class Note(client.Entity):
+        text: str
+        size: int = None
+
+    server.finalize()
+    client.finalize()
+    for size in range(5):
+        Note.create(text=f"note {size}", size=size)
+    return Note
+
+
+def test_queries_filter_order_and_page(Note):
+    query = Note.query().filter(size__in=[1, 2, 3]).order_by("-size")
+    assert [note.size for note in query.offset(1).limit(2)] == [2, 1]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {"limit": "ten"},
+        {"limit": 0},
+        {"offset": -1},
+        {"offset": 1.5},
+        {"where": [["size", "in", 3]]},
+        {"where": [["size", "in", ["three"]]]},
+        {"where": [["size", "eq", "three"]]},
+        {"where": {"size": 3}},
+        {"fields": "text"},
+    ],
+)
+def test_invalid_documents_are_422s(http, Note, document):
+    assert http.post("/note/query", json=document).status_code == 422
+
+
+def test_projected_rows_have_only_their_fields(http, Note):
+    response = http.post("/note/query", json={"fields": ["size"], "limit": 1})
+    assert response.json()["items"] == [{"id": 1, "size": 0}]
+
+
+def test_partial_rows_leave_mapped_entities_alone(Note):
+    note = Note.query().filter(size=0).first()
+    note.text = "local"
+    partial = Note.query().filter(size=0).only("size").first()
+    assert partial is not note
+    assert partial.size == 0
+    assert note.text == "local"
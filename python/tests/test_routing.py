@@ -0,0 +1,71 @@
+from fastapi.routing import APIRoute
+import pytest
+from pony.orm import Required
+from starlette.routing import Match
+
+from python.sop.server.dispatch import rpc
+from python.sop.server.routing import RouteTable
+
+
+def _match(table: RouteTable, method: str, path: str):
+    scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+    match, child_scope = table.matches(scope)
+    return match, child_scope.get("sop_route")
+
+
+def test_static_segments_match_before_parameters():
+    table = RouteTable()
+    by_id = APIRoute("/Note/{id}", lambda id: id, methods=["GET"])
+    instance_rpc = APIRoute("/Note/{id}/rpc", lambda id: id, methods=["POST"])
+    # added after the routes they'd otherwise be shadowed by
+    page = APIRoute("/Note/page", lambda: None, methods=["GET"])
+    cls_rpc = APIRoute("/Note/rpc", lambda: None, methods=["POST"])
+    for route in (by_id, instance_rpc, page, cls_rpc):
+        table.add(route)
+    assert _match(table, "GET", "/Note/page") == (Match.FULL, page)
+    assert _match(table, "GET", "/Note/7") == (Match.FULL, by_id)
+    assert _match(table, "POST", "/Note/rpc") == (Match.FULL, cls_rpc)
+    assert _match(table, "POST", "/Note/7/rpc") == (Match.FULL, instance_rpc)
+    # right path, wrong method
+    assert _match(table, "DELETE", "/Note/page") == (Match.PARTIAL, page)
+    assert _match(table, "GET", "/User/7") == (Match.NONE, None)
+
+
+@pytest.fixture
+def note(server, http) -> str:
+    class Note(server.Entity):
+        text = Required(str)
+
+        @rpc.cls
+        def describe(cls) -> str:
+            return "class"
+
+        @rpc
+        def describe_one(self) -> str:
+            return self.text
+
+    server.finalize()
+    return http.post("/note/create", json={"text": "instance"}).json()
+
+
+def test_class_and_instance_routes_share_segment_names(http, note):
+    def call(path, method_name):
+        response = http.post(
+            path, params={"method_name": method_name}, json={"args": [], "kwds": {}}
+        )
+        return response.status_code, response.json()
+
+    assert call("/note/rpc", "describe") == (200, "class")
+    assert call(f"/note/{note}/rpc", "describe_one") == (200, "instance")
+    # instance methods need an instance; class methods work on either, as
+    # they do in python
+    assert call("/note/rpc", "describe_one")[0] == 404
+    assert call(f"/note/{note}/rpc", "describe") == (200, "class")
+
+
+def test_static_entity_routes_are_not_read_as_ids(http, note):
+    items = http.get("/note/page").json()["items"]
+    assert items == [{"id": int(note), "text": "instance"}]
+    assert http.get("/note/many", params={"ids": [note]}).json()["missing"] == []
+    assert http.get(f"/note/{note}").json()["text"] == "instance"
+    assert http.post("/note/page").status_code == 405
@@ -0,0 +1,101 @@
+"""The runner, serving `tests.runner_apps` from worker processes."""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from python.sop.server.runner import Runner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _runner(target: str, port: int, *args: str) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "python.sop.server.runner", target, "--port", str(port)]
+        + ["--workers", "1", "--log-level", "warning", *args],
+        cwd=os.path.join(ROOT, "python"),
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+
+
+@pytest.fixture
+def runner():
+    runner = Runner(
+        "tests.runner_apps:app", workers=1, port=_free_port(), log_level="warning"
+    )
+    yield runner
+    runner.stop()
+
+
+def test_workers_are_ready_once_the_app_serves(runner):
+    runner.start()
+    assert runner._wait_ready(runner.running[0])
+    response = httpx.get(f"http://127.0.0.1:{runner.port}/readyz")
+    assert response.text == "ready"
+    created = httpx.post(
+        f"http://127.0.0.1:{runner.port}/note/create", json={"text": "hi"}
+    )
+    assert created.status_code == 200
+
+
+def test_workers_that_cant_start_are_not_ready(runner):
+    runner.target = "tests.runner_apps:missing"
+    runner.start()
+    assert not runner._wait_ready(runner.running[0])
+
+
+def test_exited_workers_are_restarted_with_backoff(runner):
+    runner.start()
+    first = runner.running[0]
+    runner._wait_ready(first)
+    first.process.kill()
+    first.process.join()
+    runner._restart_exited()
+    # not right away
+    assert runner.running == [] and runner.exits == 1
+    time.sleep(runner.restart_delay)
+    runner._restart_exited()
+    assert runner._wait_ready(runner.running[0])
+
+
+def test_the_runner_gives_up_on_workers_that_keep_exiting():
+    runner = _runner(
+        "tests.runner_apps:missing",
+        _free_port(),
+        "--max-restarts",
+        "2",
+        "--restart-delay",
+        "0.05",
+    )
+    assert runner.wait(timeout=60) != 0
+
+
+def test_the_runner_stops_gracefully_on_sigterm():
+    port = _free_port()
+    runner = _runner("tests.runner_apps:app", port)
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/readyz").text == "ready":
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.1)
+        else:
+            pytest.fail("the runner's worker never got ready")
+        runner.send_signal(signal.SIGTERM)
+        assert runner.wait(timeout=60) == 0
+    finally:
+        runner.kill()
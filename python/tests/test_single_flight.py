@@ -0,0 +1,117 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+import pytest
+
+from python.sop.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _concurrently(flight: SingleFlight, fn, callers: int = 4) -> list:
+    # the leader's `fn` is held until every other caller is waiting on it
+    release = threading.Event()
+
+    def held():
+        release.wait(5)
+        return fn()
+
+    with ThreadPoolExecutor(callers) as pool:
+        futures = [pool.submit(flight.do, "key", held) for _ in range(callers)]
+        _wait_for(lambda: flight.stats.shared == callers - 1)
+        release.set()
+    return futures
+
+
+def test_concurrent_calls_run_once():
+    flight, runs = SingleFlight(), []
+    futures = _concurrently(flight, lambda: runs.append(1) or len(runs))
+    assert [future.result() for future in futures] == [1, 1, 1, 1]
+    assert runs == [1]
+    assert (flight.stats.executions, flight.stats.shared) == (1, 3)
+    assert flight.stats.hit_rate == 0.75
+
+
+def test_errors_reach_every_caller():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    for future in _concurrently(flight, fail):
+        with pytest.raises(ValueError, match="boom"):
+            future.result()
+
+
+def test_finished_calls_run_again():
+    flight, runs = SingleFlight(), []
+    for _ in range(2):
+        flight.do("key", lambda: runs.append(1))
+    assert flight.do("other", lambda: "other") == "other"
+    assert (len(runs), flight.stats.executions, flight.stats.shared) == (2, 3, 0)
+    assert flight._calls == {}
+
+
+def test_async_concurrent_calls_run_once():
+    flight, runs = AsyncSingleFlight(), []
+
+    async def fetch():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        return len(runs)
+
+    async def calls():
+        return await asyncio.gather(*(flight.do("key", fetch) for _ in range(4)))
+
+    assert asyncio.run(calls()) == [1, 1, 1, 1]
+    assert (flight.stats.executions, flight.stats.shared) == (1, 3)
+    # and again, once it finished
+    assert asyncio.run(calls()) == [2, 2, 2, 2]
+    assert flight._tasks == {}
+
+
+def test_async_errors_reach_every_caller():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def calls():
+        return await asyncio.gather(
+            *(flight.do("key", fail) for _ in range(3)), return_exceptions=True
+        )
+
+    errors = asyncio.run(calls())
+    assert [type(error) for error in errors] == [ValueError] * 3
+
+
+def test_a_cancelled_caller_leaves_the_others_running():
+    flight = AsyncSingleFlight()
+
+    async def calls():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", fetch))
+        second = asyncio.create_task(flight.do("key", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await second
+
+    first, result = asyncio.run(calls())
+    assert first.cancelled()
+    assert result == "done"
+    assert flight.stats.executions == 1
@@ -0,0 +1,107 @@
+"""Client transports, against a server listening on a local port.
+
+The in-process transports have no connection pools to reuse.
+"""
+import asyncio
+
+import pytest
+from pony.orm import Required
+import requests
+from starlette.responses import Response
+
+from python.sop.client.app import App as ClientApp
+from python.sop.client.transport import AsyncTransport, Transport
+from python.sop.server.dispatch import rpc
+from tests.apps import make_server, serve
+
+
+@pytest.fixture
+def live():
+    server = make_server()
+    statuses = server.flaky_statuses = []
+
+    class Note(server.Entity):
+        text = Required(str)
+
+        @rpc.cls
+        def shout(cls, text: str) -> str:
+            return text.upper()
+
+    @server._fastapi.api_route("/flaky", methods=["GET", "POST"])
+    def flaky():
+        # answers with the queued statuses, then 200s
+        status = statuses.pop(0) if statuses else 200
+        return Response(status_code=status)
+
+    server.finalize()
+    with serve(server) as url:
+        yield url, statuses
+
+
+@pytest.fixture
+def Note(live):
+    class Client(ClientApp):
+        base_url = live[0]
+
+    client = Client()
+
+    class Note(client.Entity):
+        text: str
+
+    client.finalize()
+    return Note
+
+
+def test_async_requests_work_across_event_loops(Note):
+    id = Note.create(text="hi")
+
+    async def read():
+        return (await Note.get_by_id_async(id)).text
+
+    # each run has a loop of its own, and clients bound to it
+    assert asyncio.run(read()) == "hi"
+    assert asyncio.run(read()) == "hi"
+    assert len(Note.app.async_transport._loops) == 1
+
+
+def test_loops_get_their_own_semaphore():
+    transport = AsyncTransport(max_concurrency=2)
+
+    async def semaphore():
+        return transport.semaphore
+
+    first, second = asyncio.run(semaphore()), asyncio.run(semaphore())
+    assert first is not second
+
+
+def test_connections_are_reused(Note):
+    for i in range(5):
+        Note.create(text=str(i))
+    stats = Note.app.transport_stats
+    assert (stats.requests, stats.new_connections, stats.sessions) == (5, 1, 1)
+    assert stats.hit_rate == 0.8
+
+
+def test_idempotent_requests_are_retried(live):
+    url, statuses = live
+    transport = Transport(backoff_factor=0)
+    statuses.extend([503, 502])
+    assert transport.request("GET", url, "/flaky").status_code == 200
+    statuses.extend([503, 503, 503, 503])
+    assert transport.request("GET", url, "/flaky").status_code == 503
+    statuses.clear()
+    # a POST may have been applied, so it's not sent again
+    statuses.append(503)
+    assert transport.request("POST", url, "/flaky").status_code == 503
+
+
+def test_error_responses_raise(Note):
+    with pytest.raises(requests.HTTPError):
+        Note.create()
+    with pytest.raises(requests.HTTPError):
+        Note.api.rpc("whisper", [], {})
+    with pytest.raises(requests.HTTPError):
+        Note.api.rpc("shout", [], {})
+    with pytest.raises(requests.HTTPError):
+        Note.get_page(after="not a cursor")
+    assert Note.api.rpc("shout", [], {"text": "hi"}) == "HI"
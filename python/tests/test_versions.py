@@ -0,0 +1,61 @@
+import pytest
+from pony.orm import Optional, Required
+from starlette.testclient import TestClient
+
+from tests.apps import make_server
+
+
+def _serve(server) -> TestClient:
+    class Note(server.Entity):
+        text = Required(str)
+        tag = Optional(str)
+
+    server.finalize()
+    return TestClient(server._fastapi, base_url="http://sop")
+
+
+@pytest.fixture
+def http(server) -> TestClient:
+    return _serve(server)
+
+
+def _patch(http, id, version, **changes):
+    return http.patch(f"/note/{id}", json={"version": version, "changes": changes})
+
+
+def test_writes_bump_the_version(http):
+    id = http.post("/note/create", json={"text": "a"}).json()
+    read = http.get(f"/note/{id}")
+    assert read.headers["X-Version"] == "1"
+    assert "_version" not in read.json()
+    assert _patch(http, id, 1, text="b").json() == {"version": 2, "changes": {}}
+    assert http.get(f"/note/{id}").headers["X-Version"] == "2"
+
+
+def test_a_stale_write_of_a_changed_field_is_a_409(http):
+    id = http.post("/note/create", json={"text": "a"}).json()
+    _patch(http, id, 1, text="b")
+    conflict = _patch(http, id, 1, text="c")
+    assert conflict.status_code == 409
+    assert conflict.json()["detail"] == {"conflicts": {"text": "b"}, "version": 2}
+    # other fields merge, and come back with what changed meanwhile
+    merged = _patch(http, id, 1, tag="t")
+    assert merged.json() == {"version": 3, "changes": {"text": "b"}}
+
+
+def test_versions_are_shared_through_the_database(tmp_path):
+    options = {"filename": str(tmp_path / "sop.sqlite"), "create_db": True}
+    first = _serve(make_server(db_options=options))
+    second = _serve(make_server(db_options=options))
+    id = first.post("/note/create", json={"text": "a"}).json()
+    _patch(first, id, 1, text="b")
+    # eg another worker, or the same one after a restart
+    assert second.get(f"/note/{id}").headers["X-Version"] == "2"
+    assert _patch(second, id, 1, text="c").status_code == 409
+
+
+def test_version_columns_are_not_writable(http):
+    created = http.post("/note/create", json={"text": "a", "_version": 9})
+    assert created.status_code == 422
+    id = http.post("/note/create", json={"text": "a"}).json()
+    assert _patch(http, id, None, _version=9).status_code == 422